@@ -8,6 +8,7 @@ import os
 from motor.motor_asyncio import AsyncIOMotorDatabase
 from models.user import UserInDB
 from database import get_database
+from services.principals import principal_cache
 
 # Security configuration
 SECRET_KEY = os.environ.get("SECRET_KEY", "greasemonkey_secret_key_change_in_production")
@@ -86,8 +87,19 @@ async def get_current_user(
         headers={"WWW-Authenticate": "Bearer"},
     )
     
+    token = credentials.credentials
+    user_id = principal_cache.user_id_for(token)
+    if user_id is not None:
+        # Verified recently: skip decoding, and the lookup too if cached
+        user = principal_cache.get(user_id)
+        if user is None:
+            user = await AuthService.get_user_by_id(db, user_id)
+            if user is None:
+                raise credentials_exception
+            principal_cache.set(user)
+        return user
+    
     try:
-        token = credentials.credentials
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         email: str = payload.get("sub")
         if email is None:
@@ -98,6 +110,8 @@ async def get_current_user(
     user = await AuthService.get_user_by_email(db, email)
     if user is None:
         raise credentials_exception
+    principal_cache.remember_token(token, user.id, payload.get("exp"))
+    principal_cache.set(user)
     return user
 
 async def get_current_active_user(current_user: UserInDB = Depends(get_current_user)) -> UserInDB:
@@ -7,6 +7,9 @@ from pathlib import Path
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
+from services.timeline import TIMELINE_RETENTION_DAYS
+from services.touches import COUNTER_TOUCH_RETENTION_DAYS
+
 # MongoDB connection
 mongo_url = os.environ['MONGO_URL']
 client = AsyncIOMotorClient(mongo_url)
@@ -16,13 +19,23 @@ async def get_database() -> AsyncIOMotorDatabase:
     """Get database instance"""
     return db
 
-async def create_indexes():
+async def create_indexes(db: AsyncIOMotorDatabase = db):
     """Create database indexes for optimal performance"""
     # User indexes
     await db.users.create_index("email", unique=True)
     await db.users.create_index("username", unique=True)
     await db.users.create_index("id", unique=True)
     
+    # Follow graph indexes: one edge per (follower, followee), see services/follows.py
+    await db.follows.create_index([("follower_id", 1), ("followee_id", 1)], unique=True)
+    await db.follows.create_index([("follower_id", 1), ("created_at", -1), ("followee_id", -1)])
+    await db.follows.create_index([("followee_id", 1), ("created_at", -1), ("follower_id", -1)])
+    await db.follows.create_index("created_at")
+    
+    # Precomputed follow suggestions (see services/suggestions.py)
+    await db.suggestions.create_index("user_id", unique=True)
+    await db.suggestions.create_index("generated_at")
+    
     # Garage indexes
     await db.garages.create_index("id", unique=True)
     await db.garages.create_index("name")
@@ -34,9 +47,53 @@ async def create_indexes():
     await db.posts.create_index("garage_id")
     await db.posts.create_index("created_at")
     await db.posts.create_index([("created_at", -1)])  # Descending for latest first
+    # Keyset pagination: feed pages are ranges over (created_at, id)
+    await db.posts.create_index([("created_at", -1), ("id", -1)])
+    await db.posts.create_index([("garage_id", 1), ("created_at", -1), ("id", -1)])
+    # Ranked feeds: hot/top per garage, with creation time last for top windows
+    await db.posts.create_index([("garage_id", 1), ("hot", -1), ("id", -1)])
+    await db.posts.create_index([("garage_id", 1), ("score", -1), ("id", -1), ("created_at", -1)])
+    
+    # Vote indexes: one document per (post, voter)
+    await db.post_votes.create_index([("post_id", 1), ("user_id", 1)], unique=True)
+    await db.post_votes.create_index([("user_id", 1), ("post_id", 1)])
+    await db.post_votes.create_index([("user_id", 1), ("vote_type", 1), ("updated_at", -1), ("post_id", -1)])
     
     # Comment indexes
     await db.comments.create_index("id", unique=True)
     await db.comments.create_index("post_id")
     await db.comments.create_index("author_id")
-    await db.comments.create_index("created_at")
\ No newline at end of file
+    await db.comments.create_index("created_at")
+    await db.comments.create_index([("post_id", 1), ("created_at", 1), ("id", 1)])
+    # Threads: roots of a post, a root's subtree, a comment's direct replies
+    await db.comments.create_index([("post_id", 1), ("root_id", 1), ("created_at", 1), ("id", 1)])
+    await db.comments.create_index([("root_id", 1), ("created_at", 1), ("id", 1)])
+    await db.comments.create_index([("parent_id", 1), ("created_at", 1), ("id", 1)])
+    await db.comments.create_index("path")
+    
+    # Comment like indexes: one document per (comment, liker)
+    await db.comment_likes.create_index([("comment_id", 1), ("user_id", 1)], unique=True)
+    await db.comment_likes.create_index([("user_id", 1), ("comment_id", 1)])
+    await db.comment_likes.create_index("post_id")
+    
+    # Home timeline indexes (see services/timeline.py)
+    await db.timelines.create_index([("user_id", 1), ("post_id", 1)], unique=True)
+    await db.timelines.create_index([("user_id", 1), ("created_at", -1), ("post_id", -1)])
+    await db.timelines.create_index("post_id")
+    await db.timelines.create_index([("user_id", 1), ("garage_id", 1)])
+    await db.timelines.create_index("created_at", expireAfterSeconds=TIMELINE_RETENTION_DAYS * 24 * 60 * 60)
+    
+    # Cascade deletion indexes (see services/cascade.py)
+    await db.deletions.create_index("id", unique=True)
+    await db.deletions.create_index([("status", 1), ("created_at", 1)])
+    await db.notifications.create_index("data.post_id")
+    await db.media.create_index("url")
+    await db.media.create_index("uploaded_by")
+    await db.users.create_index("saved_posts")
+    
+    # Counter reconciliation: recent activity (see services/reconcile.py)
+    await db.post_votes.create_index("updated_at")
+    await db.comment_likes.create_index("created_at")
+    await db.deletions.create_index("created_at")
+    await db.counter_touches.create_index([("collection", 1), ("created_at", 1)])
+    await db.counter_touches.create_index("created_at", expireAfterSeconds=COUNTER_TOUCH_RETENTION_DAYS * 24 * 60 * 60)
\ No newline at end of file
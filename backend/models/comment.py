@@ -6,6 +6,7 @@ import uuid
 class CommentBase(BaseModel):
     content: str = Field(..., min_length=1, max_length=1000)
     post_id: str
+    parent_id: Optional[str] = None  # Comment being replied to, None for top-level comments
 
 class CommentCreate(CommentBase):
     pass
@@ -18,11 +19,18 @@ class Comment(CommentBase):
     author_id: str
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: datetime = Field(default_factory=datetime.utcnow)
-    likes: List[str] = Field(default_factory=list)  # List of user IDs who liked
+    garage_id: Optional[str] = None  # Copied from the post for access checks
+    # Individual likes live in the comment_likes collection
     like_count: int = 0
+    # Materialized path: threads are read by root_id, subtrees by path
+    root_id: Optional[str] = None  # Top-level comment of the thread, None for top-level comments
+    path: List[str] = Field(default_factory=list)  # Ancestor IDs from the root down to the parent
+    reply_count: int = 0  # Direct replies
 
 class CommentResponse(Comment):
     """Comment response model with author info"""
     author_username: Optional[str] = None
     author_full_name: Optional[str] = None
-    user_liked: bool = False
\ No newline at end of file
+    user_liked: bool = False
+    replies: List["CommentResponse"] = Field(default_factory=list)  # First replies, threaded listing only
+    replies_cursor: Optional[str] = None  # Cursor for GET /comments/{id}/replies when more replies exist
\ No newline at end of file
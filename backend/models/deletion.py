@@ -0,0 +1,45 @@
+from pydantic import BaseModel, Field
+from typing import Optional, Dict, Any
+from datetime import datetime
+import uuid
+
+class DeletionKind:
+    POST = "post"
+    USER = "user"
+    GARAGE = "garage"
+
+class DeletionStatus:
+    PENDING = "pending"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+
+class Deletion(BaseModel):
+    """Tombstone for an entity whose dependent data is cleaned up in the background"""
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    kind: str  # post, user, garage
+    target_id: str
+    requested_by: Optional[str] = None
+    context: Dict[str, Any] = Field(default_factory=dict)  # Fields of the deleted document the cleanup needs
+    status: str = DeletionStatus.PENDING
+    progress: Dict[str, int] = Field(default_factory=dict)  # step -> documents removed/updated
+    attempts: int = 0
+    error: Optional[str] = None
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    lease_until: Optional[datetime] = None
+    documents_per_second: Optional[float] = None
+
+class DeletionResponse(BaseModel):
+    """Progress of a background deletion as shown to the user who requested it"""
+    id: str
+    kind: str
+    target_id: str
+    status: str
+    progress: Dict[str, int] = Field(default_factory=dict)
+    error: Optional[str] = None
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    documents_per_second: Optional[float] = None
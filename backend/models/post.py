@@ -3,6 +3,9 @@ from typing import Optional, List
 from datetime import datetime
 import uuid
 
+# Maximum number of posts fetched by one POST /posts/batch request
+POST_BATCH_LIMIT = 100
+
 class PostBase(BaseModel):
     content: str = Field(..., min_length=1, max_length=2000)
     image_urls: Optional[List[str]] = Field(default_factory=list)
@@ -22,12 +25,14 @@ class Post(PostBase):
     author_id: str
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: datetime = Field(default_factory=datetime.utcnow)
-    likes: List[str] = Field(default_factory=list)  # List of user IDs who liked
-    dislikes: List[str] = Field(default_factory=list)  # List of user IDs who disliked
+    # Individual votes live in the post_votes collection
     like_count: int = 0
     dislike_count: int = 0
     comment_count: int = 0
     score: int = 0  # like_count - dislike_count
+    hot: float = 0.0  # Time-decayed ranking value, see services/ranking.py
+    view_count: int = 0
+    unique_viewer_count: int = 0  # HyperLogLog estimate, see services/views.py
 
 class PostResponse(Post):
     """Post response model with author info"""
@@ -37,4 +42,15 @@ class PostResponse(Post):
     user_vote: Optional[str] = None  # "like", "dislike", or None
 
 class PostVote(BaseModel):
-    vote_type: str = Field(..., pattern="^(like|dislike|remove)$")
\ No newline at end of file
+    vote_type: str = Field(..., pattern="^(like|dislike|remove)$")
+
+class PostBatchRequest(BaseModel):
+    ids: List[str] = Field(..., min_length=1, max_length=POST_BATCH_LIMIT)
+
+class PostBatchItem(BaseModel):
+    id: str
+    post: Optional[PostResponse] = None
+    error: Optional[str] = None  # "not_found" or "forbidden" when post is None
+
+class PostBatchResponse(BaseModel):
+    items: List[PostBatchItem]  # In request order
\ No newline at end of file
@@ -56,7 +56,8 @@ class UserUpdate(BaseModel):
     riding_experience: Optional[str] = None
     preferences: Optional[UserPreferences] = None
 
-class User(UserBase):
+class UserProfile(UserBase):
+    """Compact profile read model: counts only, no social or content arrays"""
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: datetime = Field(default_factory=datetime.utcnow)
@@ -65,17 +66,6 @@ class User(UserBase):
     is_verified: bool = False
     is_private: bool = False
     
-    # Social features
-    followers: List[str] = Field(default_factory=list)  # List of user IDs following this user
-    following: List[str] = Field(default_factory=list)  # List of user IDs this user follows
-    blocked_users: List[str] = Field(default_factory=list)  # List of blocked user IDs
-    friends: List[str] = Field(default_factory=list)  # List of user IDs (mutual follows)
-    
-    # Content
-    garages: List[str] = Field(default_factory=list)  # List of garage IDs
-    saved_posts: List[str] = Field(default_factory=list)  # List of saved post IDs
-    liked_posts: List[str] = Field(default_factory=list)  # List of liked post IDs
-    
     # Statistics
     followers_count: int = 0
     following_count: int = 0
@@ -84,19 +74,28 @@ class User(UserBase):
     post_count: int = 0
     garage_count: int = 0
     
-    # Social login info
-    social_logins: List[SocialLoginInfo] = Field(default_factory=list)
-    
     # Additional metadata
     badges: List[str] = Field(default_factory=list)  # Achievement badges
     total_miles: int = 0
     favorite_routes: List[str] = Field(default_factory=list)
 
+class User(UserProfile):
+    # Social features (follows live in the follows collection, see services/follows.py)
+    blocked_users: List[str] = Field(default_factory=list)  # List of blocked user IDs
+    
+    # Content
+    garages: List[str] = Field(default_factory=list)  # List of garage IDs
+    saved_posts: List[str] = Field(default_factory=list)  # List of saved post IDs
+    liked_posts: List[str] = Field(default_factory=list)  # List of liked post IDs
+    
+    # Social login info
+    social_logins: List[SocialLoginInfo] = Field(default_factory=list)
+
 class UserInDB(User):
     hashed_password: Optional[str] = None  # Optional for social login users
 
 class UserResponse(User):
-    """User response model without sensitive data"""
+    """Full (legacy) user response model without sensitive data"""
     pass
 
 class LoginRequest(BaseModel):
@@ -121,6 +120,11 @@ class UserSearchResult(BaseModel):
     is_following: bool = False
     is_private: bool = False
 
+class UserSuggestion(UserSearchResult):
+    """A suggested account and why it was suggested"""
+    mutual_follows: int = 0  # Accounts the user follows that follow this one
+    shared_garages: int = 0
+
 class UserStats(BaseModel):
     followers_count: int
     following_count: int
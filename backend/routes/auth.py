@@ -1,9 +1,10 @@
-from fastapi import APIRouter, HTTPException, status, Depends
+from fastapi import APIRouter, HTTPException, status, Depends, Query
 from motor.motor_asyncio import AsyncIOMotorDatabase
 from datetime import timedelta
-from models.user import UserCreate, UserResponse, LoginRequest, TokenResponse, UserInDB
+from models.user import UserCreate, UserProfile, UserResponse, LoginRequest, TokenResponse, UserInDB
 from auth import AuthService, ACCESS_TOKEN_EXPIRE_MINUTES, get_current_active_user
 from database import get_database
+from services.fields import profile_response
 
 router = APIRouter(prefix="/auth", tags=["authentication"])
 
@@ -84,9 +85,10 @@ async def login_user(
         user=user_response
     )
 
-@router.get("/me", response_model=UserResponse)
+@router.get("/me", response_model=UserProfile)
 async def get_current_user_info(
+    full: bool = Query(False, description="Include the saved, liked, garage and blocked lists (legacy shape)"),
     current_user: UserInDB = Depends(get_current_active_user)
 ):
     """Get current user information"""
-    return UserResponse(**current_user.dict())
\ No newline at end of file
+    return profile_response(current_user.dict(), full)
\ No newline at end of file
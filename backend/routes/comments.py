@@ -1,28 +1,39 @@
-from fastapi import APIRouter, HTTPException, status, Depends, Query
+from fastapi import APIRouter, HTTPException, status, Depends, Query, Request, Response
 from motor.motor_asyncio import AsyncIOMotorDatabase
-from typing import List
+from typing import List, Optional
 from datetime import datetime
 from models.comment import CommentCreate, CommentUpdate, CommentResponse, Comment
 from models.user import UserInDB
 from auth import get_current_active_user
 from database import get_database
+from services.access import access_resolver
+from services.comment_likes import toggle_like
+from services.enrichment import enrich_comments
+from services.etag import etag_matches, make_etag, not_modified
+from services.feed_cache import feed_cache
+from services.pagination import apply_keyset, encode_cursor, set_next_cursor
+from services.ranking import ranked_increment
+from services.touches import record_touches
 
 router = APIRouter(prefix="/comments", tags=["comments"])
 
 async def get_comment_with_details(db: AsyncIOMotorDatabase, comment_doc: dict, current_user_id: str) -> CommentResponse:
     """Helper function to enrich comment data with author info"""
-    # Get author info
-    author = await db.users.find_one({"id": comment_doc["author_id"]})
-    
-    # Check if current user liked this comment
-    user_liked = current_user_id in comment_doc.get("likes", [])
+    enriched_comments = await enrich_comments(db, [comment_doc], current_user_id)
+    return enriched_comments[0]
+
+async def comment_garage_id(db: AsyncIOMotorDatabase, comment: dict) -> Optional[str]:
+    """The garage of a comment's post; only comments stored before garage_id was copied need the post read"""
+    if "garage_id" in comment:
+        return comment["garage_id"]
     
-    return CommentResponse(
-        **comment_doc,
-        author_username=author.get("username") if author else None,
-        author_full_name=author.get("full_name") if author else None,
-        user_liked=user_liked
-    )
+    post = await db.posts.find_one({"id": comment["post_id"]}, {"_id": 0, "garage_id": 1})
+    if not post:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Associated post not found"
+        )
+    return post["garage_id"]
 
 @router.post("/", response_model=CommentResponse)
 async def create_comment(
@@ -32,7 +43,7 @@ async def create_comment(
 ):
     """Create a new comment on a post"""
     # Verify post exists and user has access
-    post = await db.posts.find_one({"id": comment_data.post_id})
+    post = await db.posts.find_one({"id": comment_data.post_id}, {"_id": 0, "garage_id": 1})
     if not post:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -40,41 +51,129 @@ async def create_comment(
         )
     
     # Check access if it's a garage post
-    if post["garage_id"]:
-        garage = await db.garages.find_one({"id": post["garage_id"]})
-        if garage and garage["is_private"] and current_user.id not in garage["members"]:
+    await access_resolver.require_post_access(db, current_user.id, post["garage_id"])
+    
+    # Replies record the path to their thread's root
+    path = []
+    if comment_data.parent_id:
+        parent = await db.comments.find_one(
+            {"id": comment_data.parent_id},
+            {"_id": 0, "id": 1, "post_id": 1, "path": 1}
+        )
+        if not parent or parent["post_id"] != comment_data.post_id:
             raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN,
-                detail="Access denied to private garage post"
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Parent comment not found"
             )
+        path = (parent.get("path") or []) + [parent["id"]]
     
     # Create new comment
     comment_dict = comment_data.dict()
-    new_comment = Comment(**comment_dict, author_id=current_user.id)
+    new_comment = Comment(
+        **comment_dict,
+        author_id=current_user.id,
+        garage_id=post["garage_id"],
+        root_id=path[0] if path else None,
+        path=path
+    )
     
     # Save to database
     await db.comments.insert_one(new_comment.dict())
     
-    # Update post's comment count
+    if comment_data.parent_id:
+        await db.comments.update_one(
+            {"id": comment_data.parent_id},
+            {"$inc": {"reply_count": 1}}
+        )
+    
+    # Update post's comment count and hot value
     await db.posts.update_one(
         {"id": comment_data.post_id},
-        {"$inc": {"comment_count": 1}}
+        ranked_increment({"comment_count": 1, "comment_version": 1})
     )
+    feed_cache.invalidate(post["garage_id"])
     
     # Return enriched comment data
     return await get_comment_with_details(db, new_comment.dict(), current_user.id)
 
+# order -> sort direction over (created_at, id)
+COMMENT_ORDERS = {
+    "oldest": 1,
+    "newest": -1
+}
+
+async def load_threads(
+    db: AsyncIOMotorDatabase,
+    response: Response,
+    post_id: str,
+    current_user_id: str,
+    limit: int,
+    cursor: Optional[str],
+    offset: int,
+    direction: int,
+    replies_limit: int
+) -> List[CommentResponse]:
+    """Top-level comments with their first replies, read with one aggregation"""
+    pipeline = [
+        {"$match": apply_keyset({"post_id": post_id, "root_id": None}, cursor, "created_at", direction)},
+        {"$sort": {"created_at": direction, "id": direction}}
+    ]
+    if offset and not cursor:
+        pipeline.append({"$skip": offset})
+    pipeline += [
+        {"$limit": limit},
+        # One extra reply tells whether the thread has more
+        {"$lookup": {
+            "from": "comments",
+            "localField": "id",
+            "foreignField": "root_id",
+            "pipeline": [
+                {"$sort": {"created_at": 1, "id": 1}},
+                {"$limit": replies_limit + 1}
+            ],
+            "as": "replies"
+        }}
+    ]
+    roots = await db.comments.aggregate(pipeline).to_list(limit)
+    set_next_cursor(response, roots, limit, "created_at")
+    
+    replies_by_root = {root["id"]: root.pop("replies") for root in roots}
+    shown_replies = [reply for replies in replies_by_root.values() for reply in replies[:replies_limit]]
+    
+    # Roots and replies are enriched together in one batch
+    enriched = {comment.id: comment for comment in await enrich_comments(db, roots + shown_replies, current_user_id)}
+    
+    threads = []
+    for root in roots:
+        replies = replies_by_root[root["id"]]
+        shown = replies[:replies_limit]
+        has_more = len(replies) > replies_limit
+        threads.append(enriched[root["id"]].copy(update={
+            "replies": [enriched[reply["id"]] for reply in shown],
+            "replies_cursor": encode_cursor(shown[-1]["created_at"], shown[-1]["id"]) if has_more else None
+        }))
+    return threads
+
 @router.get("/", response_model=List[CommentResponse])
 async def get_comments(
+    request: Request,
+    response: Response,
     post_id: str = Query(..., description="Post ID to get comments for"),
     limit: int = Query(50, le=100, description="Number of comments to return"),
-    offset: int = Query(0, ge=0, description="Number of comments to skip"),
+    order: str = Query("oldest", pattern="^(oldest|newest)$", description="Oldest or newest first"),
+    cursor: Optional[str] = Query(None, description="Opaque cursor from the X-Next-Cursor header of the previous page"),
+    offset: int = Query(0, ge=0, deprecated=True, description="Number of comments to skip (use cursor instead)"),
+    threaded: bool = Query(False, description="Return top-level comments with their first replies nested"),
+    replies_limit: int = Query(3, ge=1, le=20, description="Replies per thread when threaded"),
     current_user: UserInDB = Depends(get_current_active_user),
     db: AsyncIOMotorDatabase = Depends(get_database)
 ):
-    """Get comments for a specific post"""
+    """
+    Get comments for a specific post (supports If-None-Match). The next page's
+    cursor is returned in the X-Next-Cursor header.
+    """
     # Verify post exists and user has access
-    post = await db.posts.find_one({"id": post_id})
+    post = await db.posts.find_one({"id": post_id}, {"_id": 0, "garage_id": 1, "comment_version": 1})
     if not post:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -82,26 +181,36 @@ async def get_comments(
         )
     
     # Check access if it's a garage post
-    if post["garage_id"]:
-        garage = await db.garages.find_one({"id": post["garage_id"]})
-        if garage and garage["is_private"] and current_user.id not in garage["members"]:
-            raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN,
-                detail="Access denied to private garage post"
-            )
+    await access_resolver.require_post_access(db, current_user.id, post["garage_id"])
     
-    # Get comments sorted by creation date (oldest first for better conversation flow)
-    comments = await db.comments.find(
-        {"post_id": post_id}
-    ).sort("created_at", 1).skip(offset).limit(limit).to_list(limit)
+    # Every comment write bumps the post's comment_version, so the thread is
+    # unchanged for this viewer and page while it stays the same
+    etag = make_etag(
+        post_id, post.get("comment_version", 0), current_user.id,
+        limit, order, cursor, offset, threaded, replies_limit
+    )
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    response.headers["ETag"] = etag
     
-    # Enrich comments with author info
-    enriched_comments = []
-    for comment in comments:
-        enriched_comment = await get_comment_with_details(db, comment, current_user.id)
-        enriched_comments.append(enriched_comment)
+    direction = COMMENT_ORDERS[order]
+    if threaded:
+        return await load_threads(
+            db, response, post_id, current_user.id, limit, cursor, offset, direction, replies_limit
+        )
     
-    return enriched_comments
+    # Keyset over (post_id, created_at, id): every page costs the same
+    comments_cursor = db.comments.find(
+        apply_keyset({"post_id": post_id}, cursor, "created_at", direction)
+    ).sort([("created_at", direction), ("id", direction)])
+    if offset and not cursor:
+        # Deprecated: skip gets slower with depth
+        comments_cursor = comments_cursor.skip(offset)
+    comments = await comments_cursor.limit(limit).to_list(limit)
+    set_next_cursor(response, comments, limit, "created_at")
+    
+    # Enrich the whole page with author info in one batch
+    return await enrich_comments(db, comments, current_user.id)
 
 @router.get("/{comment_id}", response_model=CommentResponse)
 async def get_comment(
@@ -117,24 +226,42 @@ async def get_comment(
             detail="Comment not found"
         )
     
-    # Verify post exists and user has access
-    post = await db.posts.find_one({"id": comment["post_id"]})
-    if not post:
+    # Verify user has access to the post's garage
+    await access_resolver.require_post_access(db, current_user.id, await comment_garage_id(db, comment))
+    
+    return await get_comment_with_details(db, comment, current_user.id)
+
+@router.get("/{comment_id}/replies", response_model=List[CommentResponse])
+async def get_comment_replies(
+    comment_id: str,
+    response: Response,
+    limit: int = Query(20, le=100, description="Number of replies to return"),
+    cursor: Optional[str] = Query(None, description="Opaque cursor from replies_cursor or the X-Next-Cursor header"),
+    current_user: UserInDB = Depends(get_current_active_user),
+    db: AsyncIOMotorDatabase = Depends(get_database)
+):
+    """Get replies to a comment, oldest first. The next page's cursor is returned in the X-Next-Cursor header."""
+    comment = await db.comments.find_one(
+        {"id": comment_id},
+        {"_id": 0, "post_id": 1, "garage_id": 1, "root_id": 1}
+    )
+    if not comment:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
-            detail="Associated post not found"
+            detail="Comment not found"
         )
     
-    # Check access if it's a garage post
-    if post["garage_id"]:
-        garage = await db.garages.find_one({"id": post["garage_id"]})
-        if garage and garage["is_private"] and current_user.id not in garage["members"]:
-            raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN,
-                detail="Access denied to private garage post"
-            )
+    # Verify user has access to the post's garage
+    await access_resolver.require_post_access(db, current_user.id, await comment_garage_id(db, comment))
     
-    return await get_comment_with_details(db, comment, current_user.id)
+    # A top-level comment pages through its whole thread, a reply through its direct replies
+    query = {"parent_id": comment_id} if comment.get("root_id") else {"root_id": comment_id}
+    replies = await db.comments.find(
+        apply_keyset(query, cursor, "created_at", direction=1)
+    ).sort([("created_at", 1), ("id", 1)]).limit(limit).to_list(limit)
+    set_next_cursor(response, replies, limit, "created_at")
+    
+    return await enrich_comments(db, replies, current_user.id)
 
 @router.put("/{comment_id}", response_model=CommentResponse)
 async def update_comment(
@@ -166,6 +293,10 @@ async def update_comment(
         {"id": comment_id},
         {"$set": update_data}
     )
+    await db.posts.update_one(
+        {"id": comment["post_id"]},
+        {"$inc": {"comment_version": 1}}
+    )
     
     # Get updated comment
     updated_comment = await db.comments.find_one({"id": comment_id})
@@ -192,14 +323,30 @@ async def delete_comment(
             detail="Only the author can delete this comment"
         )
     
-    # Delete comment
-    await db.comments.delete_one({"id": comment_id})
+    # Delete comment together with the replies beneath it, and their likes
+    subtree = await db.comments.find(
+        {"$or": [{"id": comment_id}, {"path": comment_id}]}, {"_id": 0, "id": 1}
+    ).to_list(None)
+    subtree_ids = [doc["id"] for doc in subtree]
+    result = await db.comments.delete_many({"id": {"$in": subtree_ids}})
+    await db.comment_likes.delete_many({"comment_id": {"$in": subtree_ids}})
     
-    # Update post's comment count
-    await db.posts.update_one(
+    if comment.get("parent_id"):
+        await db.comments.update_one(
+            {"id": comment["parent_id"]},
+            {"$inc": {"reply_count": -1}}
+        )
+    
+    # Update post's comment count and hot value
+    post = await db.posts.find_one_and_update(
         {"id": comment["post_id"]},
-        {"$inc": {"comment_count": -1}}
+        ranked_increment({"comment_count": -result.deleted_count, "comment_version": 1}),
+        projection={"_id": 0, "garage_id": 1}
     )
+    if post:
+        feed_cache.invalidate(post["garage_id"])
+    await record_touches(db, "posts", [comment["post_id"]])
+    await record_touches(db, "comments", [comment.get("parent_id")])
     
     return {"message": "Comment deleted successfully"}
 
@@ -210,57 +357,27 @@ async def toggle_comment_like(
     db: AsyncIOMotorDatabase = Depends(get_database)
 ):
     """Toggle like on a comment"""
-    comment = await db.comments.find_one({"id": comment_id})
+    comment = await db.comments.find_one(
+        {"id": comment_id},
+        {"_id": 0, "id": 1, "post_id": 1, "garage_id": 1}
+    )
     if not comment:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Comment not found"
         )
     
-    # Verify post exists and user has access
-    post = await db.posts.find_one({"id": comment["post_id"]})
-    if not post:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Associated post not found"
-        )
+    # Verify user has access to the post's garage
+    await access_resolver.require_post_access(db, current_user.id, await comment_garage_id(db, comment))
     
-    # Check access if it's a garage post
-    if post["garage_id"]:
-        garage = await db.garages.find_one({"id": post["garage_id"]})
-        if garage and garage["is_private"] and current_user.id not in garage["members"]:
-            raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN,
-                detail="Access denied to private garage post"
-            )
-    
-    user_id = current_user.id
-    current_likes = comment.get("likes", [])
-    
-    # Toggle like
-    if user_id in current_likes:
-        # Remove like
-        new_likes = [uid for uid in current_likes if uid != user_id]
-        action = "removed"
-    else:
-        # Add like
-        new_likes = current_likes + [user_id]
-        action = "added"
-    
-    # Update comment
-    like_count = len(new_likes)
-    await db.comments.update_one(
-        {"id": comment_id},
-        {
-            "$set": {
-                "likes": new_likes,
-                "like_count": like_count
-            }
-        }
+    liked, like_count = await toggle_like(db, comment, current_user.id)
+    await db.posts.update_one(
+        {"id": comment["post_id"]},
+        {"$inc": {"comment_version": 1}}
     )
     
     return {
-        "message": f"Like {action}",
+        "message": f"Like {'added' if liked else 'removed'}",
         "like_count": like_count,
-        "user_liked": action == "added"
+        "user_liked": liked
     }
\ No newline at end of file
@@ -0,0 +1,34 @@
+from fastapi import APIRouter, HTTPException, status, Depends
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from typing import Any, Dict
+
+from models.deletion import DeletionResponse
+from models.user import UserInDB
+from auth import get_current_active_user
+from database import get_database
+from services.cascade import cascade_worker
+
+router = APIRouter(prefix="/deletions", tags=["deletions"])
+
+@router.get("/worker", response_model=Dict[str, Any])
+async def get_worker_stats(
+    current_user: UserInDB = Depends(get_current_active_user)
+):
+    """Counts and throughput of this process's cascade worker"""
+    return cascade_worker.stats()
+
+@router.get("/{deletion_id}", response_model=DeletionResponse)
+async def get_deletion(
+    deletion_id: str,
+    current_user: UserInDB = Depends(get_current_active_user),
+    db: AsyncIOMotorDatabase = Depends(get_database)
+):
+    """Status and per-step progress of a deletion the current user requested"""
+    deletion = await db.deletions.find_one({"id": deletion_id, "requested_by": current_user.id})
+    if not deletion:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Deletion not found"
+        )
+    
+    return DeletionResponse(**deletion)
@@ -6,6 +6,13 @@ from models.garage import GarageCreate, GarageUpdate, GarageResponse, JoinGarage
 from models.user import UserInDB
 from auth import get_current_active_user
 from database import get_database
+from models.deletion import DeletionKind
+from services import timeline
+from services.access import access_resolver
+from services.cascade import enqueue_deletion
+from services.feed_cache import feed_cache
+from services.principals import principal_cache
+from services.touches import record_touches
 
 router = APIRouter(prefix="/garages", tags=["garages"])
 
@@ -37,11 +44,14 @@ async def create_garage(
     # Save to database
     await db.garages.insert_one(new_garage.dict())
     
-    # Update user's garage list
+    # Update user's garage list; the filter keeps garage_count in step with it
     await db.users.update_one(
-        {"id": current_user.id},
-        {"$addToSet": {"garages": new_garage.id}}
+        {"id": current_user.id, "garages": {"$ne": new_garage.id}},
+        {"$push": {"garages": new_garage.id}, "$inc": {"garage_count": 1}}
     )
+    await record_touches(db, "users", [current_user.id])
+    principal_cache.invalidate(current_user.id)
+    access_resolver.invalidate(new_garage.id)
     
     return GarageResponse(**new_garage.dict())
 
@@ -132,9 +142,15 @@ async def join_garage(
     
     # Add garage to user's list
     await db.users.update_one(
-        {"id": current_user.id},
-        {"$addToSet": {"garages": garage_id}}
+        {"id": current_user.id, "garages": {"$ne": garage_id}},
+        {"$push": {"garages": garage_id}, "$inc": {"garage_count": 1}}
     )
+    await record_touches(db, "users", [current_user.id])
+    principal_cache.invalidate(current_user.id)
+    access_resolver.invalidate(garage_id)
+    
+    # Bring the garage's recent posts into the new member's home timeline
+    await timeline.add_member(db, current_user.id, garage)
     
     return {"message": "Successfully joined garage"}
 
@@ -177,9 +193,16 @@ async def leave_garage(
     
     # Remove garage from user's list
     await db.users.update_one(
-        {"id": current_user.id},
-        {"$pull": {"garages": garage_id}}
+        {"id": current_user.id, "garages": garage_id},
+        {"$pull": {"garages": garage_id}, "$inc": {"garage_count": -1}}
     )
+    principal_cache.invalidate(current_user.id)
+    access_resolver.invalidate(garage_id)
+    await record_touches(db, "garages", [garage_id])
+    await record_touches(db, "users", [current_user.id])
+    
+    # Drop the garage's posts from the former member's home timeline
+    await timeline.remove_member(db, current_user.id, garage_id)
     
     return {"message": "Successfully left garage"}
 
@@ -213,7 +236,40 @@ async def update_garage(
             {"id": garage_id},
             {"$set": update_data}
         )
+        access_resolver.invalidate(garage_id)
     
     # Get updated garage
     updated_garage = await db.garages.find_one({"id": garage_id})
-    return GarageResponse(**updated_garage)
\ No newline at end of file
+    return GarageResponse(**updated_garage)
+
+@router.delete("/{garage_id}", response_model=dict)
+async def delete_garage(
+    garage_id: str,
+    current_user: UserInDB = Depends(get_current_active_user),
+    db: AsyncIOMotorDatabase = Depends(get_database)
+):
+    """Delete garage (owner only)"""
+    garage = await db.garages.find_one({"id": garage_id})
+    if not garage:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Garage not found"
+        )
+    
+    if garage["owner_id"] != current_user.id:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Only the owner can delete this garage"
+        )
+    
+    await db.garages.delete_one({"id": garage_id})
+    access_resolver.invalidate(garage_id)
+    feed_cache.invalidate(garage_id)
+    
+    # Posts, memberships, timeline entries and the cover image are cleaned up
+    # in the background
+    deletion_id = await enqueue_deletion(
+        db, DeletionKind.GARAGE, garage_id, current_user.id, {"image_url": garage.get("image_url")}
+    )
+    
+    return {"message": "Garage deleted successfully", "deletion_id": deletion_id}
\ No newline at end of file
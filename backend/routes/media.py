@@ -14,6 +14,8 @@ from models.user import UserInDB
 from models.search import MediaUpload, MediaUploadResponse
 from auth import get_current_active_user
 from database import get_database
+from services.principals import principal_cache
+from services.user_summaries import user_summaries
 
 router = APIRouter(prefix="/media", tags=["media"])
 
@@ -76,6 +78,19 @@ class MediaService:
         
         return url_path
 
+    @staticmethod
+    def delete_file(url: str):
+        """Remove an uploaded file from disk given its public URL"""
+        try:
+            # Extract file path from URL
+            url_parts = url.split("/")
+            if len(url_parts) >= 2:
+                file_path = f"{UPLOAD_FOLDER}/{'/'.join(url_parts[-2:])}"
+                if os.path.exists(file_path):
+                    os.remove(file_path)
+        except Exception as e:
+            print(f"Error deleting file: {e}")
+
     @staticmethod
     def resize_image(file_content: bytes, max_width: int = 1920, max_height: int = 1080) -> bytes:
         """Resize image if it's too large"""
@@ -144,6 +159,8 @@ async def upload_profile_image(
         {"id": current_user.id},
         {"$set": {"profile_image_url": file_url}}
     )
+    principal_cache.invalidate(current_user.id)
+    user_summaries.invalidate(current_user.id)
     
     return MediaUploadResponse(**media.dict())
 
@@ -304,15 +321,7 @@ async def delete_media(
         )
     
     # Delete file from disk
-    try:
-        # Extract file path from URL
-        url_parts = media["url"].split("/")
-        if len(url_parts) >= 2:
-            file_path = f"{UPLOAD_FOLDER}/{'/'.join(url_parts[-2:])}"
-            if os.path.exists(file_path):
-                os.remove(file_path)
-    except Exception as e:
-        print(f"Error deleting file: {e}")
+    MediaService.delete_file(media["url"])
     
     # Delete from database
     await db.media.delete_one({"id": media_id})
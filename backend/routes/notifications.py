@@ -10,6 +10,8 @@ from models.notification import (
 )
 from auth import get_current_active_user
 from database import get_database
+from services.principals import principal_cache
+from services.user_summaries import user_summaries
 
 router = APIRouter(prefix="/notifications", tags=["notifications"])
 
@@ -153,9 +155,10 @@ async def get_notifications(
     notifications = await notifications_cursor.to_list(length=limit)
     
     # Enrich with sender info
+    senders = await user_summaries.get_many(db, (notification["sender_id"] for notification in notifications))
     enriched_notifications = []
     for notification in notifications:
-        sender = await db.users.find_one({"id": notification["sender_id"]})
+        sender = senders.get(notification["sender_id"])
         
         enriched_notification = NotificationResponse(
             **notification,
@@ -332,6 +335,7 @@ async def update_notification_settings(
             }
         }
     )
+    principal_cache.invalidate(current_user.id)
     
     return {"message": "Notification settings updated"}
 
@@ -1,40 +1,41 @@
-from fastapi import APIRouter, HTTPException, status, Depends, Query
+from fastapi import APIRouter, HTTPException, status, Depends, Query, Request, Response
 from motor.motor_asyncio import AsyncIOMotorDatabase
 from typing import List, Optional
 from datetime import datetime
-from models.post import PostCreate, PostUpdate, PostResponse, Post, PostVote
+from models.post import (
+    PostCreate, PostUpdate, PostResponse, Post, PostVote,
+    PostBatchRequest, PostBatchItem, PostBatchResponse
+)
 from models.user import UserInDB
 from models.garage import Garage
+from models.deletion import DeletionKind
 from auth import get_current_active_user
 from database import get_database
+from services.access import access_resolver
+from services.cascade import enqueue_deletion, post_context
+from services.enrichment import enrich_posts, overlay_user_votes
+from services.etag import etag_matches, make_etag, not_modified
+from services.feed_cache import feed_cache
+from services.fields import (
+    POST_CARD_FIELDS, POST_CARD_PROJECTION, POST_FIELDS, parse_fields, sparse_projection, sparse_response
+)
+from services.pagination import NEXT_CURSOR_HEADER, apply_keyset, set_next_cursor
+from services.principals import principal_cache
+from services.ranking import FEED_SORT_FIELDS, hot_score, top_window_start
+from services.timeline import fan_out_post, read_home_timeline
+from services.views import view_buffer
+from services.votes import apply_post_vote, fetch_user_votes
 
 router = APIRouter(prefix="/posts", tags=["posts"])
 
+# Stored fields a post read needs whatever fieldset was requested: the keyset
+# cursor, access checks and the author lookup
+POST_KEY_FIELDS = ("id", "created_at", "author_id", "garage_id")
+
 async def get_post_with_details(db: AsyncIOMotorDatabase, post_doc: dict, current_user_id: str) -> PostResponse:
     """Helper function to enrich post data with author and garage info"""
-    # Get author info
-    author = await db.users.find_one({"id": post_doc["author_id"]})
-    
-    # Get garage info if it's a garage post
-    garage_name = None
-    if post_doc.get("garage_id"):
-        garage = await db.garages.find_one({"id": post_doc["garage_id"]})
-        garage_name = garage.get("name") if garage else None
-    
-    # Determine user's vote
-    user_vote = None
-    if current_user_id in post_doc.get("likes", []):
-        user_vote = "like"
-    elif current_user_id in post_doc.get("dislikes", []):
-        user_vote = "dislike"
-    
-    return PostResponse(
-        **post_doc,
-        author_username=author.get("username") if author else None,
-        author_full_name=author.get("full_name") if author else None,
-        garage_name=garage_name,
-        user_vote=user_vote
-    )
+    enriched_posts = await enrich_posts(db, [post_doc], current_user_id)
+    return enriched_posts[0]
 
 @router.post("/", response_model=PostResponse)
 async def create_post(
@@ -44,6 +45,7 @@ async def create_post(
 ):
     """Create a new post"""
     # If it's a garage post, verify user is a member
+    garage = None
     if post_data.garage_id:
         garage = await db.garages.find_one({"id": post_data.garage_id})
         if not garage:
@@ -61,6 +63,7 @@ async def create_post(
     # Create new post
     post_dict = post_data.dict()
     new_post = Post(**post_dict, author_id=current_user.id)
+    new_post.hot = hot_score(0, 0, new_post.created_at)
     
     # Save to database
     await db.posts.insert_one(new_post.dict())
@@ -70,6 +73,7 @@ async def create_post(
         {"id": current_user.id},
         {"$inc": {"post_count": 1}}
     )
+    principal_cache.invalidate(current_user.id)
     
     # Update garage's post count if garage post
     if post_data.garage_id:
@@ -78,23 +82,86 @@ async def create_post(
             {"$inc": {"post_count": 1}}
         )
     
+    # Push garage posts into members' home timelines
+    await fan_out_post(db, new_post.dict(), garage)
+    feed_cache.invalidate(post_data.garage_id)
+    
     # Return enriched post data
     return await get_post_with_details(db, new_post.dict(), current_user.id)
 
+async def find_feed_page(
+    db: AsyncIOMotorDatabase,
+    query: dict,
+    sort: str,
+    window: str,
+    limit: int,
+    cursor: Optional[str],
+    offset: int = 0,
+    post_projection: dict = POST_CARD_PROJECTION
+) -> List[dict]:
+    """Read one page of posts matching query in the given ranking order"""
+    sort_field = FEED_SORT_FIELDS[sort]
+    
+    window_start = top_window_start(window) if sort == "top" else None
+    if window_start:
+        query = {"$and": [query, {"created_at": {"$gte": window_start}}]}
+    
+    # id breaks ties so pages never overlap
+    query = apply_keyset(query, cursor, sort_field)
+    posts_cursor = db.posts.find(query, post_projection).sort([(sort_field, -1), ("id", -1)])
+    if offset and not cursor:
+        # Deprecated: skip gets slower with depth and shifts as new posts land
+        posts_cursor = posts_cursor.skip(offset)
+    return await posts_cursor.limit(limit).to_list(limit)
+
+async def load_feed_page(
+    db: AsyncIOMotorDatabase,
+    current_user: UserInDB,
+    garage_id: Optional[str],
+    sort: str,
+    window: str,
+    limit: int,
+    cursor: Optional[str],
+    offset: int,
+    post_projection: dict = POST_CARD_PROJECTION
+) -> List[dict]:
+    """Read one raw page of the garage feed or the user's home feed"""
+    if garage_id:
+        return await find_feed_page(db, {"garage_id": garage_id}, sort, window, limit, cursor, offset, post_projection)
+    
+    if sort == "new" and (cursor or not offset):
+        # Home feed: materialized timeline merged with general and large-garage posts
+        return await read_home_timeline(db, current_user, limit, cursor, post_projection)
+    
+    # Ranked home feed (or deprecated offset paging): user's garages + general posts
+    user_garages = current_user.garages or []
+    query = {
+        "$or": [
+            {"garage_id": None},  # General posts
+            {"garage_id": {"$in": user_garages}}  # Posts from user's garages
+        ]
+    }
+    return await find_feed_page(db, query, sort, window, limit, cursor, offset, post_projection)
+
 @router.get("/", response_model=List[PostResponse])
 async def get_posts(
+    response: Response,
     garage_id: Optional[str] = Query(None, description="Filter by garage ID"),
+    sort: str = Query("new", pattern="^(new|hot|top)$", description="Ranking: new, hot or top"),
+    window: str = Query("all", pattern="^(day|week|all)$", description="Time window for top ranking"),
     limit: int = Query(20, le=50, description="Number of posts to return"),
-    offset: int = Query(0, ge=0, description="Number of posts to skip"),
+    cursor: Optional[str] = Query(None, description="Opaque cursor from the X-Next-Cursor header of the previous page"),
+    offset: int = Query(0, ge=0, deprecated=True, description="Number of posts to skip (use cursor instead)"),
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return"),
     current_user: UserInDB = Depends(get_current_active_user),
     db: AsyncIOMotorDatabase = Depends(get_database)
 ):
-    """Get posts feed"""
-    query = {}
+    """Get posts feed. The next page's cursor is returned in the X-Next-Cursor header."""
+    selected_fields = parse_fields(fields, POST_FIELDS)
     
     if garage_id:
         # Get posts from specific garage
-        garage = await db.garages.find_one({"id": garage_id})
+        garage = await access_resolver.get(db, garage_id)
         if not garage:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -102,42 +169,112 @@ async def get_posts(
             )
         
         # Check access to garage
-        if garage["is_private"] and current_user.id not in garage["members"]:
+        if not garage.allows(current_user.id):
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
                 detail="Access denied to private garage"
             )
         
-        query["garage_id"] = garage_id
+        audiences = [garage_id]
     else:
-        # Get posts from user's garages + general posts
-        user_garages = current_user.garages or []
-        query = {
-            "$or": [
-                {"garage_id": None},  # General posts
-                {"garage_id": {"$in": user_garages}}  # Posts from user's garages
-            ]
-        }
-    
-    # Get posts sorted by creation date (latest first)
-    posts = await db.posts.find(query).sort("created_at", -1).skip(offset).limit(limit).to_list(limit)
-    
-    # Enrich posts with author and garage info
-    enriched_posts = []
-    for post in posts:
-        enriched_post = await get_post_with_details(db, post, current_user.id)
-        enriched_posts.append(enriched_post)
-    
-    return enriched_posts
+        audiences = [None] + (current_user.garages or [])
+    
+    # Pages are shared by every viewer of the same audience; offset paging is not cached
+    cacheable = bool(cursor) or not offset
+    cache_key = feed_cache.key(audiences, sort, window, cursor, limit, tuple(selected_fields or ()))
+    page = feed_cache.get(cache_key) if cacheable else None
+    
+    if page is None:
+        # A fieldset narrows what is read and which lookups are made
+        post_projection = sparse_projection(
+            selected_fields, POST_CARD_FIELDS, POST_KEY_FIELDS + (FEED_SORT_FIELDS[sort],)
+        )
+        posts = await load_feed_page(db, current_user, garage_id, sort, window, limit, cursor, offset, post_projection)
+        next_cursor = set_next_cursor(response, posts, limit, FEED_SORT_FIELDS[sort])
+        
+        # Enrich the whole page with author and garage info in one batch
+        enriched_posts = await enrich_posts(db, posts, None, fields=selected_fields)
+        if cacheable:
+            feed_cache.set(cache_key, enriched_posts, next_cursor)
+    else:
+        enriched_posts, next_cursor = page
+        if next_cursor:
+            response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    
+    # The viewer's own votes are never part of the shared page
+    if selected_fields and "user_vote" not in selected_fields:
+        posts = enriched_posts
+    else:
+        posts = await overlay_user_votes(db, enriched_posts, current_user.id)
+    
+    if selected_fields:
+        return sparse_response(posts, selected_fields, headers={NEXT_CURSOR_HEADER: next_cursor} if next_cursor else None)
+    return posts
+
+@router.post("/batch", response_model=PostBatchResponse)
+async def get_posts_batch(
+    batch: PostBatchRequest,
+    current_user: UserInDB = Depends(get_current_active_user),
+    db: AsyncIOMotorDatabase = Depends(get_database)
+):
+    """Get many posts by ID. Items come back in request order, with an error for each missing or private post."""
+    post_ids = list(dict.fromkeys(batch.ids))
+    posts = await db.posts.find({"id": {"$in": post_ids}}, POST_CARD_PROJECTION).to_list(len(post_ids))
+    
+    # Access is decided for all the posts' garages at once
+    denied_garages = await access_resolver.denied_garages(
+        db, current_user.id, (post.get("garage_id") for post in posts)
+    )
+    
+    visible_posts = [post for post in posts if post.get("garage_id") not in denied_garages]
+    enriched = {
+        post.id: post
+        for post in await enrich_posts(db, visible_posts, current_user.id)
+    }
+    found_ids = {post["id"] for post in posts}
+    
+    items = []
+    for post_id in batch.ids:
+        if post_id in enriched:
+            items.append(PostBatchItem(id=post_id, post=enriched[post_id]))
+        elif post_id in found_ids:
+            items.append(PostBatchItem(id=post_id, error="forbidden"))
+        else:
+            items.append(PostBatchItem(id=post_id, error="not_found"))
+    return PostBatchResponse(items=items)
+
+def post_etag(post: dict, user_vote: Optional[str], fields: Optional[List[str]] = None) -> str:
+    """
+    ETag over everything a single-post response depends on, except the view
+    counters: every request counts as a view, so including them would change
+    the tag on each poll. Those counts are allowed to lag.
+    """
+    return make_etag(
+        fields,
+        post["id"],
+        post.get("updated_at"),
+        post.get("like_count", 0),
+        post.get("dislike_count", 0),
+        post.get("comment_count", 0),
+        post.get("hot", 0),
+        user_vote
+    )
 
 @router.get("/{post_id}", response_model=PostResponse)
 async def get_post(
     post_id: str,
+    request: Request,
+    response: Response,
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return"),
     current_user: UserInDB = Depends(get_current_active_user),
     db: AsyncIOMotorDatabase = Depends(get_database)
 ):
-    """Get specific post by ID"""
-    post = await db.posts.find_one({"id": post_id})
+    """Get specific post by ID (supports If-None-Match)"""
+    selected_fields = parse_fields(fields, POST_FIELDS)
+    # updated_at keeps the ETag of a narrowed read changing with edits
+    post = await db.posts.find_one(
+        {"id": post_id}, sparse_projection(selected_fields, POST_CARD_FIELDS, POST_KEY_FIELDS + ("updated_at",))
+    )
     if not post:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -145,15 +282,23 @@ async def get_post(
         )
     
     # Check access if it's a garage post
-    if post["garage_id"]:
-        garage = await db.garages.find_one({"id": post["garage_id"]})
-        if garage and garage["is_private"] and current_user.id not in garage["members"]:
-            raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN,
-                detail="Access denied to private garage post"
-            )
+    await access_resolver.require_post_access(db, current_user.id, post["garage_id"])
+    
+    # Revalidations count as views too; the write is buffered
+    view_buffer.record(post_id, current_user.id)
     
-    return await get_post_with_details(db, post, current_user.id)
+    # Answer conditional requests before doing any enrichment
+    user_votes = await fetch_user_votes(db, [post_id], current_user.id)
+    etag = post_etag(post, user_votes.get(post_id), selected_fields)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    response.headers["ETag"] = etag
+    
+    enriched_posts = await enrich_posts(db, [post], None, fields=selected_fields)
+    enriched_post = enriched_posts[0].copy(update={"user_vote": user_votes.get(post_id)})
+    if selected_fields:
+        return sparse_response(enriched_post, selected_fields, headers={"ETag": etag})
+    return enriched_post
 
 @router.put("/{post_id}", response_model=PostResponse)
 async def update_post(
@@ -185,6 +330,7 @@ async def update_post(
             {"id": post_id},
             {"$set": update_data}
         )
+        feed_cache.invalidate(post["garage_id"])
     
     # Get updated post
     updated_post = await db.posts.find_one({"id": post_id})
@@ -213,15 +359,14 @@ async def delete_post(
     
     # Delete post
     await db.posts.delete_one({"id": post_id})
-    
-    # Delete all comments on this post
-    await db.comments.delete_many({"post_id": post_id})
+    feed_cache.invalidate(post["garage_id"])
     
     # Update user's post count
     await db.users.update_one(
         {"id": current_user.id},
         {"$inc": {"post_count": -1}}
     )
+    principal_cache.invalidate(current_user.id)
     
     # Update garage's post count if garage post
     if post["garage_id"]:
@@ -230,7 +375,13 @@ async def delete_post(
             {"$inc": {"post_count": -1}}
         )
     
-    return {"message": "Post deleted successfully"}
+    # Comments, votes, saved references, notifications, timeline entries and
+    # media are cleaned up in the background
+    deletion_id = await enqueue_deletion(
+        db, DeletionKind.POST, post_id, current_user.id, post_context(post)
+    )
+    
+    return {"message": "Post deleted successfully", "deletion_id": deletion_id}
 
 @router.post("/{post_id}/vote", response_model=dict)
 async def vote_on_post(
@@ -240,7 +391,7 @@ async def vote_on_post(
     db: AsyncIOMotorDatabase = Depends(get_database)
 ):
     """Vote on a post (like/dislike/remove vote)"""
-    post = await db.posts.find_one({"id": post_id})
+    post = await db.posts.find_one({"id": post_id}, {"_id": 0, "id": 1, "garage_id": 1})
     if not post:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -248,51 +399,13 @@ async def vote_on_post(
         )
     
     # Check access if it's a garage post
-    if post["garage_id"]:
-        garage = await db.garages.find_one({"id": post["garage_id"]})
-        if garage and garage["is_private"] and current_user.id not in garage["members"]:
-            raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN,
-                detail="Access denied to private garage post"
-            )
+    await access_resolver.require_post_access(db, current_user.id, post["garage_id"])
     
-    user_id = current_user.id
-    current_likes = post.get("likes", [])
-    current_dislikes = post.get("dislikes", [])
-    
-    # Remove user from both lists first
-    new_likes = [uid for uid in current_likes if uid != user_id]
-    new_dislikes = [uid for uid in current_dislikes if uid != user_id]
-    
-    # Add vote based on vote_type
-    if vote_data.vote_type == "like":
-        new_likes.append(user_id)
-    elif vote_data.vote_type == "dislike":
-        new_dislikes.append(user_id)
-    # For "remove", we just keep the user removed from both lists
-    
-    # Calculate new counts and score
-    like_count = len(new_likes)
-    dislike_count = len(new_dislikes)
-    score = like_count - dislike_count
-    
-    # Update post
-    await db.posts.update_one(
-        {"id": post_id},
-        {
-            "$set": {
-                "likes": new_likes,
-                "dislikes": new_dislikes,
-                "like_count": like_count,
-                "dislike_count": dislike_count,
-                "score": score
-            }
-        }
-    )
+    # Record the vote and adjust the counters atomically
+    counts = await apply_post_vote(db, post_id, current_user.id, vote_data.vote_type)
+    feed_cache.invalidate(post["garage_id"])
     
     return {
         "message": f"Vote {vote_data.vote_type} recorded",
-        "like_count": like_count,
-        "dislike_count": dislike_count,
-        "score": score
-    }
\ No newline at end of file
+        **counts
+    }
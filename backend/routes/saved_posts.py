@@ -7,6 +7,10 @@ from models.user import UserInDB
 from models.post import PostResponse
 from auth import get_current_active_user
 from database import get_database
+from services.access import access_resolver
+from services.enrichment import enrich_posts
+from services.fields import POST_CARD_PROJECTION
+from services.principals import principal_cache
 
 router = APIRouter(prefix="/saved", tags=["saved-posts"])
 
@@ -18,7 +22,7 @@ async def save_post(
 ):
     """Save a post to user's saved collection"""
     # Check if post exists
-    post = await db.posts.find_one({"id": post_id})
+    post = await db.posts.find_one({"id": post_id}, {"_id": 0, "author_id": 1, "garage_id": 1})
     if not post:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -27,8 +31,8 @@ async def save_post(
     
     # Check if post is accessible (privacy check)
     if post.get("garage_id"):
-        garage = await db.garages.find_one({"id": post["garage_id"]})
-        if garage and garage.get("is_private", False) and current_user.id not in garage.get("members", []):
+        garage = await access_resolver.get(db, post["garage_id"])
+        if garage and not garage.allows(current_user.id):
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
                 detail="Cannot save post from private garage you're not a member of"
@@ -46,6 +50,7 @@ async def save_post(
         {"id": current_user.id},
         {"$push": {"saved_posts": post_id}}
     )
+    principal_cache.invalidate(current_user.id)
     
     # Create notification for post author (optional)
     if post["author_id"] != current_user.id:
@@ -82,6 +87,7 @@ async def unsave_post(
         {"id": current_user.id},
         {"$pull": {"saved_posts": post_id}}
     )
+    principal_cache.invalidate(current_user.id)
     
     return {"message": "Post removed from saved list"}
 
@@ -99,42 +105,20 @@ async def get_saved_posts(
         return []
     
     # Get saved posts
-    posts_cursor = db.posts.find({"id": {"$in": saved_post_ids}})
+    posts_cursor = db.posts.find({"id": {"$in": saved_post_ids}}, POST_CARD_PROJECTION)
     posts = await posts_cursor.to_list(length=limit)
     
+    # Drop posts from private garages the user has since left
+    denied_garages = await access_resolver.denied_garages(
+        db, current_user.id, (post.get("garage_id") for post in posts)
+    )
+    
     # Sort by save order (maintain original order from saved_posts list)
-    posts_dict = {post["id"]: post for post in posts}
+    posts_dict = {post["id"]: post for post in posts if post.get("garage_id") not in denied_garages}
     ordered_posts = [posts_dict[post_id] for post_id in saved_post_ids if post_id in posts_dict]
     
-    # Enrich posts with author and garage info
-    enriched_posts = []
-    for post in ordered_posts:
-        # Get author info
-        author = await db.users.find_one({"id": post["author_id"]})
-        
-        # Get garage info if it's a garage post
-        garage_name = None
-        if post.get("garage_id"):
-            garage = await db.garages.find_one({"id": post["garage_id"]})
-            garage_name = garage.get("name") if garage else None
-        
-        # Determine user's vote on this post
-        user_vote = None
-        if current_user.id in post.get("likes", []):
-            user_vote = "like"
-        elif current_user.id in post.get("dislikes", []):
-            user_vote = "dislike"
-        
-        enriched_post = PostResponse(
-            **post,
-            author_username=author.get("username") if author else "Unknown",
-            author_full_name=author.get("full_name") if author else "Unknown",
-            garage_name=garage_name,
-            user_vote=user_vote
-        )
-        enriched_posts.append(enriched_post)
-    
-    return enriched_posts
+    # Enrich posts with author and garage info in one batch
+    return await enrich_posts(db, ordered_posts, current_user.id, missing_author="Unknown")
 
 @router.get("/posts/count", response_model=dict)
 async def get_saved_posts_count(
@@ -162,6 +146,7 @@ async def clear_saved_posts(
         {"id": current_user.id},
         {"$set": {"saved_posts": []}}
     )
+    principal_cache.invalidate(current_user.id)
     
     return {"message": "All saved posts cleared"}
 
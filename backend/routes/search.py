@@ -8,6 +8,10 @@ from models.search import SearchQuery, SearchResult, SearchResponse, HashtagResu
 from models.post import PostResponse
 from auth import get_current_active_user
 from database import get_database
+from services.enrichment import enrich_posts
+from services.fields import POST_CARD_PROJECTION, USER_CARD_PROJECTION
+from services.follows import followed_among
+from services.user_summaries import user_summaries
 
 router = APIRouter(prefix="/search", tags=["search"])
 
@@ -46,12 +50,11 @@ class SearchService:
         }
         
         # Execute search
-        users_cursor = db.users.find(search_filter).skip(offset).limit(limit)
+        users_cursor = db.users.find(search_filter, USER_CARD_PROJECTION).skip(offset).limit(limit)
         users = await users_cursor.to_list(length=limit)
         
-        # Get current user's following list
-        current_user = await db.users.find_one({"id": current_user_id})
-        following_list = current_user.get("following", []) if current_user else []
+        # Which of these users the current user follows
+        following_list = await followed_among(db, current_user_id, [user["id"] for user in users])
         
         # Format results
         results = []
@@ -85,7 +88,7 @@ class SearchService:
         search_pattern = SearchService.create_search_regex(query)
         
         # Get user's accessible garages
-        current_user = await db.users.find_one({"id": current_user_id})
+        current_user = await db.users.find_one({"id": current_user_id}, {"_id": 0, "garages": 1})
         user_garages = current_user.get("garages", []) if current_user else []
         
         # Create search filter
@@ -107,28 +110,12 @@ class SearchService:
         }
         
         # Execute search
-        posts_cursor = db.posts.find(search_filter).sort("created_at", -1).skip(offset).limit(limit)
+        posts_cursor = db.posts.find(search_filter, POST_CARD_PROJECTION).sort("created_at", -1).skip(offset).limit(limit)
         posts = await posts_cursor.to_list(length=limit)
         
-        # Enrich posts with author info
-        enriched_posts = []
-        for post in posts:
-            author = await db.users.find_one({"id": post["author_id"]})
-            garage_name = None
-            
-            if post.get("garage_id"):
-                garage = await db.garages.find_one({"id": post["garage_id"]})
-                garage_name = garage.get("name") if garage else None
-            
-            enriched_post = {
-                **post,
-                "author_username": author.get("username") if author else "Unknown",
-                "author_full_name": author.get("full_name") if author else "Unknown",
-                "garage_name": garage_name
-            }
-            enriched_posts.append(enriched_post)
-        
-        return enriched_posts
+        # Enrich posts with author and garage info in one batch
+        enriched_posts = await enrich_posts(db, posts, current_user_id, missing_author="Unknown")
+        return [post.dict() for post in enriched_posts]
 
     @staticmethod
     async def search_garages(
@@ -164,9 +151,10 @@ class SearchService:
         garages = await garages_cursor.to_list(length=limit)
         
         # Enrich with owner info
+        owners = await user_summaries.get_many(db, (garage["owner_id"] for garage in garages))
         enriched_garages = []
         for garage in garages:
-            owner = await db.users.find_one({"id": garage["owner_id"]})
+            owner = owners.get(garage["owner_id"])
             enriched_garage = {
                 **garage,
                 "owner_username": owner.get("username") if owner else "Unknown",
@@ -187,7 +175,7 @@ class SearchService:
         search_pattern = SearchService.create_search_regex(query)
         
         # Get user's accessible garages
-        current_user = await db.users.find_one({"id": current_user_id})
+        current_user = await db.users.find_one({"id": current_user_id}, {"_id": 0, "garages": 1})
         user_garages = current_user.get("garages", []) if current_user else []
         
         # Aggregate hashtags from accessible posts
@@ -14,6 +14,7 @@ from models.user import (
 )
 from auth import AuthService, ACCESS_TOKEN_EXPIRE_MINUTES
 from database import get_database
+from services.principals import principal_cache
 
 router = APIRouter(prefix="/auth/social", tags=["social-authentication"])
 
@@ -163,6 +164,7 @@ async def google_login(
                 {"id": existing_user.id},
                 {"$push": {"social_logins": social_login.dict()}}
             )
+            principal_cache.invalidate(existing_user.id)
         
         user = existing_user
     else:
@@ -259,6 +261,7 @@ async def facebook_login(
                 {"id": existing_user.id},
                 {"$push": {"social_logins": social_login.dict()}}
             )
+            principal_cache.invalidate(existing_user.id)
         
         user = existing_user
     else:
@@ -351,6 +354,7 @@ async def apple_login(
                 {"id": existing_user.id},
                 {"$push": {"social_logins": social_login.dict()}}
             )
+            principal_cache.invalidate(existing_user.id)
         
         user = existing_user
     else:
@@ -1,26 +1,47 @@
-from fastapi import APIRouter, HTTPException, status, Depends, Query
+from fastapi import APIRouter, BackgroundTasks, HTTPException, status, Depends, Query, Request, Response
 from motor.motor_asyncio import AsyncIOMotorDatabase
 from typing import List, Optional
 from datetime import datetime
 
+from models.post import PostResponse
 from models.user import (
-    UserResponse, UserUpdate, UserInDB, FollowRequest, 
-    UserSearchResult, UserStats
+    UserProfile, UserResponse, UserUpdate, UserInDB, FollowRequest, 
+    UserSearchResult, UserStats, UserSuggestion
 )
-from models.notification import NotificationCreate, Notification
 from auth import get_current_active_user
 from database import get_database
+from routes.notifications import NotificationService
+from models.deletion import DeletionKind
+from services.access import access_resolver
+from services.cascade import enqueue_deletion
+from services.enrichment import enrich_posts
+from services.etag import etag_matches, make_etag, not_modified
+from services.fields import (
+    POST_CARD_PROJECTION, USER_CARD_PROJECTION, USER_FIELDS, USER_PROFILE_PROJECTION,
+    parse_fields, profile_response, projection, sparse_response
+)
+from services.follows import (
+    add_follow, followed_among, follower_edges, following_edges, is_following, remove_follow
+)
+from services.pagination import apply_keyset, set_next_cursor
+from services.principals import principal_cache
+from services.user_summaries import user_summaries
 
 router = APIRouter(prefix="/users", tags=["users"])
 
-@router.get("/me", response_model=UserResponse)
+@router.get("/me", response_model=UserProfile)
 async def get_current_user_profile(
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return"),
+    full: bool = Query(False, description="Include the saved, liked, garage and blocked lists (legacy shape)"),
     current_user: UserInDB = Depends(get_current_active_user)
 ):
     """Get current user profile"""
-    return UserResponse(**current_user.dict())
+    selected_fields = parse_fields(fields, USER_FIELDS)
+    if selected_fields:
+        return sparse_response(current_user, selected_fields)
+    return profile_response(current_user.dict(), full)
 
-@router.put("/me", response_model=UserResponse)
+@router.put("/me", response_model=UserProfile)
 async def update_current_user_profile(
     user_update: UserUpdate,
     current_user: UserInDB = Depends(get_current_active_user),
@@ -35,48 +56,214 @@ async def update_current_user_profile(
             {"id": current_user.id},
             {"$set": update_data}
         )
+        principal_cache.invalidate(current_user.id)
+        user_summaries.invalidate(current_user.id)
     
     # Get updated user
-    updated_user = await db.users.find_one({"id": current_user.id})
-    return UserResponse(**updated_user)
+    updated_user = await db.users.find_one({"id": current_user.id}, USER_PROFILE_PROJECTION)
+    return UserProfile(**updated_user)
+
+@router.delete("/me", response_model=dict)
+async def delete_current_user(
+    current_user: UserInDB = Depends(get_current_active_user),
+    db: AsyncIOMotorDatabase = Depends(get_database)
+):
+    """Delete the current user's account"""
+    # Deactivating locks the account out immediately; the document itself and
+    # everything the user created are removed in the background
+    await db.users.update_one(
+        {"id": current_user.id},
+        {"$set": {"is_active": False, "updated_at": datetime.utcnow()}}
+    )
+    principal_cache.invalidate(current_user.id)
+    user_summaries.invalidate(current_user.id)
+    
+    deletion_id = await enqueue_deletion(db, DeletionKind.USER, current_user.id, current_user.id)
+    
+    return {"message": "Account scheduled for deletion", "deletion_id": deletion_id}
+
+@router.get("/suggestions", response_model=List[UserSuggestion])
+async def get_follow_suggestions(
+    limit: int = Query(10, ge=1, le=50),
+    current_user: UserInDB = Depends(get_current_active_user),
+    db: AsyncIOMotorDatabase = Depends(get_database)
+):
+    """People the current user may know (precomputed by services/suggestions.py)"""
+    suggestions = await db.suggestions.find_one({"user_id": current_user.id}, {"_id": 0, "candidates": 1})
+    candidates = (suggestions or {}).get("candidates", [])
+    if not candidates:
+        return []
+    
+    # Suggestions are refreshed offline; drop anyone followed since
+    followed = await followed_among(db, current_user.id, [candidate["user_id"] for candidate in candidates])
+    candidates = [candidate for candidate in candidates if candidate["user_id"] not in followed][:limit]
+    
+    users = await db.users.find(
+        {"id": {"$in": [candidate["user_id"] for candidate in candidates]}, "is_active": True},
+        USER_CARD_PROJECTION
+    ).to_list(length=len(candidates))
+    users_by_id = {user["id"]: user for user in users}
+    
+    result = []
+    for candidate in candidates:
+        user = users_by_id.get(candidate["user_id"])
+        if not user:
+            continue
+        result.append(UserSuggestion(
+            id=user["id"],
+            username=user["username"],
+            full_name=user["full_name"],
+            profile_image_url=user.get("profile_image_url"),
+            bio=user.get("bio"),
+            followers_count=user.get("followers_count", 0),
+            is_following=False,
+            is_private=user.get("is_private", False),
+            mutual_follows=candidate.get("mutual_follows", 0),
+            shared_garages=candidate.get("shared_garages", 0)
+        ))
+    
+    return result
+
+@router.get("/me/liked-posts", response_model=List[PostResponse])
+async def get_liked_posts(
+    response: Response,
+    limit: int = Query(20, ge=1, le=50),
+    cursor: Optional[str] = Query(None, description="Opaque cursor from the X-Next-Cursor header of the previous page"),
+    current_user: UserInDB = Depends(get_current_active_user),
+    db: AsyncIOMotorDatabase = Depends(get_database)
+):
+    """Posts the current user liked, most recent like first"""
+    votes = await db.post_votes.find(
+        apply_keyset({"user_id": current_user.id, "vote_type": "like"}, cursor, "updated_at", id_field="post_id"),
+        {"_id": 0, "post_id": 1, "updated_at": 1}
+    ).sort([("updated_at", -1), ("post_id", -1)]).limit(limit).to_list(limit)
+    set_next_cursor(response, votes, limit, "updated_at", id_field="post_id")
+    
+    post_ids = [vote["post_id"] for vote in votes]
+    if not post_ids:
+        return []
+    
+    posts = await db.posts.find({"id": {"$in": post_ids}}, POST_CARD_PROJECTION).to_list(len(post_ids))
+    
+    # Drop posts from private garages the user has since left
+    denied_garages = await access_resolver.denied_garages(
+        db, current_user.id, (post.get("garage_id") for post in posts)
+    )
+    posts_by_id = {post["id"]: post for post in posts if post.get("garage_id") not in denied_garages}
+    
+    # Keep the likes' order
+    ordered_posts = [posts_by_id[post_id] for post_id in post_ids if post_id in posts_by_id]
+    return await enrich_posts(db, ordered_posts, current_user.id, missing_author="Unknown")
+
+@router.get("/me/blocked", response_model=List[UserSearchResult])
+async def get_blocked_users(
+    limit: int = Query(20, ge=1, le=50),
+    offset: int = Query(0, ge=0, description="Number of blocked users to skip"),
+    current_user: UserInDB = Depends(get_current_active_user),
+    db: AsyncIOMotorDatabase = Depends(get_database)
+):
+    """Users the current user blocked, in blocking order"""
+    blocked_ids = current_user.blocked_users[offset:offset + limit]
+    if not blocked_ids:
+        return []
+    
+    users = await db.users.find({"id": {"$in": blocked_ids}}, USER_CARD_PROJECTION).to_list(length=len(blocked_ids))
+    users_by_id = {user["id"]: user for user in users}
+    followed = await followed_among(db, current_user.id, blocked_ids)
+    
+    return [
+        UserSearchResult(**users_by_id[user_id], is_following=user_id in followed)
+        for user_id in blocked_ids
+        if user_id in users_by_id
+    ]
+
+def user_etag(user_doc: dict, full_profile: bool, fields: Optional[List[str]] = None, full: bool = False) -> str:
+    """
+    ETag over the stored profile. Many write paths touch user documents
+    without bumping updated_at, so the stored fields are hashed directly;
+    this is still far cheaper than validating and serializing the response.
+    """
+    return make_etag(
+        full_profile,
+        full,
+        fields,
+        [(key, value) for key, value in user_doc.items() if key not in ("_id", "hashed_password")]
+    )
 
-@router.get("/{user_id}", response_model=UserResponse)
+@router.get("/{user_id}", response_model=UserProfile)
 async def get_user_profile(
     user_id: str,
+    request: Request,
+    response: Response,
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return"),
+    full: bool = Query(False, description="Include the saved, liked, garage and blocked lists (legacy shape)"),
     current_user: UserInDB = Depends(get_current_active_user),
     db: AsyncIOMotorDatabase = Depends(get_database)
 ):
-    """Get user profile by ID"""
-    user = await db.users.find_one({"id": user_id})
+    """Get user profile by ID (supports If-None-Match)"""
+    selected_fields = parse_fields(fields, USER_FIELDS)
+    if selected_fields:
+        # The limited profile of a private account needs these regardless
+        user_projection = projection(selected_fields + [
+            "is_private", "username", "full_name", "profile_image_url",
+            "followers_count", "following_count", "created_at"
+        ])
+    elif full:
+        user_projection = None
+    else:
+        # The arrays never leave MongoDB for the compact profile
+        user_projection = USER_PROFILE_PROJECTION
+    
+    user = await db.users.find_one({"id": user_id}, user_projection)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="User not found"
         )
     
+    # Only a private profile viewed by someone else needs the follow edge
+    full_profile = (
+        not user.get("is_private", False)
+        or current_user.id == user_id
+        or await is_following(db, current_user.id, user_id)
+    )
+    etag = user_etag(user, full_profile, selected_fields, full)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    response.headers["ETag"] = etag
+    
+    if selected_fields:
+        if full_profile:
+            # construct() fills defaults without validating the whole profile
+            return sparse_response(UserResponse.construct(**user), selected_fields, headers={"ETag": etag})
+        return sparse_response(limited_profile(user), selected_fields, headers={"ETag": etag})
+    
     # Check privacy settings
-    user_obj = UserInDB(**user)
-    if user_obj.is_private and current_user.id not in user_obj.followers and current_user.id != user_id:
-        # Return limited profile for private users
-        return UserResponse(
-            id=user_obj.id,
-            username=user_obj.username,
-            full_name=user_obj.full_name,
-            profile_image_url=user_obj.profile_image_url,
-            is_private=True,
-            followers_count=user_obj.followers_count,
-            following_count=user_obj.following_count,
-            created_at=user_obj.created_at,
-            email="",  # Hide email for privacy
-            bio="This account is private",
-            location=None
-        )
+    if not full_profile:
+        return limited_profile(user)
     
-    return UserResponse(**user_obj.dict())
+    return profile_response(UserInDB(**user).dict(), full, headers={"ETag": etag})
+
+def limited_profile(user: dict) -> UserProfile:
+    """Limited profile shown to non-followers of a private account"""
+    return UserProfile(
+        id=user["id"],
+        username=user["username"],
+        full_name=user["full_name"],
+        profile_image_url=user.get("profile_image_url"),
+        is_private=True,
+        followers_count=user.get("followers_count", 0),
+        following_count=user.get("following_count", 0),
+        created_at=user["created_at"],
+        email="",  # Hide email for privacy
+        bio="This account is private",
+        location=None
+    )
 
 @router.post("/{user_id}/follow", response_model=dict)
 async def follow_user(
     user_id: str,
+    background_tasks: BackgroundTasks,
     current_user: UserInDB = Depends(get_current_active_user),
     db: AsyncIOMotorDatabase = Depends(get_database)
 ):
@@ -87,68 +274,28 @@ async def follow_user(
             detail="Cannot follow yourself"
         )
     
-    target_user = await db.users.find_one({"id": user_id})
+    target_user = await db.users.find_one({"id": user_id}, {"_id": 0, "id": 1})
     if not target_user:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="User not found"
         )
     
-    # Check if already following
-    if user_id in current_user.following:
+    # An upsert on the unique edge: a repeated follow changes nothing
+    is_mutual = await add_follow(db, current_user.id, user_id)
+    if is_mutual is None:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Already following this user"
         )
+    principal_cache.invalidate(current_user.id, user_id)
     
-    # Update current user's following list
-    await db.users.update_one(
-        {"id": current_user.id},
-        {
-            "$push": {"following": user_id},
-            "$inc": {"following_count": 1}
-        }
+    # Notify after the response is sent
+    background_tasks.add_task(
+        NotificationService.create_follow_notification, db, user_id, current_user.id, current_user.username
     )
     
-    # Update target user's followers list
-    await db.users.update_one(
-        {"id": user_id},
-        {
-            "$push": {"followers": current_user.id},
-            "$inc": {"followers_count": 1}
-        }
-    )
-    
-    # Check if it's mutual follow (becomes friends)
-    if current_user.id in target_user.get("following", []):
-        # Add to friends list for both users
-        await db.users.update_one(
-            {"id": current_user.id},
-            {
-                "$push": {"friends": user_id},
-                "$inc": {"friends_count": 1}
-            }
-        )
-        await db.users.update_one(
-            {"id": user_id},
-            {
-                "$push": {"friends": current_user.id},
-                "$inc": {"friends_count": 1}
-            }
-        )
-    
-    # Create notification
-    notification = NotificationCreate(
-        recipient_id=user_id,
-        sender_id=current_user.id,
-        type="follow",
-        title="New Follower",
-        message=f"{current_user.username} started following you",
-        data={"user_id": current_user.id}
-    )
-    await db.notifications.insert_one(Notification(**notification.dict()).dict())
-    
-    return {"message": "Successfully followed user", "is_mutual": current_user.id in target_user.get("following", [])}
+    return {"message": "Successfully followed user", "is_mutual": is_mutual}
 
 @router.delete("/{user_id}/follow", response_model=dict)
 async def unfollow_user(
@@ -163,52 +310,44 @@ async def unfollow_user(
             detail="Cannot unfollow yourself"
         )
     
-    target_user = await db.users.find_one({"id": user_id})
+    target_user = await db.users.find_one({"id": user_id}, {"_id": 0, "id": 1})
     if not target_user:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="User not found"
         )
     
-    # Check if currently following
-    if user_id not in current_user.following:
+    if await remove_follow(db, current_user.id, user_id) is None:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Not following this user"
         )
-    
-    was_friend = user_id in current_user.friends
-    
-    # Update current user's following list
-    await db.users.update_one(
-        {"id": current_user.id},
-        {
-            "$pull": {"following": user_id, "friends": user_id},
-            "$inc": {"following_count": -1, "friends_count": -1 if was_friend else 0}
-        }
-    )
-    
-    # Update target user's followers list
-    await db.users.update_one(
-        {"id": user_id},
-        {
-            "$pull": {"followers": current_user.id, "friends": current_user.id},
-            "$inc": {"followers_count": -1, "friends_count": -1 if was_friend else 0}
-        }
-    )
+    principal_cache.invalidate(current_user.id, user_id)
     
     return {"message": "Successfully unfollowed user"}
 
-@router.get("/{user_id}/followers", response_model=List[UserSearchResult])
-async def get_user_followers(
+# order -> sort direction over (created_at, other user's id) on follow edges
+FOLLOW_ORDERS = {
+    "newest": -1,
+    "oldest": 1
+}
+
+async def list_connections(
+    db: AsyncIOMotorDatabase,
+    response: Response,
+    current_user: UserInDB,
     user_id: str,
-    limit: int = Query(20, le=50),
-    offset: int = Query(0, ge=0),
-    current_user: UserInDB = Depends(get_current_active_user),
-    db: AsyncIOMotorDatabase = Depends(get_database)
-):
-    """Get user's followers list"""
-    user = await db.users.find_one({"id": user_id})
+    direction: str,
+    limit: int,
+    cursor: Optional[str],
+    offset: int,
+    order: str
+) -> List[UserSearchResult]:
+    """
+    One page of a user's followers ("followers") or followed accounts
+    ("following"), in follow order
+    """
+    user = await db.users.find_one({"id": user_id}, {"_id": 0, "id": 1, "is_private": 1})
     if not user:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -216,82 +355,67 @@ async def get_user_followers(
         )
     
     # Check privacy
-    if user.get("is_private", False) and current_user.id not in user.get("followers", []) and current_user.id != user_id:
+    if (
+        user.get("is_private", False)
+        and current_user.id != user_id
+        and not await is_following(db, current_user.id, user_id)
+    ):
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
-            detail="Cannot view followers of private account"
+            detail=(
+                "Cannot view followers of private account" if direction == "followers"
+                else "Cannot view following list of private account"
+            )
         )
     
-    followers_ids = user.get("followers", [])[offset:offset + limit]
-    if not followers_ids:
-        return []
+    page = follower_edges if direction == "followers" else following_edges
+    other_field = "follower_id" if direction == "followers" else "followee_id"
+    edges = await page(db, user_id, limit, cursor, FOLLOW_ORDERS[order], offset)
+    set_next_cursor(response, edges, limit, "created_at", id_field=other_field)
     
-    # Get follower details
-    followers_cursor = db.users.find({"id": {"$in": followers_ids}})
-    followers = await followers_cursor.to_list(length=limit)
+    user_ids = [edge[other_field] for edge in edges]
+    if not user_ids:
+        return []
     
-    # Format response
-    result = []
-    for follower in followers:
-        result.append(UserSearchResult(
-            id=follower["id"],
-            username=follower["username"],
-            full_name=follower["full_name"],
-            profile_image_url=follower.get("profile_image_url"),
-            bio=follower.get("bio"),
-            followers_count=follower.get("followers_count", 0),
-            is_following=follower["id"] in current_user.following,
-            is_private=follower.get("is_private", False)
-        ))
+    # The card projection carries exactly the UserSearchResult fields
+    users = await db.users.find({"id": {"$in": user_ids}}, USER_CARD_PROJECTION).to_list(length=len(user_ids))
+    users_by_id = {user["id"]: user for user in users}
+    followed = await followed_among(db, current_user.id, user_ids)
     
-    return result
+    # $in returns users in arbitrary order; keep the edges' order
+    return [
+        UserSearchResult(**users_by_id[other_id], is_following=other_id in followed)
+        for other_id in user_ids
+        if other_id in users_by_id
+    ]
+
+@router.get("/{user_id}/followers", response_model=List[UserSearchResult])
+async def get_user_followers(
+    user_id: str,
+    response: Response,
+    limit: int = Query(20, ge=1, le=50),
+    cursor: Optional[str] = Query(None, description="Opaque cursor from the X-Next-Cursor header of the previous page"),
+    order: str = Query("newest", pattern="^(newest|oldest)$", description="Most recent or earliest follows first"),
+    offset: int = Query(0, ge=0, deprecated=True, description="Number of followers to skip (use cursor instead)"),
+    current_user: UserInDB = Depends(get_current_active_user),
+    db: AsyncIOMotorDatabase = Depends(get_database)
+):
+    """Get user's followers list (next page cursor in X-Next-Cursor)"""
+    return await list_connections(db, response, current_user, user_id, "followers", limit, cursor, offset, order)
 
 @router.get("/{user_id}/following", response_model=List[UserSearchResult])
 async def get_user_following(
     user_id: str,
-    limit: int = Query(20, le=50),
-    offset: int = Query(0, ge=0),
+    response: Response,
+    limit: int = Query(20, ge=1, le=50),
+    cursor: Optional[str] = Query(None, description="Opaque cursor from the X-Next-Cursor header of the previous page"),
+    order: str = Query("newest", pattern="^(newest|oldest)$", description="Most recent or earliest follows first"),
+    offset: int = Query(0, ge=0, deprecated=True, description="Number of followed users to skip (use cursor instead)"),
     current_user: UserInDB = Depends(get_current_active_user),
     db: AsyncIOMotorDatabase = Depends(get_database)
 ):
-    """Get user's following list"""
-    user = await db.users.find_one({"id": user_id})
-    if not user:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="User not found"
-        )
-    
-    # Check privacy
-    if user.get("is_private", False) and current_user.id not in user.get("followers", []) and current_user.id != user_id:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Cannot view following list of private account"
-        )
-    
-    following_ids = user.get("following", [])[offset:offset + limit]
-    if not following_ids:
-        return []
-    
-    # Get following details
-    following_cursor = db.users.find({"id": {"$in": following_ids}})
-    following_users = await following_cursor.to_list(length=limit)
-    
-    # Format response
-    result = []
-    for followed_user in following_users:
-        result.append(UserSearchResult(
-            id=followed_user["id"],
-            username=followed_user["username"],
-            full_name=followed_user["full_name"],
-            profile_image_url=followed_user.get("profile_image_url"),
-            bio=followed_user.get("bio"),
-            followers_count=followed_user.get("followers_count", 0),
-            is_following=followed_user["id"] in current_user.following,
-            is_private=followed_user.get("is_private", False)
-        ))
-    
-    return result
+    """Get user's following list (next page cursor in X-Next-Cursor)"""
+    return await list_connections(db, response, current_user, user_id, "following", limit, cursor, offset, order)
 
 @router.get("/{user_id}/stats", response_model=UserStats)
 async def get_user_stats(
@@ -69,10 +69,9 @@ class ConnectionManager:
 
     async def broadcast_to_followers(self, message: dict, user_id: str, db: AsyncIOMotorDatabase):
         """Broadcast message to all followers of a user"""
-        user = await db.users.find_one({"id": user_id})
-        if user and "followers" in user:
-            for follower_id in user["followers"]:
-                await self.send_personal_message(message, follower_id)
+        edges = db.follows.find({"followee_id": user_id}, {"_id": 0, "follower_id": 1})
+        async for edge in edges:
+            await self.send_personal_message(message, edge["follower_id"])
 
     async def broadcast_user_status(self, user_id: str, status: str):
         """Broadcast user online/offline status to relevant users"""
@@ -22,8 +22,11 @@ try:
     from routes.search import router as search_router
     from routes.notifications import router as notifications_router
     from routes.saved_posts import router as saved_posts_router
+    from routes.deletions import router as deletions_router
     from routes.websocket import router as websocket_router
-    from database import create_indexes
+    from database import create_indexes, get_database
+    from services.cascade import cascade_worker
+    from services.views import view_buffer
     ROUTES_AVAILABLE = True
 except ImportError as e:
     print(f"Warning: Route modules not available, using mock endpoints: {e}")
@@ -111,6 +114,7 @@ if ROUTES_AVAILABLE:
     api_router.include_router(search_router)
     api_router.include_router(notifications_router)
     api_router.include_router(saved_posts_router)
+    api_router.include_router(deletions_router)
 else:
     # Add mock endpoints
     @api_router.get("/posts")
@@ -204,6 +208,7 @@ app.add_middleware(
     allow_origins=["*"],  # In production, specify actual origins
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag"],
 )
 
 # Configure logging
@@ -224,6 +229,12 @@ async def startup_event():
             logger.info("Database indexes created successfully!")
         except Exception as e:
             logger.warning(f"Database setup failed: {e}. Running with mock data.")
+        else:
+            # The workers would only loop against a database that is not there
+            db = await get_database()
+            cascade_worker.start(db)
+            view_buffer.start(db)
+            logger.info("Background workers started")
     else:
         logger.info("Running with mock data - no database connection needed")
     logger.info("GreaseMonkey API started successfully!")
@@ -231,6 +242,9 @@ async def startup_event():
 @app.on_event("shutdown")
 async def shutdown_event():
     logger.info("GreaseMonkey API shutting down...")
+    if ROUTES_AVAILABLE:
+        await cascade_worker.stop()
+        await view_buffer.stop(await get_database())
 
 if __name__ == "__main__":
     import uvicorn
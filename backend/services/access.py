@@ -0,0 +1,109 @@
+"""
+Access control for garage-scoped content.
+
+Whether a user may see a post (and its comments) depends only on the post's
+garage: public garages are open to everyone, private ones to their members.
+``AccessResolver`` keeps each garage's privacy flag and, for private garages,
+its member set in a bounded TTL cache, so the common case is a dictionary
+lookup and a set membership test with no round trip. Misses for a whole page
+of garages are filled with one projected ``$in`` query.
+
+Routes that change privacy or membership (create, join, leave, update,
+delete) invalidate the garage's entry; other app instances see the change
+within ``GARAGE_ACCESS_TTL`` seconds.
+"""
+
+import os
+from typing import Dict, FrozenSet, Iterable, Optional, Set
+
+from fastapi import HTTPException, status
+from motor.motor_asyncio import AsyncIOMotorDatabase
+
+from services.cache import TTLCache
+
+GARAGE_ACCESS_TTL = float(os.getenv("GARAGE_ACCESS_TTL", "60"))
+GARAGE_ACCESS_CACHE_SIZE = int(os.getenv("GARAGE_ACCESS_CACHE_SIZE", "4096"))
+
+_MISSING = object()
+
+
+class GarageAccess:
+    """Privacy and membership of one garage"""
+
+    __slots__ = ("is_private", "members")
+
+    def __init__(self, is_private: bool, members: FrozenSet[str]):
+        self.is_private = is_private
+        # Only private garages need their members; public ones keep an empty set
+        self.members = members
+
+    def allows(self, user_id: str) -> bool:
+        return not self.is_private or user_id in self.members
+
+
+class AccessResolver:
+    """Cached access decisions for garage-scoped content"""
+
+    def __init__(self, maxsize: int = GARAGE_ACCESS_CACHE_SIZE, ttl: float = GARAGE_ACCESS_TTL):
+        # garage_id -> GarageAccess, or None for a garage that does not exist
+        self.garages = TTLCache(maxsize, ttl)
+
+    async def garage_access(self, db: AsyncIOMotorDatabase, garage_ids: Iterable[str]) -> Dict[str, Optional[GarageAccess]]:
+        """Access info for a set of garages, loading the misses with a single query"""
+        result: Dict[str, Optional[GarageAccess]] = {}
+        missing = []
+        for garage_id in {garage_id for garage_id in garage_ids if garage_id}:
+            cached = self.garages.get(garage_id, _MISSING)
+            if cached is _MISSING:
+                missing.append(garage_id)
+            else:
+                result[garage_id] = cached
+
+        if missing:
+            garages = await db.garages.find(
+                {"id": {"$in": missing}},
+                {
+                    "_id": 0,
+                    "id": 1,
+                    "is_private": 1,
+                    "members": {"$cond": [{"$eq": ["$is_private", True]}, "$members", []]}
+                }
+            ).to_list(length=len(missing))
+            loaded = {
+                garage["id"]: GarageAccess(garage.get("is_private", False), frozenset(garage.get("members") or []))
+                for garage in garages
+            }
+            for garage_id in missing:
+                access = loaded.get(garage_id)
+                self.garages.set(garage_id, access)
+                result[garage_id] = access
+
+        return result
+
+    async def get(self, db: AsyncIOMotorDatabase, garage_id: str) -> Optional[GarageAccess]:
+        """Access info for one garage, or None if it does not exist"""
+        return (await self.garage_access(db, [garage_id])).get(garage_id)
+
+    async def denied_garages(self, db: AsyncIOMotorDatabase, user_id: str, garage_ids: Iterable[str]) -> Set[str]:
+        """The garages among garage_ids whose content the user may not see"""
+        access = await self.garage_access(db, garage_ids)
+        return {garage_id for garage_id, garage in access.items() if garage and not garage.allows(user_id)}
+
+    async def require_post_access(self, db: AsyncIOMotorDatabase, user_id: str, garage_id: Optional[str]):
+        """Raise 403 unless the user may see content in the post's garage"""
+        if not garage_id:
+            return
+
+        garage = await self.get(db, garage_id)
+        if garage and not garage.allows(user_id):
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="Access denied to private garage post"
+            )
+
+    def invalidate(self, garage_id: str):
+        """Forget a garage after its privacy or membership changed"""
+        self.garages.delete(garage_id)
+
+
+access_resolver = AccessResolver()
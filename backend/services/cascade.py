@@ -0,0 +1,518 @@
+"""
+Background cascade deletion.
+
+Deleting a post, garage or account removes the document itself (and the
+counters that reference it) inline, then records a tombstone in the
+``deletions`` collection. A background worker claims tombstones one at a time
+and removes the dependent data - comments, votes, saved references,
+notifications, timeline entries, media - in batches of ``CASCADE_BATCH_SIZE``
+documents, so no request ever waits on an unbounded ``delete_many``.
+
+Every step is idempotent and progress is written back to the tombstone after
+each batch. A worker that dies mid-cascade leaves its lease to expire, after
+which the tombstone is claimed again and the remaining steps simply find less
+to do. Account and garage cascades delete their posts in batches and enqueue a
+post tombstone for each one.
+"""
+
+import asyncio
+import logging
+import os
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import ReturnDocument, UpdateOne
+
+from models.deletion import Deletion, DeletionKind, DeletionStatus
+from services.access import access_resolver
+from services.feed_cache import feed_cache
+from services.ranking import ranked_increment
+from services.votes import vote_delta
+
+CASCADE_BATCH_SIZE = int(os.getenv("CASCADE_BATCH_SIZE", "500"))
+CASCADE_POLL_INTERVAL = float(os.getenv("CASCADE_POLL_INTERVAL", "2"))
+CASCADE_LEASE_SECONDS = int(os.getenv("CASCADE_LEASE_SECONDS", "300"))
+CASCADE_MAX_ATTEMPTS = int(os.getenv("CASCADE_MAX_ATTEMPTS", "5"))
+
+logger = logging.getLogger(__name__)
+
+
+def post_context(post: dict) -> Dict[str, Any]:
+    """Fields of a deleted post that its cascade needs"""
+    return {
+        "author_id": post.get("author_id"),
+        "garage_id": post.get("garage_id"),
+        "image_urls": post.get("image_urls") or []
+    }
+
+
+async def enqueue_deletion(
+    db: AsyncIOMotorDatabase,
+    kind: str,
+    target_id: str,
+    requested_by: Optional[str] = None,
+    context: Optional[Dict[str, Any]] = None
+) -> str:
+    """Record a tombstone for the background worker and return its id"""
+    deletion = Deletion(kind=kind, target_id=target_id, requested_by=requested_by, context=context or {})
+    await db.deletions.insert_one(deletion.dict())
+    cascade_worker.wake()
+    return deletion.id
+
+
+class CascadeRun:
+    """Progress of one tombstone being processed"""
+
+    def __init__(self, db: AsyncIOMotorDatabase, tombstone: dict, batch_size: int):
+        self.db = db
+        self.tombstone = tombstone
+        self.batch_size = batch_size
+        self.progress: Dict[str, int] = dict(tombstone.get("progress") or {})
+        self.documents = 0
+        self.batches = 0
+
+    @property
+    def context(self) -> Dict[str, Any]:
+        return self.tombstone.get("context") or {}
+
+    async def advance(self, step: str, count: int):
+        """Record a finished batch and extend the lease"""
+        self.progress[step] = self.progress.get(step, 0) + count
+        self.documents += count
+        self.batches += 1
+        await self.db.deletions.update_one(
+            {"id": self.tombstone["id"]},
+            {"$set": {
+                f"progress.{step}": self.progress[step],
+                "lease_until": datetime.utcnow() + timedelta(seconds=CASCADE_LEASE_SECONDS)
+            }}
+        )
+
+    async def delete_batches(self, step: str, collection, query: dict):
+        """Delete every document matching query, one bounded batch at a time"""
+        while True:
+            batch = await collection.find(query, {"_id": 1}).limit(self.batch_size).to_list(self.batch_size)
+            if not batch:
+                return
+            result = await collection.delete_many({"_id": {"$in": [doc["_id"] for doc in batch]}})
+            await self.advance(step, result.deleted_count)
+
+    async def update_batches(self, step: str, collection, query: dict, update: dict):
+        """
+        Apply update to every document matching query in bounded batches. The
+        update must make a document stop matching the query.
+        """
+        while True:
+            batch = await collection.find(query, {"_id": 1}).limit(self.batch_size).to_list(self.batch_size)
+            if not batch:
+                return
+            result = await collection.update_many(
+                {"_id": {"$in": [doc["_id"] for doc in batch]}, **query},
+                update
+            )
+            await self.advance(step, result.modified_count)
+
+    async def delete_media(self, query: dict):
+        """Delete media records and their files"""
+        # Import here to avoid circular imports
+        from routes.media import MediaService
+
+        while True:
+            batch = await self.db.media.find(query, {"_id": 1, "url": 1}).limit(self.batch_size).to_list(self.batch_size)
+            if not batch:
+                return
+            for media in batch:
+                await asyncio.to_thread(MediaService.delete_file, media["url"])
+            result = await self.db.media.delete_many({"_id": {"$in": [media["_id"] for media in batch]}})
+            await self.advance("media", result.deleted_count)
+
+    async def delete_posts(self, query: dict):
+        """Delete posts in batches, leaving their dependent data to post tombstones"""
+        while True:
+            posts = await self.db.posts.find(
+                query,
+                {"_id": 0, "id": 1, "author_id": 1, "garage_id": 1, "image_urls": 1}
+            ).limit(self.batch_size).to_list(self.batch_size)
+            if not posts:
+                return
+
+            # Tombstones go in first so a crash can never orphan a post's data
+            await self.db.deletions.insert_many([
+                Deletion(
+                    kind=DeletionKind.POST,
+                    target_id=post["id"],
+                    requested_by=self.tombstone.get("requested_by"),
+                    context=post_context(post)
+                ).dict()
+                for post in posts
+            ])
+            result = await self.db.posts.delete_many({"id": {"$in": [post["id"] for post in posts]}})
+
+            authors = Counter(post["author_id"] for post in posts)
+            garages = Counter(post["garage_id"] for post in posts if post.get("garage_id"))
+            await self.db.users.bulk_write([
+                UpdateOne({"id": author_id}, {"$inc": {"post_count": -count}})
+                for author_id, count in authors.items()
+            ], ordered=False)
+            if garages:
+                await self.db.garages.bulk_write([
+                    UpdateOne({"id": garage_id}, {"$inc": {"post_count": -count}})
+                    for garage_id, count in garages.items()
+                ], ordered=False)
+            for garage_id in {post.get("garage_id") for post in posts}:
+                feed_cache.invalidate(garage_id)
+
+            await self.advance("posts", result.deleted_count)
+
+
+class CascadeWorker:
+    """Claims tombstones and runs their cascades in the background"""
+
+    def __init__(self, batch_size: int = CASCADE_BATCH_SIZE, poll_interval: float = CASCADE_POLL_INTERVAL):
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup = asyncio.Event()
+        self.metrics: Dict[str, Any] = {
+            "processed": 0,
+            "failed": 0,
+            "documents": 0,
+            "batches": 0,
+            "seconds": 0.0,
+            "last_documents_per_second": None
+        }
+        self._cascades = {
+            DeletionKind.POST: self._cascade_post,
+            DeletionKind.USER: self._cascade_user,
+            DeletionKind.GARAGE: self._cascade_garage
+        }
+
+    def start(self, db: AsyncIOMotorDatabase):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run(db))
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    def wake(self):
+        """Let an idle worker pick up a new tombstone without waiting for the next poll"""
+        self._wakeup.set()
+
+    def stats(self) -> Dict[str, Any]:
+        """Counts and throughput since startup"""
+        seconds = self.metrics["seconds"]
+        return {
+            **self.metrics,
+            "documents_per_second": self.metrics["documents"] / seconds if seconds else 0.0
+        }
+
+    async def _run(self, db: AsyncIOMotorDatabase):
+        while True:
+            try:
+                if await self.process_next(db):
+                    continue
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Cascade worker error: {e}")
+
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _claim(self, db: AsyncIOMotorDatabase) -> Optional[dict]:
+        """Take the oldest pending tombstone, or one whose worker's lease ran out"""
+        now = datetime.utcnow()
+        return await db.deletions.find_one_and_update(
+            {
+                "$or": [
+                    {"status": DeletionStatus.PENDING},
+                    {"status": DeletionStatus.RUNNING, "lease_until": {"$lt": now}}
+                ],
+                "attempts": {"$lt": CASCADE_MAX_ATTEMPTS}
+            },
+            {
+                "$set": {
+                    "status": DeletionStatus.RUNNING,
+                    "started_at": now,
+                    "lease_until": now + timedelta(seconds=CASCADE_LEASE_SECONDS)
+                },
+                "$inc": {"attempts": 1}
+            },
+            sort=[("created_at", 1)],
+            return_document=ReturnDocument.AFTER
+        )
+
+    async def process_next(self, db: AsyncIOMotorDatabase) -> bool:
+        """Run the cascade for one tombstone; False when there was nothing to do"""
+        tombstone = await self._claim(db)
+        if not tombstone:
+            return False
+
+        run = CascadeRun(db, tombstone, self.batch_size)
+        started = time.monotonic()
+        try:
+            await self._cascades[tombstone["kind"]](run)
+        except Exception as e:
+            # Leave the attempt counted; the tombstone is retried on a later pass
+            self.metrics["failed"] += 1
+            final_status = DeletionStatus.FAILED if tombstone["attempts"] >= CASCADE_MAX_ATTEMPTS else DeletionStatus.PENDING
+            await db.deletions.update_one(
+                {"id": tombstone["id"]},
+                {"$set": {"status": final_status, "error": str(e), "lease_until": None}}
+            )
+            logger.error(f"Cascade for {tombstone['kind']} {tombstone['target_id']} failed: {e}")
+            return True
+
+        elapsed = time.monotonic() - started
+        throughput = run.documents / elapsed if elapsed else None
+        self.metrics["processed"] += 1
+        self.metrics["documents"] += run.documents
+        self.metrics["batches"] += run.batches
+        self.metrics["seconds"] += elapsed
+        self.metrics["last_documents_per_second"] = throughput
+
+        await db.deletions.update_one(
+            {"id": tombstone["id"]},
+            {"$set": {
+                "status": DeletionStatus.DONE,
+                "finished_at": datetime.utcnow(),
+                "lease_until": None,
+                "error": None,
+                "documents_per_second": throughput
+            }}
+        )
+        logger.info(
+            f"Cascade for {tombstone['kind']} {tombstone['target_id']} removed "
+            f"{run.documents} documents in {run.batches} batches ({elapsed:.2f}s)"
+        )
+        return True
+
+    async def _cascade_post(self, run: CascadeRun):
+        db = run.db
+        post_id = run.tombstone["target_id"]
+
+        await run.delete_batches("comments", db.comments, {"post_id": post_id})
+        await run.delete_batches("comment_likes", db.comment_likes, {"post_id": post_id})
+        await run.delete_batches("votes", db.post_votes, {"post_id": post_id})
+        await run.delete_batches("timelines", db.timelines, {"post_id": post_id})
+        await run.delete_batches("notifications", db.notifications, {"data.post_id": post_id})
+        await run.update_batches(
+            "saved_references", db.users, {"saved_posts": post_id}, {"$pull": {"saved_posts": post_id}}
+        )
+
+        image_urls = run.context.get("image_urls") or []
+        if image_urls:
+            await run.delete_media({"url": {"$in": image_urls}})
+
+    async def _cascade_garage(self, run: CascadeRun):
+        db = run.db
+        garage_id = run.tombstone["target_id"]
+
+        await run.delete_posts({"garage_id": garage_id})
+        await run.update_batches(
+            "memberships", db.users, {"garages": garage_id},
+            {"$pull": {"garages": garage_id}, "$inc": {"garage_count": -1}}
+        )
+        await run.delete_batches("timelines", db.timelines, {"garage_id": garage_id})
+        await run.delete_batches("notifications", db.notifications, {"data.garage_id": garage_id})
+
+        image_url = run.context.get("image_url")
+        if image_url:
+            await run.delete_media({"url": image_url})
+
+    async def _cascade_user(self, run: CascadeRun):
+        db = run.db
+        user_id = run.tombstone["target_id"]
+
+        # Owned garages go with the account; their tombstones run separately
+        while True:
+            garages = await db.garages.find(
+                {"owner_id": user_id}, {"_id": 0, "id": 1, "image_url": 1}
+            ).limit(run.batch_size).to_list(run.batch_size)
+            if not garages:
+                break
+            await db.deletions.insert_many([
+                Deletion(
+                    kind=DeletionKind.GARAGE,
+                    target_id=garage["id"],
+                    requested_by=user_id,
+                    context={"image_url": garage.get("image_url")}
+                ).dict()
+                for garage in garages
+            ])
+            result = await db.garages.delete_many({"id": {"$in": [garage["id"] for garage in garages]}})
+            for garage in garages:
+                access_resolver.invalidate(garage["id"])
+                feed_cache.invalidate(garage["id"])
+            await run.advance("garages", result.deleted_count)
+
+        await run.update_batches(
+            "memberships", db.garages, {"members": user_id},
+            {"$pull": {"members": user_id, "admins": user_id}, "$inc": {"member_count": -1}}
+        )
+        await run.delete_posts({"author_id": user_id})
+        await self._remove_comments(run, user_id)
+        await self._remove_votes(run, user_id)
+        await self._remove_comment_likes(run, user_id)
+
+        await self._remove_follows(run, user_id)
+
+        await run.delete_batches(
+            "notifications", db.notifications, {"$or": [{"recipient_id": user_id}, {"sender_id": user_id}]}
+        )
+        await run.delete_batches("timelines", db.timelines, {"user_id": user_id})
+        await run.delete_media({"uploaded_by": user_id})
+        await run.delete_batches("account", db.users, {"id": user_id})
+
+    async def _remove_follows(self, run: CascadeRun, user_id: str):
+        """Delete a user's follow edges and take them off the other users' counters"""
+        db = run.db
+        # Outgoing edges first, while the incoming ones still carry the
+        # friendship flags of pairs whose canonical edge points at this user
+        while True:
+            edges = await db.follows.find(
+                {"follower_id": user_id}, {"_id": 1, "followee_id": 1, "friends": 1}
+            ).limit(run.batch_size).to_list(run.batch_size)
+            if not edges:
+                break
+            followees = [edge["followee_id"] for edge in edges]
+            friends = {
+                edge["followee_id"] for edge in edges if user_id < edge["followee_id"] and edge.get("friends")
+            } | {
+                edge["follower_id"]
+                for edge in await db.follows.find(
+                    {"follower_id": {"$in": followees, "$lt": user_id}, "followee_id": user_id, "friends": True},
+                    {"_id": 0, "follower_id": 1}
+                ).to_list(len(followees))
+            }
+            result = await db.follows.delete_many({"_id": {"$in": [edge["_id"] for edge in edges]}})
+            await db.users.bulk_write([
+                UpdateOne(
+                    {"id": followee_id},
+                    {"$inc": {"followers_count": -1, "friends_count": -int(followee_id in friends)}}
+                )
+                for followee_id in followees
+            ], ordered=False)
+            await run.advance("following", result.deleted_count)
+
+        while True:
+            edges = await db.follows.find(
+                {"followee_id": user_id}, {"_id": 1, "follower_id": 1}
+            ).limit(run.batch_size).to_list(run.batch_size)
+            if not edges:
+                return
+            result = await db.follows.delete_many({"_id": {"$in": [edge["_id"] for edge in edges]}})
+            await db.users.bulk_write([
+                UpdateOne({"id": edge["follower_id"]}, {"$inc": {"following_count": -1}})
+                for edge in edges
+            ], ordered=False)
+            await run.advance("followers", result.deleted_count)
+
+    async def _remove_comments(self, run: CascadeRun, user_id: str):
+        """
+        Delete a user's comments together with the replies beneath them, as
+        delete_comment does, and take them off the posts' counters.
+        """
+        db = run.db
+        while True:
+            roots = await db.comments.find(
+                {"author_id": user_id}, {"_id": 1, "id": 1, "post_id": 1, "parent_id": 1, "path": 1}
+            ).limit(run.batch_size).to_list(run.batch_size)
+            if not roots:
+                return
+            root_ids = {comment["id"] for comment in roots}
+
+            # Replies carry their ancestors' ids in path; the subtrees go
+            # first, one page at a time, so the roots still find them on a retry
+            last_id = None
+            while True:
+                query = {"path": {"$in": list(root_ids)}}
+                if last_id is not None:
+                    query["_id"] = {"$gt": last_id}
+                replies = await db.comments.find(
+                    query, {"_id": 1, "id": 1, "post_id": 1}
+                ).sort("_id", 1).limit(run.batch_size).to_list(run.batch_size)
+                if not replies:
+                    break
+                last_id = replies[-1]["_id"]
+                await self._delete_comment_batch(run, replies)
+
+            # Roots inside another root's subtree were removed with it; every
+            # reply's parent is gone too, so only these roots' parents lose a reply
+            top_roots = [comment for comment in roots if not root_ids.intersection(comment.get("path") or [])]
+            await self._delete_comment_batch(run, top_roots)
+            per_parent = Counter(comment["parent_id"] for comment in top_roots if comment.get("parent_id"))
+            if per_parent:
+                await db.comments.bulk_write([
+                    UpdateOne({"id": parent_id}, {"$inc": {"reply_count": -count}})
+                    for parent_id, count in per_parent.items()
+                ], ordered=False)
+
+    async def _delete_comment_batch(self, run: CascadeRun, comments: List[dict]):
+        """Delete a batch of comments and their likes and take them off the posts' counters"""
+        if not comments:
+            return
+        db = run.db
+        result = await db.comments.delete_many({"_id": {"$in": [comment["_id"] for comment in comments]}})
+        await db.comment_likes.delete_many({"comment_id": {"$in": [comment["id"] for comment in comments]}})
+        per_post = Counter(comment["post_id"] for comment in comments)
+        await db.posts.bulk_write([
+            UpdateOne({"id": post_id}, ranked_increment({"comment_count": -count, "comment_version": 1}))
+            for post_id, count in per_post.items()
+        ], ordered=False)
+        await run.advance("comments", result.deleted_count)
+
+    async def _remove_votes(self, run: CascadeRun, user_id: str):
+        """Delete a user's votes and take them off the posts' counters"""
+        db = run.db
+        while True:
+            votes = await db.post_votes.find(
+                {"user_id": user_id}, {"_id": 1, "post_id": 1, "vote_type": 1}
+            ).limit(run.batch_size).to_list(run.batch_size)
+            if not votes:
+                return
+            result = await db.post_votes.delete_many({"_id": {"$in": [vote["_id"] for vote in votes]}})
+
+            per_post: Dict[str, Counter] = {}
+            for vote in votes:
+                per_post.setdefault(vote["post_id"], Counter()).update(vote_delta(vote["vote_type"], "remove"))
+            operations: List[UpdateOne] = [
+                UpdateOne({"id": post_id}, ranked_increment(dict(delta)))
+                for post_id, delta in per_post.items() if delta
+            ]
+            if operations:
+                await db.posts.bulk_write(operations, ordered=False)
+            await run.advance("votes", result.deleted_count)
+
+    async def _remove_comment_likes(self, run: CascadeRun, user_id: str):
+        """Delete a user's comment likes and take them off the comments' counters"""
+        db = run.db
+        while True:
+            likes = await db.comment_likes.find(
+                {"user_id": user_id}, {"_id": 1, "comment_id": 1}
+            ).limit(run.batch_size).to_list(run.batch_size)
+            if not likes:
+                return
+            result = await db.comment_likes.delete_many({"_id": {"$in": [like["_id"] for like in likes]}})
+            per_comment = Counter(like["comment_id"] for like in likes)
+            await db.comments.bulk_write([
+                UpdateOne({"id": comment_id}, {"$inc": {"like_count": -count}})
+                for comment_id, count in per_comment.items()
+            ], ordered=False)
+            await run.advance("comment_likes", result.deleted_count)
+
+
+cascade_worker = CascadeWorker()
@@ -0,0 +1,106 @@
+"""
+Comment likes stored in a dedicated ``comment_likes`` collection.
+
+A like is one document keyed by the unique ``(comment_id, user_id)`` index,
+so toggling is a single insert (or, when the index reports the like already
+exists, a single delete) followed by an atomic ``$inc`` of the comment's
+``like_count``. Concurrent togglers never overwrite each other and the cost
+does not grow with the number of likes.
+
+Comments stored with the legacy embedded ``likes`` array are moved into
+``comment_likes`` with ``python -m services.comment_likes`` (once after
+deploying; safe to re-run). Until then their likes are missing from
+``user_liked`` and counter reconciliation leaves the comments alone.
+"""
+
+import asyncio
+import json
+from datetime import datetime
+from typing import Iterable, Set, Tuple
+
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+from services.touches import record_touches
+
+
+async def toggle_like(db: AsyncIOMotorDatabase, comment: dict, user_id: str) -> Tuple[bool, int]:
+    """Like or unlike a comment; returns whether it is now liked and the new count"""
+    try:
+        await db.comment_likes.insert_one({
+            "comment_id": comment["id"],
+            "post_id": comment["post_id"],
+            "user_id": user_id,
+            "created_at": datetime.utcnow()
+        })
+        liked, delta = True, 1
+    except DuplicateKeyError:
+        result = await db.comment_likes.delete_one({"comment_id": comment["id"], "user_id": user_id})
+        # A concurrent unlike may have removed it first; then there is nothing to undo
+        liked, delta = False, -result.deleted_count
+        if delta:
+            await record_touches(db, "comments", [comment["id"]])
+
+    if delta:
+        updated = await db.comments.find_one_and_update(
+            {"id": comment["id"]},
+            {"$inc": {"like_count": delta}},
+            projection={"_id": 0, "like_count": 1},
+            return_document=ReturnDocument.AFTER
+        )
+    else:
+        updated = await db.comments.find_one({"id": comment["id"]}, {"_id": 0, "like_count": 1})
+
+    return liked, (updated or {}).get("like_count", 0)
+
+
+async def fetch_user_comment_likes(db: AsyncIOMotorDatabase, comment_ids: Iterable[str], user_id: str) -> Set[str]:
+    """IDs of the comments on a page that the user liked, with a single query"""
+    ids = list(set(comment_ids))
+    if not ids:
+        return set()
+
+    likes = await db.comment_likes.find(
+        {"user_id": user_id, "comment_id": {"$in": ids}},
+        {"_id": 0, "comment_id": 1}
+    ).to_list(length=len(ids))
+    return {like["comment_id"] for like in likes}
+
+
+async def migrate_embedded_comment_likes(db: AsyncIOMotorDatabase, batch_size: int = 500) -> dict:
+    """Move legacy likes arrays from comment documents into comment_likes"""
+    comments = db.comments.find(
+        {"likes": {"$exists": True}},
+        {"_id": 0, "id": 1, "post_id": 1, "likes": 1, "updated_at": 1}
+    )
+
+    migrated = likes = 0
+    async for comment in comments:
+        now = comment.get("updated_at") or datetime.utcnow()
+        operations = [
+            UpdateOne(
+                {"comment_id": comment["id"], "user_id": user_id},
+                {"$setOnInsert": {"post_id": comment["post_id"], "created_at": now}},
+                upsert=True
+            )
+            for user_id in set(comment.get("likes", []))
+        ]
+        for start in range(0, len(operations), batch_size):
+            await db.comment_likes.bulk_write(operations[start:start + batch_size], ordered=False)
+
+        await db.comments.update_one({"id": comment["id"]}, {"$unset": {"likes": ""}})
+        migrated += 1
+        likes += len(operations)
+
+    return {"comments": migrated, "likes": likes}
+
+
+async def _main():
+    from database import db
+
+    print(json.dumps(await migrate_embedded_comment_likes(db), indent=2))
+
+
+if __name__ == "__main__":
+    asyncio.run(_main())
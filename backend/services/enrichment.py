@@ -0,0 +1,126 @@
+"""
+Batched enrichment helpers for list endpoints.
+
+Each helper takes a whole page of raw documents, resolves the related
+users/garages/votes with one projected ``$in`` query per collection and builds the
+response models in memory, so the number of round trips stays constant no
+matter how many items are on the page. Author summaries come from the shared
+``user_summaries`` cache, so only authors it has not seen recently cost a
+query.
+"""
+
+import asyncio
+from typing import Dict, Iterable, List, Optional, Sequence
+
+from motor.motor_asyncio import AsyncIOMotorDatabase
+
+from models.comment import CommentResponse
+from models.post import PostResponse
+from services.comment_likes import fetch_user_comment_likes
+from services.user_summaries import user_summaries
+from services.votes import fetch_user_votes
+
+# Only the fields the response models actually need
+GARAGE_PROJECTION = {"_id": 0, "id": 1, "name": 1}
+
+
+async def fetch_users_by_id(db: AsyncIOMotorDatabase, user_ids: Iterable[str]) -> Dict[str, dict]:
+    """Resolve user summaries for a set of IDs with at most one query"""
+    return await user_summaries.get_many(db, user_ids)
+
+
+async def fetch_garages_by_id(db: AsyncIOMotorDatabase, garage_ids: Iterable[str]) -> Dict[str, dict]:
+    """Resolve garage summaries for a set of IDs with a single query"""
+    ids = list({garage_id for garage_id in garage_ids if garage_id})
+    if not ids:
+        return {}
+
+    garages = await db.garages.find({"id": {"$in": ids}}, GARAGE_PROJECTION).to_list(length=len(ids))
+    return {garage["id"]: garage for garage in garages}
+
+
+async def _no_lookup() -> dict:
+    return {}
+
+
+async def enrich_posts(
+    db: AsyncIOMotorDatabase,
+    post_docs: List[dict],
+    current_user_id: Optional[str],
+    missing_author: Optional[str] = None,
+    fields: Optional[Sequence[str]] = None
+) -> List[PostResponse]:
+    """
+    Enrich a page of posts with author, garage and user vote info, preserving
+    order. Pass current_user_id=None to build a viewer-independent page.
+
+    With a sparse fieldset only the lookups its fields need are made, and the
+    partial documents are not validated against the full model.
+    """
+    if not post_docs:
+        return []
+
+    def wanted(*names: str) -> bool:
+        return fields is None or any(name in fields for name in names)
+
+    authors, garages, user_votes = await asyncio.gather(
+        fetch_users_by_id(db, (post["author_id"] for post in post_docs))
+        if wanted("author_username", "author_full_name") else _no_lookup(),
+        fetch_garages_by_id(db, (post.get("garage_id") for post in post_docs))
+        if wanted("garage_name") else _no_lookup(),
+        fetch_user_votes(db, (post["id"] for post in post_docs), current_user_id)
+        if current_user_id and wanted("user_vote") else _no_lookup()
+    )
+    build = PostResponse if fields is None else PostResponse.construct
+
+    enriched_posts = []
+    for post in post_docs:
+        author = authors.get(post["author_id"])
+        garage = garages.get(post.get("garage_id")) if post.get("garage_id") else None
+
+        enriched_posts.append(build(
+            **post,
+            author_username=author.get("username") if author else missing_author,
+            author_full_name=author.get("full_name") if author else missing_author,
+            garage_name=garage.get("name") if garage else None,
+            user_vote=user_votes.get(post["id"])
+        ))
+
+    return enriched_posts
+
+
+async def overlay_user_votes(db: AsyncIOMotorDatabase, posts: List[PostResponse], current_user_id: str) -> List[PostResponse]:
+    """Copy shared (viewer-independent) posts with the viewer's votes filled in"""
+    if not posts:
+        return []
+
+    user_votes = await fetch_user_votes(db, (post.id for post in posts), current_user_id)
+    return [post.copy(update={"user_vote": user_votes.get(post.id)}) for post in posts]
+
+
+async def enrich_comments(
+    db: AsyncIOMotorDatabase,
+    comment_docs: List[dict],
+    current_user_id: str
+) -> List[CommentResponse]:
+    """Enrich a page of comments with author info and the viewer's like, preserving order"""
+    if not comment_docs:
+        return []
+
+    authors, liked = await asyncio.gather(
+        fetch_users_by_id(db, (comment["author_id"] for comment in comment_docs)),
+        fetch_user_comment_likes(db, (comment["id"] for comment in comment_docs), current_user_id)
+    )
+
+    enriched_comments = []
+    for comment in comment_docs:
+        author = authors.get(comment["author_id"])
+
+        enriched_comments.append(CommentResponse(
+            **comment,
+            author_username=author.get("username") if author else None,
+            author_full_name=author.get("full_name") if author else None,
+            user_liked=comment["id"] in liked
+        ))
+
+    return enriched_comments
@@ -0,0 +1,36 @@
+"""
+Conditional GET support.
+
+Endpoints derive a strong ETag from the few fields that determine their
+response (``updated_at``, counters, version numbers, the viewer) before doing
+any enrichment, so a matching ``If-None-Match`` can be answered with
+``304 Not Modified`` straight away.
+"""
+
+import hashlib
+from typing import Any
+
+from fastapi import Request, Response, status
+
+
+def make_etag(*parts: Any) -> str:
+    """Build a strong ETag from the values a response depends on"""
+    digest = hashlib.sha1(repr(parts).encode()).hexdigest()
+    return f'"{digest}"'
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """Whether the client's If-None-Match header covers the given ETag"""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+
+    # If-None-Match uses the weak comparison function
+    candidates = {tag.strip().removeprefix("W/") for tag in header.split(",")}
+    return etag in candidates
+
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
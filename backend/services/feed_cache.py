@@ -0,0 +1,58 @@
+"""
+Feed page cache with write-driven invalidation.
+
+A feed page depends only on its audience (one garage, or the general stream
+plus the viewer's garages), the ranking parameters and the cursor. Each
+audience has a version number that is bumped whenever a post in it is
+created, updated, deleted or voted on; the versions are part of the cache key,
+so a write invalidates exactly the pages that could contain the post and
+stale entries simply age out through the TTL/LRU bounds.
+
+Cached pages are enriched but carry no ``user_vote``, so one entry is shared
+by every viewer with the same audience; the caller overlays the viewer's
+votes after a hit.
+"""
+
+import os
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from models.post import PostResponse
+from services.cache import TTLCache
+
+FEED_CACHE_TTL = float(os.getenv("FEED_CACHE_TTL", "30"))
+FEED_CACHE_SIZE = int(os.getenv("FEED_CACHE_SIZE", "1024"))
+
+# Audience of posts that are not in any garage
+PUBLIC_AUDIENCE = "public"
+
+FeedPage = Tuple[List[PostResponse], Optional[str]]
+
+
+class FeedCache:
+    """Versioned feed page cache"""
+
+    def __init__(self, maxsize: int = FEED_CACHE_SIZE, ttl: float = FEED_CACHE_TTL):
+        self.pages = TTLCache(maxsize, ttl)
+        self.versions: Dict[str, int] = {}
+
+    def key(self, audiences: Iterable[Optional[str]], *params) -> tuple:
+        """Cache key for a page over the given audiences"""
+        audience_versions = tuple(sorted(
+            (audience or PUBLIC_AUDIENCE, self.versions.get(audience or PUBLIC_AUDIENCE, 0))
+            for audience in set(audiences)
+        ))
+        return (audience_versions,) + params
+
+    def get(self, key: tuple) -> Optional[FeedPage]:
+        return self.pages.get(key)
+
+    def set(self, key: tuple, posts: List[PostResponse], next_cursor: Optional[str]):
+        self.pages.set(key, (posts, next_cursor))
+
+    def invalidate(self, garage_id: Optional[str]):
+        """Invalidate every cached page that may contain a post of this audience"""
+        audience = garage_id or PUBLIC_AUDIENCE
+        self.versions[audience] = self.versions.get(audience, 0) + 1
+
+
+feed_cache = FeedCache()
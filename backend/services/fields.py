@@ -0,0 +1,109 @@
+"""
+Sparse fieldsets.
+
+List endpoints read posts and users through "card" projections that carry
+only what a feed or list item renders, so large arrays (saved posts,
+garages, ...) and internal bookkeeping fields never leave MongoDB. Profiles
+are read through ``USER_PROFILE_PROJECTION``, which drops the same arrays
+unless the full (legacy) shape is requested. Endpoints that
+accept ``fields=a,b,c`` narrow the projection further and serialize just
+those keys, skipping response-model validation for the fields that were left
+out. Related lookups (authors, garages, votes) are skipped when none of
+their fields were selected.
+"""
+
+from typing import Any, Iterable, List, Optional, Sequence
+
+from fastapi import HTTPException, status
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from models.post import PostResponse
+from models.user import UserProfile, UserResponse
+
+# Stored post fields shown on a feed card
+POST_CARD_FIELDS = (
+    "id", "content", "image_urls", "hashtags", "garage_id", "author_id",
+    "created_at", "updated_at", "like_count", "dislike_count", "comment_count",
+    "score", "hot", "view_count", "unique_viewer_count"
+)
+
+# Stored user fields shown in user lists
+USER_CARD_FIELDS = (
+    "id", "username", "full_name", "profile_image_url", "bio", "followers_count", "is_private"
+)
+
+POST_FIELDS = tuple(PostResponse.model_fields)
+USER_FIELDS = tuple(UserResponse.model_fields)
+
+# Arrays only the full user shape carries; lists come from paginated endpoints
+USER_LIST_FIELDS = tuple(field for field in USER_FIELDS if field not in UserProfile.model_fields)
+
+
+def projection(fields: Iterable[str]) -> dict:
+    """Mongo projection including only the given fields"""
+    return {"_id": 0, **{field: 1 for field in fields}}
+
+
+POST_CARD_PROJECTION = projection(POST_CARD_FIELDS)
+USER_CARD_PROJECTION = projection(USER_CARD_FIELDS)
+USER_PROFILE_PROJECTION = {"_id": 0, "hashed_password": 0, **{field: 0 for field in USER_LIST_FIELDS}}
+
+
+def parse_fields(fields: Optional[str], allowed: Sequence[str]) -> Optional[List[str]]:
+    """
+    Parse a comma-separated fields parameter. Returns None when no fieldset
+    was requested; "id" is always included.
+    """
+    if not fields:
+        return None
+
+    requested = [field.strip() for field in fields.split(",") if field.strip()]
+    unknown = [field for field in requested if field not in allowed]
+    if unknown:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown fields: {', '.join(unknown)}"
+        )
+
+    return list(dict.fromkeys(["id"] + requested))
+
+
+def stored_fields(fields: Iterable[str], stored: Iterable[str]) -> List[str]:
+    """The subset of requested fields that is read from the document itself"""
+    stored = set(stored)
+    return [field for field in fields if field in stored]
+
+
+def sparse_projection(fields: Optional[Sequence[str]], card_fields: Sequence[str], required: Sequence[str] = ()) -> dict:
+    """
+    The card projection, or when a fieldset was requested only its stored
+    fields plus the ones the endpoint itself needs (access checks, cursors).
+    """
+    if not fields:
+        return projection(card_fields)
+    return projection(dict.fromkeys(stored_fields(list(required) + list(fields), card_fields)))
+
+
+def sparse_response(content: Any, fields: Sequence[str], headers: Optional[dict] = None) -> JSONResponse:
+    """Serialize a model, dict or list of them with only the given fields"""
+    include = set(fields)
+
+    def narrow(item):
+        if hasattr(item, "dict"):
+            return item.dict(include=include)
+        return {key: value for key, value in item.items() if key in include}
+
+    body = [narrow(item) for item in content] if isinstance(content, list) else narrow(content)
+    return JSONResponse(content=jsonable_encoder(body), headers=headers)
+
+
+def profile_response(user: dict, full: bool = False, headers: Optional[dict] = None) -> Any:
+    """
+    Compact profile, or the full UserResponse when a client opted in. The full
+    shape bypasses the endpoints' compact response model, so it is serialized
+    directly.
+    """
+    if full:
+        return sparse_response(UserResponse(**user), USER_FIELDS, headers=headers)
+    return UserProfile(**{key: value for key, value in user.items() if key not in USER_LIST_FIELDS})
@@ -0,0 +1,235 @@
+"""
+Follow graph stored in a dedicated ``follows`` collection.
+
+Each follow is one edge document ``{follower_id, followee_id, created_at}``.
+A unique ``(follower_id, followee_id)`` index serves "does A follow B" and
+"who does A follow", and a ``(followee_id, created_at)`` index serves "who
+follows B", so every graph question is a point lookup or a range scan and no
+user document grows with its audience. Users only keep ``followers_count``,
+``following_count`` and ``friends_count``; a friendship is a pair of edges in
+both directions.
+
+Following is an upsert on the unique edge and unfollowing a delete of it, so
+a repeated or concurrent request finds nothing left to do and never moves a
+counter twice. A friendship is counted exactly once by flagging it on the
+pair's canonical edge (the one whose follower_id sorts first): whoever sets
+or clears the flag adjusts ``friends_count``, even when both users follow or
+unfollow each other at the same moment. Both users' counters then change in
+one ``bulk_write``.
+
+User documents with the legacy embedded ``followers``/``following``/
+``friends`` arrays are moved into ``follows`` with
+``python -m services.follows`` (once after deploying; safe to re-run). Until
+then those follows are invisible to access checks, follower lists and
+search, and counter reconciliation leaves user counters alone.
+"""
+
+import asyncio
+import json
+from datetime import datetime
+from typing import Iterable, List, Optional, Set
+
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+from services.pagination import apply_keyset
+from services.touches import record_touches
+
+
+async def is_following(db: AsyncIOMotorDatabase, follower_id: str, followee_id: str) -> bool:
+    """Whether follower_id follows followee_id"""
+    edge = await db.follows.find_one(
+        {"follower_id": follower_id, "followee_id": followee_id},
+        {"_id": 1}
+    )
+    return edge is not None
+
+
+async def followed_among(db: AsyncIOMotorDatabase, follower_id: str, user_ids: Iterable[str]) -> Set[str]:
+    """The users among user_ids that follower_id follows, with a single query"""
+    ids = list(set(user_ids))
+    if not ids:
+        return set()
+
+    edges = await db.follows.find(
+        {"follower_id": follower_id, "followee_id": {"$in": ids}},
+        {"_id": 0, "followee_id": 1}
+    ).to_list(length=len(ids))
+    return {edge["followee_id"] for edge in edges}
+
+
+def _edge(follower_id: str, followee_id: str) -> dict:
+    return {"follower_id": follower_id, "followee_id": followee_id}
+
+
+async def _update_counters(
+    db: AsyncIOMotorDatabase, follower_id: str, followee_id: str, delta: int, friends_delta: int
+):
+    """Apply a follow's counter changes to both users in one round trip"""
+    await db.users.bulk_write([
+        UpdateOne({"id": follower_id}, {"$inc": {"following_count": delta, "friends_count": friends_delta}}),
+        UpdateOne({"id": followee_id}, {"$inc": {"followers_count": delta, "friends_count": friends_delta}})
+    ], ordered=False)
+
+
+async def add_follow(db: AsyncIOMotorDatabase, follower_id: str, followee_id: str) -> Optional[bool]:
+    """
+    Create the follow edge and update both users' counters. Returns whether
+    the follow is mutual, or None if the edge already existed.
+    """
+    try:
+        result = await db.follows.update_one(
+            _edge(follower_id, followee_id),
+            {"$setOnInsert": {"created_at": datetime.utcnow()}},
+            upsert=True
+        )
+    except DuplicateKeyError:
+        # A concurrent request for the same follow won the upsert
+        return None
+    if result.upserted_id is None:
+        return None
+
+    if followee_id < follower_id:
+        # The reverse edge is canonical: finding it and flagging the
+        # friendship is a single write
+        before = await db.follows.find_one_and_update(
+            _edge(followee_id, follower_id),
+            {"$set": {"friends": True}},
+            projection={"_id": 0, "friends": 1},
+            return_document=ReturnDocument.BEFORE
+        )
+        mutual = before is not None
+        counted = mutual and not before.get("friends")
+    else:
+        mutual = await is_following(db, followee_id, follower_id)
+        counted = False
+        if mutual:
+            claim = await db.follows.update_one(
+                {**_edge(follower_id, followee_id), "friends": {"$ne": True}},
+                {"$set": {"friends": True}}
+            )
+            counted = bool(claim.modified_count)
+
+    await _update_counters(db, follower_id, followee_id, 1, int(counted))
+    return mutual
+
+
+async def remove_follow(db: AsyncIOMotorDatabase, follower_id: str, followee_id: str) -> Optional[bool]:
+    """
+    Delete the follow edge and update both users' counters. Returns whether
+    a friendship ended, or None if there was no edge.
+    """
+    removed = await db.follows.find_one_and_delete(
+        _edge(follower_id, followee_id), projection={"_id": 0, "friends": 1}
+    )
+    if removed is None:
+        return None
+
+    if follower_id < followee_id:
+        # The deleted edge was canonical and carried the flag
+        ended = bool(removed.get("friends"))
+    else:
+        claim = await db.follows.update_one(
+            {**_edge(followee_id, follower_id), "friends": True},
+            {"$set": {"friends": False}}
+        )
+        ended = bool(claim.modified_count)
+
+    await _update_counters(db, follower_id, followee_id, -1, -int(ended))
+    await record_touches(db, "users", (follower_id, followee_id))
+    return ended
+
+
+async def _edge_page(
+    db: AsyncIOMotorDatabase,
+    user_field: str,
+    other_field: str,
+    user_id: str,
+    limit: int,
+    cursor: Optional[str],
+    direction: int,
+    offset: int
+) -> List[dict]:
+    query = apply_keyset({user_field: user_id}, cursor, "created_at", direction, id_field=other_field)
+    edges = db.follows.find(
+        query, {"_id": 0, other_field: 1, "created_at": 1}
+    ).sort([("created_at", direction), (other_field, direction)])
+    if offset and not cursor:
+        edges = edges.skip(offset)
+    return await edges.limit(limit).to_list(limit)
+
+
+async def follower_edges(
+    db: AsyncIOMotorDatabase,
+    user_id: str,
+    limit: int,
+    cursor: Optional[str] = None,
+    direction: int = -1,
+    offset: int = 0
+) -> List[dict]:
+    """A page of the edges pointing at user_id, ordered by (created_at, follower_id)"""
+    return await _edge_page(db, "followee_id", "follower_id", user_id, limit, cursor, direction, offset)
+
+
+async def following_edges(
+    db: AsyncIOMotorDatabase,
+    user_id: str,
+    limit: int,
+    cursor: Optional[str] = None,
+    direction: int = -1,
+    offset: int = 0
+) -> List[dict]:
+    """A page of the edges leaving user_id, ordered by (created_at, followee_id)"""
+    return await _edge_page(db, "follower_id", "followee_id", user_id, limit, cursor, direction, offset)
+
+
+async def migrate_embedded_follows(db: AsyncIOMotorDatabase, batch_size: int = 500) -> dict:
+    """Move legacy followers/following/friends arrays from user documents into follows"""
+    users = db.users.find(
+        {"$or": [
+            {"following": {"$exists": True}},
+            {"followers": {"$exists": True}},
+            {"friends": {"$exists": True}}
+        ]},
+        {"_id": 0, "id": 1, "following": 1, "friends": 1, "updated_at": 1}
+    )
+
+    migrated = edges = 0
+    async for user in users:
+        now = user.get("updated_at") or datetime.utcnow()
+        friends = set(user.get("friends", []))
+        # following is the source of truth; followers mirror it. Counted
+        # friendships are flagged on their canonical edge.
+        operations = [
+            UpdateOne(
+                _edge(user["id"], followee_id),
+                {
+                    "$setOnInsert": {"created_at": now},
+                    "$set": {"friends": user["id"] < followee_id and followee_id in friends}
+                },
+                upsert=True
+            )
+            for followee_id in set(user.get("following", []))
+        ]
+        for start in range(0, len(operations), batch_size):
+            await db.follows.bulk_write(operations[start:start + batch_size], ordered=False)
+
+        await db.users.update_one(
+            {"id": user["id"]},
+            {"$unset": {"following": "", "followers": "", "friends": ""}}
+        )
+        migrated += 1
+        edges += len(operations)
+
+    return {"users": migrated, "edges": edges}
+
+
+async def _main():
+    from database import db
+
+    print(json.dumps(await migrate_embedded_follows(db), indent=2))
+
+
+if __name__ == "__main__":
+    asyncio.run(_main())
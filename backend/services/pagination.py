@@ -0,0 +1,84 @@
+"""
+Keyset (cursor) pagination helpers.
+
+A cursor is an opaque, URL-safe token that encodes the sort key values of the
+last item on a page plus its ``id`` as a tie-breaker. The next page is then
+fetched with a range condition on an index instead of ``skip``, so deep pages
+cost the same as the first one and do not shift when new items are inserted.
+"""
+
+import base64
+import json
+from datetime import datetime
+from typing import Any, List, Optional
+
+from fastapi import HTTPException, Response, status
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def _encode_value(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return {"$date": value.isoformat()}
+    return value
+
+
+def _decode_value(value: Any) -> Any:
+    if isinstance(value, dict) and "$date" in value:
+        return datetime.fromisoformat(value["$date"])
+    return value
+
+
+def encode_cursor(*values: Any) -> str:
+    """Encode sort key values into an opaque cursor"""
+    payload = json.dumps([_encode_value(value) for value in values], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, size: int = 2) -> List[Any]:
+    """Decode a cursor produced by encode_cursor"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if not isinstance(values, list) or len(values) != size:
+            raise ValueError("Unexpected cursor shape")
+        return [_decode_value(value) for value in values]
+    except (ValueError, TypeError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid pagination cursor"
+        )
+
+
+def keyset_filter(sort_field: str, sort_value: Any, last_id: str, direction: int = -1, id_field: str = "id") -> dict:
+    """Build the range condition that selects items after (sort_value, last_id)"""
+    op = "$lt" if direction < 0 else "$gt"
+    return {
+        "$or": [
+            {sort_field: {op: sort_value}},
+            {sort_field: sort_value, id_field: {op: last_id}}
+        ]
+    }
+
+
+def apply_keyset(query: dict, cursor: Optional[str], sort_field: str, direction: int = -1, id_field: str = "id") -> dict:
+    """Narrow a query to the items after the given cursor"""
+    if not cursor:
+        return query
+
+    sort_value, last_id = decode_cursor(cursor)
+    condition = keyset_filter(sort_field, sort_value, last_id, direction, id_field)
+    if not query:
+        return condition
+    return {"$and": [query, condition]}
+
+
+def set_next_cursor(response: Response, items: List[dict], limit: int, sort_field: str, id_field: str = "id") -> Optional[str]:
+    """Expose the cursor for the following page, if there may be one"""
+    if not items or len(items) < limit:
+        return None
+
+    last = items[-1]
+    next_cursor = encode_cursor(last.get(sort_field), last[id_field])
+    response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    return next_cursor
@@ -0,0 +1,66 @@
+"""
+Authenticated-principal cache.
+
+Resolving a bearer token used to mean a ``jwt.decode``, a ``db.users``
+lookup and a full ``UserInDB`` validation on every request. ``PrincipalCache``
+keeps both halves in bounded TTL caches - token -> user id, so a token is
+decoded once per ``PRINCIPAL_CACHE_TTL`` and never cached past its ``exp``,
+and user id -> ``UserInDB`` - so repeat requests authenticate without a
+database round trip.
+
+Write paths that change what the principal carries (profile, follows, garage
+membership, saved posts, deactivation) call ``invalidate`` for the affected
+users; other app instances catch up within ``PRINCIPAL_CACHE_TTL`` seconds.
+"""
+
+import os
+import time
+from typing import Any, Dict, Optional
+
+from models.user import UserInDB
+from services.cache import TTLCache
+
+PRINCIPAL_CACHE_TTL = float(os.getenv("PRINCIPAL_CACHE_TTL", "30"))
+PRINCIPAL_CACHE_SIZE = int(os.getenv("PRINCIPAL_CACHE_SIZE", "10000"))
+
+
+class PrincipalCache:
+    """Cached token subjects and user principals"""
+
+    def __init__(self, maxsize: int = PRINCIPAL_CACHE_SIZE, ttl: float = PRINCIPAL_CACHE_TTL):
+        self.ttl = ttl
+        # token -> user id
+        self.tokens = TTLCache(maxsize, ttl)
+        # user id -> UserInDB
+        self.users = TTLCache(maxsize, ttl)
+
+    def user_id_for(self, token: str) -> Optional[str]:
+        """The user a previously verified token belongs to"""
+        return self.tokens.get(token)
+
+    def remember_token(self, token: str, user_id: str, expires_at: Optional[float] = None):
+        """Remember a verified token, no longer than until it expires"""
+        ttl = self.ttl if expires_at is None else min(self.ttl, expires_at - time.time())
+        if ttl > 0:
+            self.tokens.set(token, user_id, ttl)
+
+    def get(self, user_id: str) -> Optional[UserInDB]:
+        return self.users.get(user_id)
+
+    def set(self, user: UserInDB):
+        self.users.set(user.id, user)
+
+    def invalidate(self, *user_ids: str):
+        """Forget users after a write changed their stored document"""
+        for user_id in user_ids:
+            self.users.delete(user_id)
+
+    def clear(self):
+        self.tokens.clear()
+        self.users.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {"tokens": self.tokens.stats(), "users": self.users.stats()}
+
+
+principal_cache = PrincipalCache()
@@ -0,0 +1,114 @@
+"""
+Feed ranking.
+
+"hot" is a time-decayed score in the style of Reddit's ranking: the log of a
+post's engagement plus a bonus that grows linearly with its creation time.
+Because the time component is fixed at creation, the value only changes when
+the engagement changes, so it is recomputed inside the vote/comment write path
+and stored on the post, where a per-garage index serves hot feeds directly.
+
+Posts stored before hot existed are backfilled with
+``python -m services.ranking``, which recomputes hot for every post from its
+stored counters and is safe to re-run.
+"""
+
+import asyncio
+import json
+import math
+from datetime import datetime, timedelta
+
+from motor.motor_asyncio import AsyncIOMotorDatabase
+
+# Every HOT_DECAY_SECONDS of age is worth one order of magnitude of engagement
+HOT_EPOCH = datetime(2024, 1, 1)
+HOT_DECAY_SECONDS = 45000
+HOT_COMMENT_WEIGHT = 0.5
+
+# sort mode -> post field the feed is ordered by
+FEED_SORT_FIELDS = {
+    "new": "created_at",
+    "hot": "hot",
+    "top": "score"
+}
+
+TOP_WINDOWS = {
+    "day": timedelta(days=1),
+    "week": timedelta(weeks=1),
+    "all": None
+}
+
+
+def hot_score(score: int, comment_count: int, created_at: datetime) -> float:
+    """Compute the hot value for a post"""
+    engagement = score + HOT_COMMENT_WEIGHT * comment_count
+    order = math.log10(max(abs(engagement), 1))
+    sign = (engagement > 0) - (engagement < 0)
+    seconds = (created_at - HOT_EPOCH).total_seconds()
+    return sign * order + seconds / HOT_DECAY_SECONDS
+
+
+def _hot_expression() -> dict:
+    """Server-side equivalent of hot_score over the stored counters"""
+    return {
+        "$let": {
+            "vars": {
+                "engagement": {
+                    "$add": [
+                        {"$ifNull": ["$score", 0]},
+                        {"$multiply": [HOT_COMMENT_WEIGHT, {"$ifNull": ["$comment_count", 0]}]}
+                    ]
+                }
+            },
+            "in": {
+                "$add": [
+                    {"$multiply": [
+                        {"$cmp": ["$$engagement", 0]},
+                        {"$log10": {"$max": [{"$abs": "$$engagement"}, 1]}}
+                    ]},
+                    {"$divide": [{"$subtract": ["$created_at", HOT_EPOCH]}, HOT_DECAY_SECONDS * 1000]}
+                ]
+            }
+        }
+    }
+
+
+def ranked_increment(increments: dict) -> list:
+    """
+    Build an update pipeline that applies counter increments and refreshes the
+    hot value in the same atomic single-document write.
+    """
+    return [
+        {"$set": {
+            field: {"$add": [{"$ifNull": [f"${field}", 0]}, amount]}
+            for field, amount in increments.items()
+        }},
+        {"$set": {"hot": _hot_expression()}}
+    ]
+
+
+def ranked_set(values: dict) -> list:
+    """Update pipeline that overwrites counters and refreshes the hot value"""
+    stages = [{"$set": values}] if values else []
+    return stages + [{"$set": {"hot": _hot_expression()}}]
+
+
+async def backfill_hot(db: AsyncIOMotorDatabase) -> dict:
+    """Recompute the stored hot value of every post, server-side"""
+    result = await db.posts.update_many({}, ranked_set({}))
+    return {"matched": result.matched_count, "updated": result.modified_count}
+
+
+def top_window_start(window: str):
+    """Earliest creation time included in a "top" feed window"""
+    span = TOP_WINDOWS[window]
+    return datetime.utcnow() - span if span else None
+
+
+async def _main():
+    from database import db
+
+    print(json.dumps(await backfill_hot(db), indent=2))
+
+
+if __name__ == "__main__":
+    asyncio.run(_main())
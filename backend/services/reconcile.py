@@ -0,0 +1,394 @@
+"""
+Counter reconciliation.
+
+Posts, comments, garages and users carry denormalized counters that are kept
+up to date with separate ``$inc`` writes and no transactions, so a request
+that fails halfway leaves them slightly off. ``reconcile`` recomputes each
+counter from its source of truth with aggregation pipelines, one batch of
+documents at a time, and repairs the ones that drifted with one
+``bulk_write`` per batch.
+
+A repair only applies if the document still holds the counter values that
+were read, so a live ``$inc`` that lands in between is never overwritten; the
+document is reported as skipped and picked up by the next run. Full scans walk
+a collection in ``id`` order and checkpoint after every batch in
+``reconcile_checkpoints``, so an interrupted run resumes where it stopped.
+Passing ``since`` checks only the documents touched by activity after that
+time: records created or updated since then, deletion tombstones, and the
+ids that delete paths log in ``counter_touches`` (see services/touches.py).
+
+Votes, comment likes and follows are the source of truth only once the
+legacy embedded arrays were migrated out of the documents (see the
+``migrate_embedded_*`` runners). A collection that still has such arrays is
+skipped and reported with ``migration_pending``, so a run never resets real
+counters to zero.
+
+Run it with ``python -m services.reconcile [--since-minutes N] [--dry-run]``.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Set
+
+from motor.motor_asyncio import AsyncIOMotorCollection, AsyncIOMotorDatabase
+from pymongo import UpdateOne
+
+from services.ranking import ranked_set
+from services.touches import touched_since
+from services.votes import VOTE_FIELDS
+
+RECONCILE_BATCH_SIZE = int(os.getenv("RECONCILE_BATCH_SIZE", "500"))
+
+logger = logging.getLogger(__name__)
+
+# document id -> counter -> recomputed value
+Counts = Dict[str, Dict[str, int]]
+
+
+async def _group_counts(
+    collection: AsyncIOMotorCollection,
+    key: str,
+    ids: List[str],
+    accumulators: Optional[dict] = None
+) -> Counts:
+    """Per-id aggregates over the documents whose key is one of ids"""
+    rows = await collection.aggregate([
+        {"$match": {key: {"$in": ids}}},
+        {"$group": {"_id": f"${key}", **(accumulators or {"count": {"$sum": 1}})}}
+    ]).to_list(length=len(ids))
+    return {row.pop("_id"): row for row in rows}
+
+
+async def _array_sizes(collection: AsyncIOMotorCollection, ids: List[str], arrays: Dict[str, str]) -> Counts:
+    """Sizes of embedded arrays, computed server-side"""
+    rows = await collection.aggregate([
+        {"$match": {"id": {"$in": ids}}},
+        {"$project": {
+            "_id": 0,
+            "id": 1,
+            **{counter: {"$size": {"$ifNull": [f"${array}", []]}} for counter, array in arrays.items()}
+        }}
+    ]).to_list(length=len(ids))
+    return {row.pop("id"): row for row in rows}
+
+
+async def _touched(collection: AsyncIOMotorCollection, key: str, time_field: str, since: datetime) -> Set[str]:
+    """Distinct values of key on documents written since the given time"""
+    values = await collection.distinct(key, {time_field: {"$gte": since}})
+    return {value for value in values if value}
+
+
+async def _post_counts(db: AsyncIOMotorDatabase, ids: List[str]) -> Counts:
+    comments = await _group_counts(db.comments, "post_id", ids)
+    votes = await _group_counts(db.post_votes, "post_id", ids, {
+        counter: {"$sum": {"$cond": [{"$eq": ["$vote_type", vote_type]}, 1, 0]}}
+        for vote_type, (counter, _) in VOTE_FIELDS.items()
+    })
+
+    counts: Counts = {}
+    for post_id in ids:
+        tally = votes.get(post_id, {})
+        counts[post_id] = {
+            "comment_count": comments.get(post_id, {}).get("count", 0),
+            **{counter: tally.get(counter, 0) for counter, _ in VOTE_FIELDS.values()},
+            "score": sum(tally.get(counter, 0) * weight for counter, weight in VOTE_FIELDS.values())
+        }
+    return counts
+
+
+async def _touched_posts(db: AsyncIOMotorDatabase, since: datetime) -> Set[str]:
+    return (
+        await _touched(db.comments, "post_id", "created_at", since)
+        | await _touched(db.post_votes, "post_id", "updated_at", since)
+        | await touched_since(db, "posts", since)
+    )
+
+
+async def _comment_counts(db: AsyncIOMotorDatabase, ids: List[str]) -> Counts:
+    likes = await _group_counts(db.comment_likes, "comment_id", ids)
+    replies = await _group_counts(db.comments, "parent_id", ids)
+    return {
+        comment_id: {
+            "like_count": likes.get(comment_id, {}).get("count", 0),
+            "reply_count": replies.get(comment_id, {}).get("count", 0)
+        }
+        for comment_id in ids
+    }
+
+
+async def _touched_comments(db: AsyncIOMotorDatabase, since: datetime) -> Set[str]:
+    return (
+        await _touched(db.comments, "parent_id", "created_at", since)
+        | await _touched(db.comment_likes, "comment_id", "created_at", since)
+        | await touched_since(db, "comments", since)
+    )
+
+
+async def _garage_counts(db: AsyncIOMotorDatabase, ids: List[str]) -> Counts:
+    members = await _array_sizes(db.garages, ids, {"member_count": "members"})
+    posts = await _group_counts(db.posts, "garage_id", ids)
+    return {
+        garage_id: {
+            "member_count": members.get(garage_id, {}).get("member_count", 0),
+            "post_count": posts.get(garage_id, {}).get("count", 0)
+        }
+        for garage_id in ids
+    }
+
+
+async def _touched_garages(db: AsyncIOMotorDatabase, since: datetime) -> Set[str]:
+    return (
+        await _touched(db.posts, "garage_id", "created_at", since)
+        | await _touched(db.deletions, "context.garage_id", "created_at", since)
+        | await touched_since(db, "garages", since)
+    )
+
+
+async def _friend_counts(db: AsyncIOMotorDatabase, ids: List[str]) -> Counts:
+    """Outgoing follows of each user that are followed back"""
+    rows = await db.follows.aggregate([
+        {"$match": {"follower_id": {"$in": ids}}},
+        {"$lookup": {
+            "from": "follows",
+            "let": {"follower": "$follower_id", "followee": "$followee_id"},
+            "pipeline": [
+                {"$match": {"$expr": {"$and": [
+                    {"$eq": ["$follower_id", "$$followee"]},
+                    {"$eq": ["$followee_id", "$$follower"]}
+                ]}}},
+                {"$limit": 1},
+                {"$project": {"_id": 1}}
+            ],
+            "as": "reverse"
+        }},
+        {"$match": {"reverse": {"$ne": []}}},
+        {"$group": {"_id": "$follower_id", "count": {"$sum": 1}}}
+    ]).to_list(length=len(ids))
+    return {row.pop("_id"): row for row in rows}
+
+
+async def _user_counts(db: AsyncIOMotorDatabase, ids: List[str]) -> Counts:
+    followers = await _group_counts(db.follows, "followee_id", ids)
+    following = await _group_counts(db.follows, "follower_id", ids)
+    friends = await _friend_counts(db, ids)
+    posts = await _group_counts(db.posts, "author_id", ids)
+    garages = await _array_sizes(db.users, ids, {"garage_count": "garages"})
+    return {
+        user_id: {
+            "followers_count": followers.get(user_id, {}).get("count", 0),
+            "following_count": following.get(user_id, {}).get("count", 0),
+            "friends_count": friends.get(user_id, {}).get("count", 0),
+            "post_count": posts.get(user_id, {}).get("count", 0),
+            "garage_count": garages.get(user_id, {}).get("garage_count", 0)
+        }
+        for user_id in ids
+    }
+
+
+async def _touched_users(db: AsyncIOMotorDatabase, since: datetime) -> Set[str]:
+    return (
+        await _touched(db.posts, "author_id", "created_at", since)
+        | await _touched(db.deletions, "context.author_id", "created_at", since)
+        | await _touched(db.follows, "follower_id", "created_at", since)
+        | await _touched(db.follows, "followee_id", "created_at", since)
+        | await touched_since(db, "users", since)
+    )
+
+
+class CounterSet:
+    """The counters of one collection and how to recompute them"""
+
+    def __init__(
+        self,
+        fields: Iterable[str],
+        compute: Callable[[AsyncIOMotorDatabase, List[str]], Awaitable[Counts]],
+        touched: Callable[[AsyncIOMotorDatabase, datetime], Awaitable[Set[str]]],
+        update: Callable[[dict], object] = lambda values: {"$set": values},
+        legacy_arrays: Iterable[str] = ()
+    ):
+        self.fields = tuple(fields)
+        self.compute = compute
+        self.touched = touched
+        self.update = update
+        # Embedded arrays that must be migrated before the counters can be recomputed
+        self.legacy_arrays = tuple(legacy_arrays)
+        self.projection = {"_id": 0, "id": 1, **{field: 1 for field in self.fields}}
+
+
+# collection -> its denormalized counters
+COUNTERS: Dict[str, CounterSet] = {
+    # Posts also refresh "hot", which is derived from score and comment_count
+    "posts": CounterSet(
+        ("comment_count", "like_count", "dislike_count", "score"), _post_counts, _touched_posts, ranked_set,
+        legacy_arrays=("likes", "dislikes")
+    ),
+    "comments": CounterSet(
+        ("like_count", "reply_count"), _comment_counts, _touched_comments, legacy_arrays=("likes",)
+    ),
+    "garages": CounterSet(("member_count", "post_count"), _garage_counts, _touched_garages),
+    "users": CounterSet(
+        ("followers_count", "following_count", "friends_count", "post_count", "garage_count"),
+        _user_counts, _touched_users,
+        legacy_arrays=("followers", "following", "friends")
+    )
+}
+
+
+class DriftStats:
+    """Drift found and repaired in one collection"""
+
+    def __init__(self):
+        self.scanned = 0
+        self.drifted = 0
+        self.repaired = 0
+        # Repairs that lost to a concurrent write; the next run retries them
+        self.skipped = 0
+        # Legacy arrays are still embedded; nothing was checked
+        self.migration_pending = False
+        # counter -> documents where it drifted
+        self.fields: Counter = Counter()
+        # counter -> total absolute drift
+        self.drift: Counter = Counter()
+
+    def dict(self) -> dict:
+        return {
+            "scanned": self.scanned,
+            "drifted": self.drifted,
+            "repaired": self.repaired,
+            "skipped": self.skipped,
+            "migration_pending": self.migration_pending,
+            "fields": dict(self.fields),
+            "drift": dict(self.drift)
+        }
+
+
+async def _reconcile_batch(
+    db: AsyncIOMotorDatabase,
+    counters: CounterSet,
+    collection: AsyncIOMotorCollection,
+    docs: List[dict],
+    stats: DriftStats,
+    dry_run: bool
+):
+    """Recompute one batch of documents and repair the drifted ones"""
+    actual = await counters.compute(db, [doc["id"] for doc in docs])
+
+    operations = []
+    for doc in docs:
+        stats.scanned += 1
+        expected = actual.get(doc["id"], {})
+        changes = {}
+        for field in counters.fields:
+            stored = doc.get(field) or 0
+            value = expected.get(field, 0)
+            if stored != value:
+                changes[field] = value
+                stats.fields[field] += 1
+                stats.drift[field] += abs(stored - value)
+
+        if changes:
+            stats.drifted += 1
+            # Only overwrite counters nobody touched since they were read
+            guard = {"id": doc["id"], **{field: doc.get(field) for field in counters.fields}}
+            operations.append(UpdateOne(guard, counters.update(changes)))
+
+    if operations and not dry_run:
+        result = await collection.bulk_write(operations, ordered=False)
+        stats.repaired += result.modified_count
+        stats.skipped += len(operations) - result.matched_count
+
+
+async def reconcile_collection(
+    db: AsyncIOMotorDatabase,
+    name: str,
+    since: Optional[datetime] = None,
+    batch_size: int = RECONCILE_BATCH_SIZE,
+    dry_run: bool = False
+) -> DriftStats:
+    """Reconcile the counters of one collection, fully or since a point in time"""
+    counters = COUNTERS[name]
+    collection = db[name]
+    stats = DriftStats()
+
+    if counters.legacy_arrays and await collection.find_one(
+        {"$or": [{field: {"$exists": True}} for field in counters.legacy_arrays]}, {"_id": 1}
+    ):
+        logger.warning(
+            "Skipping %s counters: embedded %s arrays are not migrated yet",
+            name, "/".join(counters.legacy_arrays)
+        )
+        stats.migration_pending = True
+        return stats
+
+    if since is not None:
+        ids = sorted(await counters.touched(db, since))
+        for start in range(0, len(ids), batch_size):
+            docs = await collection.find(
+                {"id": {"$in": ids[start:start + batch_size]}}, counters.projection
+            ).to_list(batch_size)
+            await _reconcile_batch(db, counters, collection, docs, stats, dry_run)
+        return stats
+
+    # Full scan, resuming from the last checkpoint of an interrupted run
+    checkpoint = None if dry_run else await db.reconcile_checkpoints.find_one({"_id": name})
+    last_id = checkpoint["last_id"] if checkpoint else None
+    while True:
+        query = {"id": {"$gt": last_id}} if last_id else {}
+        docs = await collection.find(query, counters.projection).sort("id", 1).limit(batch_size).to_list(batch_size)
+        if not docs:
+            break
+        await _reconcile_batch(db, counters, collection, docs, stats, dry_run)
+        last_id = docs[-1]["id"]
+        if not dry_run:
+            await db.reconcile_checkpoints.update_one(
+                {"_id": name},
+                {"$set": {"last_id": last_id, "updated_at": datetime.utcnow()}},
+                upsert=True
+            )
+
+    if not dry_run:
+        await db.reconcile_checkpoints.delete_one({"_id": name})
+    return stats
+
+
+async def reconcile(
+    db: AsyncIOMotorDatabase,
+    collections: Optional[Iterable[str]] = None,
+    since: Optional[datetime] = None,
+    batch_size: int = RECONCILE_BATCH_SIZE,
+    dry_run: bool = False
+) -> Dict[str, dict]:
+    """Reconcile counters and return drift statistics per collection"""
+    report = {}
+    for name in collections or COUNTERS:
+        stats = await reconcile_collection(db, name, since, batch_size, dry_run)
+        report[name] = stats.dict()
+        logger.info("Reconciled %s counters: %s", name, report[name])
+    return report
+
+
+async def _main(args: argparse.Namespace):
+    from database import db
+
+    since = datetime.utcnow() - timedelta(minutes=args.since_minutes) if args.since_minutes else None
+    report = await reconcile(db, args.collections, since, args.batch_size, args.dry_run)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Recompute denormalized counters and repair drift")
+    parser.add_argument("collections", nargs="*", help=f"Collections to check: {', '.join(COUNTERS)} (default: all)")
+    parser.add_argument("--since-minutes", type=int, help="Only check documents touched in the last N minutes")
+    parser.add_argument("--batch-size", type=int, default=RECONCILE_BATCH_SIZE)
+    parser.add_argument("--dry-run", action="store_true", help="Report drift without repairing it")
+    args = parser.parse_args()
+    unknown = set(args.collections) - set(COUNTERS)
+    if unknown:
+        parser.error(f"Unknown collections: {', '.join(sorted(unknown))}")
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(_main(args))
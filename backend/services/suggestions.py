@@ -0,0 +1,201 @@
+"""
+"People you may know" suggestions.
+
+Suggestions are precomputed offline rather than aggregated per request. The
+job loads the follow graph and garage co-membership into SciPy sparse
+matrices - ``F`` (users x users, ``F[i, j] = 1`` when i follows j) and ``M``
+(users x garages) - so that ``F @ F`` counts the friend-of-friend paths from
+i to j and ``M @ M.T`` the garages they share. Their weighted sum ranks the
+candidates for every user at once, minus the user themselves and the accounts
+they already follow.
+
+Rows are processed ``SUGGESTION_CHUNK_SIZE`` users at a time so the products
+never materialize for the whole graph, and garages larger than
+``SUGGESTION_MAX_GARAGE_SIZE`` are left out of ``M``: a huge garage says
+little about who knows whom and would contribute size² pairs. The top
+``SUGGESTION_TOP_K`` candidates per user land in the ``suggestions``
+collection, one document per user, which ``GET /users/suggestions`` serves.
+
+Run it with ``python -m services.suggestions`` (e.g. nightly from cron).
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import time
+from datetime import datetime
+from typing import List, Tuple
+
+import numpy as np
+import scipy.sparse as sp
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import ReplaceOne
+
+SUGGESTION_TOP_K = int(os.getenv("SUGGESTION_TOP_K", "50"))
+SUGGESTION_CHUNK_SIZE = int(os.getenv("SUGGESTION_CHUNK_SIZE", "4096"))
+SUGGESTION_MAX_GARAGE_SIZE = int(os.getenv("SUGGESTION_MAX_GARAGE_SIZE", "2000"))
+
+# Score of one friend-of-friend path and of one shared garage
+FOLLOW_WEIGHT = 1.0
+GARAGE_WEIGHT = 0.5
+
+logger = logging.getLogger(__name__)
+
+
+def graph_matrices(num_users: int, follows: np.ndarray, memberships: np.ndarray, num_garages: int) -> Tuple[sp.csr_matrix, sp.csr_matrix]:
+    """
+    Sparse follow and membership matrices from (follower, followee) and
+    (user, garage) index pairs.
+    """
+    follows = np.asarray(follows, dtype=np.int64).reshape(-1, 2)
+    memberships = np.asarray(memberships, dtype=np.int64).reshape(-1, 2)
+
+    F = sp.csr_matrix(
+        (np.ones(len(follows), dtype=np.float32), (follows[:, 0], follows[:, 1])),
+        shape=(num_users, num_users)
+    )
+    M = sp.csr_matrix(
+        (np.ones(len(memberships), dtype=np.float32), (memberships[:, 0], memberships[:, 1])),
+        shape=(num_users, num_garages)
+    )
+    # Duplicate pairs were summed; every edge counts once
+    F.data[:] = 1
+    M.data[:] = 1
+    return F, M
+
+
+def top_candidates(
+    F: sp.csr_matrix,
+    M: sp.csr_matrix,
+    start: int,
+    stop: int,
+    top_k: int = SUGGESTION_TOP_K
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    The best candidates of users start..stop, as parallel arrays of user
+    index, candidate index, score, mutual follows and shared garages, sorted
+    by user and then by descending score.
+    """
+    mutual = F[start:stop] @ F
+    shared = M[start:stop] @ M.T
+    scores = (FOLLOW_WEIGHT * mutual + GARAGE_WEIGHT * shared).tocsr()
+
+    # Drop the users themselves and everyone they already follow
+    exclude = F[start:stop] + sp.eye(stop - start, F.shape[1], k=start, format="csr", dtype=np.float32)
+    scores = (scores - scores.multiply(exclude > 0)).tocoo()
+    keep = scores.data > 0
+    rows, cols, data = scores.row[keep], scores.col[keep], scores.data[keep]
+    if not len(rows):
+        empty = np.array([], dtype=np.int64)
+        return empty, empty, np.array([], dtype=np.float32), empty, empty
+
+    # Rank within each row: by row, then score descending, then index for stable ties
+    order = np.lexsort((cols, -data, rows))
+    rows, cols, data = rows[order], cols[order], data[order]
+    firsts = np.flatnonzero(np.r_[True, rows[1:] != rows[:-1]])
+    rank = np.arange(len(rows)) - np.repeat(firsts, np.diff(np.r_[firsts, len(rows)]))
+    keep = rank < top_k
+    rows, cols, data = rows[keep], cols[keep], data[keep]
+
+    return (
+        rows + start,
+        cols,
+        data,
+        np.asarray(mutual[rows, cols]).ravel().astype(np.int64),
+        np.asarray(shared[rows, cols]).ravel().astype(np.int64)
+    )
+
+
+async def load_graph(db: AsyncIOMotorDatabase) -> Tuple[List[str], sp.csr_matrix, sp.csr_matrix]:
+    """Export active users' follows and garage memberships into sparse matrices"""
+    users = await db.users.find({"is_active": True}, {"_id": 0, "id": 1}).to_list(length=None)
+    user_ids = [user["id"] for user in users]
+    index = {user_id: i for i, user_id in enumerate(user_ids)}
+
+    follows = []
+    async for edge in db.follows.find({}, {"_id": 0, "follower_id": 1, "followee_id": 1}):
+        follower, followee = index.get(edge["follower_id"]), index.get(edge["followee_id"])
+        if follower is not None and followee is not None:
+            follows.append((follower, followee))
+
+    memberships = []
+    num_garages = 0
+    async for garage in db.garages.find({}, {"_id": 0, "members": 1}):
+        members = [index[member] for member in set(garage.get("members") or []) if member in index]
+        if 1 < len(members) <= SUGGESTION_MAX_GARAGE_SIZE:
+            memberships.extend((member, num_garages) for member in members)
+            num_garages += 1
+
+    F, M = graph_matrices(len(user_ids), follows, memberships, num_garages)
+    return user_ids, F, M
+
+
+async def generate_suggestions(
+    db: AsyncIOMotorDatabase,
+    top_k: int = SUGGESTION_TOP_K,
+    chunk_size: int = SUGGESTION_CHUNK_SIZE
+) -> dict:
+    """Recompute every user's suggestions and return run statistics"""
+    started = time.monotonic()
+    generated_at = datetime.utcnow()
+    user_ids, F, M = await load_graph(db)
+
+    users = suggestions = 0
+    for start in range(0, len(user_ids), chunk_size):
+        rows, cols, scores, mutual, shared = top_candidates(F, M, start, min(start + chunk_size, len(user_ids)), top_k)
+        if not len(rows):
+            continue
+
+        operations = []
+        for group in np.split(np.arange(len(rows)), np.flatnonzero(np.diff(rows)) + 1):
+            user_id = user_ids[rows[group[0]]]
+            operations.append(ReplaceOne(
+                {"user_id": user_id},
+                {
+                    "user_id": user_id,
+                    "candidates": [
+                        {
+                            "user_id": user_ids[cols[i]],
+                            "score": float(scores[i]),
+                            "mutual_follows": int(mutual[i]),
+                            "shared_garages": int(shared[i])
+                        }
+                        for i in group
+                    ],
+                    "generated_at": generated_at
+                },
+                upsert=True
+            ))
+        await db.suggestions.bulk_write(operations, ordered=False)
+        users += len(operations)
+        suggestions += len(rows)
+
+    # Users who no longer have any candidates
+    await db.suggestions.delete_many({"generated_at": {"$lt": generated_at}})
+
+    stats = {
+        "users": len(user_ids),
+        "follows": int(F.nnz),
+        "memberships": int(M.nnz),
+        "users_with_suggestions": users,
+        "suggestions": suggestions,
+        "seconds": round(time.monotonic() - started, 3)
+    }
+    logger.info("Generated follow suggestions: %s", stats)
+    return stats
+
+
+async def _main(args: argparse.Namespace):
+    from database import db
+
+    print(json.dumps(await generate_suggestions(db, args.top_k, args.chunk_size), indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Precompute people-you-may-know suggestions")
+    parser.add_argument("--top-k", type=int, default=SUGGESTION_TOP_K)
+    parser.add_argument("--chunk-size", type=int, default=SUGGESTION_CHUNK_SIZE)
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(_main(parser.parse_args()))
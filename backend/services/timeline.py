@@ -0,0 +1,243 @@
+"""
+Materialized home timelines with hybrid fan-out.
+
+When a post is created in a garage, an entry is pushed into the ``timelines``
+collection for every member (fan-out-on-write), so reading a home feed is an
+indexed range scan over ``(user_id, created_at, post_id)``. Garages whose
+audience is larger than ``TIMELINE_FANOUT_LIMIT`` are not fanned out; their
+posts, together with general (non-garage) posts that everyone sees, are pulled
+at read time and merged with the materialized entries.
+
+Timeline entries expire after ``TIMELINE_RETENTION_DAYS``. Pages inside that
+horizon stop at it, and pages older than it are served by the pull query
+alone over all of the user's garages.
+
+Existing garage posts are backfilled with ``python -m services.timeline``
+(once after deploying, or whenever the timelines collection was lost).
+Entries that already exist are skipped, so it is safe to re-run.
+"""
+
+import asyncio
+import json
+import logging
+import os
+from datetime import datetime, timedelta
+from typing import Iterable, List, Optional
+
+from fastapi import HTTPException, status
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo.errors import BulkWriteError
+
+from models.user import UserInDB
+from services.fields import POST_CARD_PROJECTION
+from services.pagination import apply_keyset, decode_cursor, encode_cursor
+
+TIMELINE_FANOUT_LIMIT = int(os.getenv("TIMELINE_FANOUT_LIMIT", "5000"))
+TIMELINE_RETENTION_DAYS = int(os.getenv("TIMELINE_RETENTION_DAYS", "30"))
+TIMELINE_BACKFILL_LIMIT = int(os.getenv("TIMELINE_BACKFILL_LIMIT", "200"))
+
+FEED_SORT = [("created_at", -1), ("id", -1)]
+TIMELINE_SORT = [("created_at", -1), ("post_id", -1)]
+
+logger = logging.getLogger(__name__)
+
+
+def uses_fanout(garage: dict) -> bool:
+    """Whether posts in this garage are pushed into member timelines"""
+    return garage.get("member_count", len(garage.get("members", []))) <= TIMELINE_FANOUT_LIMIT
+
+
+def retention_horizon() -> datetime:
+    return datetime.utcnow() - timedelta(days=TIMELINE_RETENTION_DAYS)
+
+
+def _timeline_entry(user_id: str, post: dict) -> dict:
+    return {
+        "user_id": user_id,
+        "post_id": post["id"],
+        "garage_id": post.get("garage_id"),
+        "author_id": post["author_id"],
+        "created_at": post["created_at"]
+    }
+
+
+async def _insert_entries(db: AsyncIOMotorDatabase, entries: List[dict]):
+    """Insert timeline entries, ignoring ones that already exist"""
+    if not entries:
+        return
+    try:
+        await db.timelines.insert_many(entries, ordered=False)
+    except BulkWriteError as e:
+        # Duplicate (user_id, post_id) entries are expected on retries/backfills
+        if any(error.get("code") != 11000 for error in e.details.get("writeErrors", [])):
+            raise
+
+
+async def _recent_garage_posts(db: AsyncIOMotorDatabase, garage_id: str) -> List[dict]:
+    """A garage's posts that are still inside the materialized window"""
+    return await db.posts.find(
+        {"garage_id": garage_id, "created_at": {"$gte": retention_horizon()}},
+        {"_id": 0, "id": 1, "garage_id": 1, "author_id": 1, "created_at": 1}
+    ).sort(FEED_SORT).limit(TIMELINE_BACKFILL_LIMIT).to_list(TIMELINE_BACKFILL_LIMIT)
+
+
+async def fan_out_post(db: AsyncIOMotorDatabase, post: dict, garage: Optional[dict]):
+    """Push a new garage post into its members' timelines"""
+    if not garage or not uses_fanout(garage):
+        # General posts and very large garages are pulled at read time
+        return
+
+    await _insert_entries(db, [_timeline_entry(member_id, post) for member_id in garage.get("members", [])])
+
+
+async def add_member(db: AsyncIOMotorDatabase, user_id: str, garage: dict):
+    """Backfill a new member's timeline with the garage's recent posts"""
+    if not uses_fanout(garage):
+        return
+
+    recent_posts = await _recent_garage_posts(db, garage["id"])
+
+    await _insert_entries(db, [_timeline_entry(user_id, post) for post in recent_posts])
+
+
+async def rebuild_timelines(db: AsyncIOMotorDatabase) -> dict:
+    """Backfill every fan-out garage's recent posts into its members' timelines"""
+    garages = entries = 0
+    async for garage in db.garages.find({}, {"_id": 0, "id": 1, "members": 1, "member_count": 1}):
+        if not uses_fanout(garage):
+            continue
+
+        recent_posts = await _recent_garage_posts(db, garage["id"])
+
+        garage_entries = [
+            _timeline_entry(member_id, post)
+            for member_id in garage.get("members", [])
+            for post in recent_posts
+        ]
+        await _insert_entries(db, garage_entries)
+        garages += 1
+        entries += len(garage_entries)
+
+    stats = {"garages": garages, "entries": entries}
+    logger.info("Rebuilt home timelines: %s", stats)
+    return stats
+
+
+async def remove_member(db: AsyncIOMotorDatabase, user_id: str, garage_id: str):
+    """Drop a former member's timeline entries for a garage"""
+    await db.timelines.delete_many({"user_id": user_id, "garage_id": garage_id})
+
+
+async def _pull_garage_ids(db: AsyncIOMotorDatabase, garage_ids: Iterable[str]) -> List[str]:
+    """The user's garages that are too large to fan out"""
+    garage_ids = list(garage_ids)
+    if not garage_ids:
+        return []
+
+    garages = await db.garages.find(
+        {"id": {"$in": garage_ids}, "member_count": {"$gt": TIMELINE_FANOUT_LIMIT}},
+        {"_id": 0, "id": 1}
+    ).to_list(length=len(garage_ids))
+    return [garage["id"] for garage in garages]
+
+
+def _cursor_time(cursor: str) -> datetime:
+    """The created_at of a home feed cursor; cursors of ranked feeds are rejected"""
+    created_at, _ = decode_cursor(cursor)
+    if not isinstance(created_at, datetime):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid pagination cursor"
+        )
+    return created_at
+
+
+def _feed_key(post: dict) -> tuple:
+    return post["created_at"], post["id"]
+
+
+def _pull_query(garage_ids: List[str]) -> dict:
+    """General posts plus posts in the given garages"""
+    query = {"$or": [{"garage_id": None}]}
+    if garage_ids:
+        query["$or"].append({"garage_id": {"$in": garage_ids}})
+    return query
+
+
+async def read_home_timeline(
+    db: AsyncIOMotorDatabase,
+    user: UserInDB,
+    limit: int,
+    cursor: Optional[str] = None,
+    post_projection: dict = POST_CARD_PROJECTION
+) -> List[dict]:
+    """Read one page of a user's home feed, newest first"""
+    user_garages = user.garages or []
+    horizon = retention_horizon()
+
+    if cursor and _cursor_time(cursor) < horizon:
+        # Beyond the materialized window everything is pulled
+        return await db.posts.find(
+            apply_keyset(_pull_query(user_garages), cursor, "created_at"), post_projection
+        ).sort(FEED_SORT).limit(limit).to_list(limit)
+
+    # Inside the window both sources stop at the horizon, so the page never
+    # skips fan-out posts that only the pull query would find below it
+    window = {"created_at": {"$gte": horizon}}
+    pull_garages = await _pull_garage_ids(db, user_garages)
+    page: List[dict] = []
+    position = cursor
+    while len(page) < limit:
+        timeline_entries, pulled_posts = await asyncio.gather(
+            db.timelines.find(
+                apply_keyset({"user_id": user.id, **window}, position, "created_at", id_field="post_id"),
+                {"_id": 0, "post_id": 1, "created_at": 1}
+            ).sort(TIMELINE_SORT).limit(limit).to_list(limit),
+            db.posts.find(
+                apply_keyset({"$and": [_pull_query(pull_garages), window]}, position, "created_at"), post_projection
+            ).sort(FEED_SORT).limit(limit).to_list(limit)
+        )
+        pushed_ids = [entry["post_id"] for entry in timeline_entries]
+        pushed_posts = await db.posts.find(
+            {"id": {"$in": pushed_ids}}, post_projection
+        ).to_list(len(pushed_ids)) if pushed_ids else []
+
+        # A source that filled its page may hold more posts below its last one,
+        # so only what sorts at or above the higher of those bounds is complete
+        bounds = []
+        if len(timeline_entries) == limit:
+            bounds.append((timeline_entries[-1]["created_at"], timeline_entries[-1]["post_id"]))
+        if len(pulled_posts) == limit:
+            bounds.append((pulled_posts[-1]["created_at"], pulled_posts[-1]["id"]))
+        bound = max(bounds) if bounds else None
+
+        # Merge both sources on the feed sort key, dropping any overlap
+        merged = {post["id"]: post for post in pulled_posts + pushed_posts}
+        ranked = sorted(merged.values(), key=_feed_key, reverse=True)
+        if bound:
+            ranked = [post for post in ranked if _feed_key(post) >= bound]
+        page += ranked[:limit - len(page)]
+
+        if bound is None:
+            # Both sources are exhausted inside the window
+            break
+        # Entries of deleted posts or overlapping sources left the page short
+        position = encode_cursor(*bound)
+
+    if len(page) < limit:
+        # The window is exhausted; continue with pulled posts below the horizon
+        page += await db.posts.find(
+            {"$and": [_pull_query(user_garages), {"created_at": {"$lt": horizon}}]}, post_projection
+        ).sort(FEED_SORT).limit(limit - len(page)).to_list(limit - len(page))
+    return page
+
+
+async def _main():
+    from database import db
+
+    print(json.dumps(await rebuild_timelines(db), indent=2))
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(_main())
@@ -0,0 +1,32 @@
+"""
+Counter touch log.
+
+Incremental reconciliation finds the documents to recheck through the
+timestamps of the records their counters are computed from. A deleted record
+leaves no timestamp behind, so the delete paths (unfollows, vote removals,
+comment deletes, unlikes, garage leaves) log the ids whose counters they
+changed in ``counter_touches`` instead. Entries expire after
+``COUNTER_TOUCH_RETENTION_DAYS``, which must exceed the interval between
+incremental runs.
+"""
+
+import os
+from datetime import datetime
+from typing import Iterable, Optional, Set
+
+from motor.motor_asyncio import AsyncIOMotorDatabase
+
+COUNTER_TOUCH_RETENTION_DAYS = int(os.getenv("COUNTER_TOUCH_RETENTION_DAYS", "7"))
+
+
+async def record_touches(db: AsyncIOMotorDatabase, collection: str, ids: Iterable[Optional[str]]):
+    """Log that counters of these documents changed through a delete"""
+    now = datetime.utcnow()
+    entries = [{"collection": collection, "id": doc_id, "created_at": now} for doc_id in set(ids) if doc_id]
+    if entries:
+        await db.counter_touches.insert_many(entries, ordered=False)
+
+
+async def touched_since(db: AsyncIOMotorDatabase, collection: str, since: datetime) -> Set[str]:
+    """IDs logged for a collection since the given time"""
+    return set(await db.counter_touches.distinct("id", {"collection": collection, "created_at": {"$gte": since}}))
@@ -0,0 +1,79 @@
+"""
+Shared user-summary cache.
+
+Posts, comments, notifications and search results all show the same few
+author fields. ``UserSummaryCache`` keeps those summaries for every recently
+seen user in one process-wide LRU cache with a TTL, and ``get_many`` resolves
+a whole page of user IDs with at most one projected ``$in`` query for the
+misses.
+
+``update_current_user_profile``, profile image uploads and account deletion
+invalidate the user's entry; other app instances see the change within
+``USER_SUMMARY_TTL`` seconds.
+"""
+
+import os
+from typing import Dict, Iterable, Optional
+
+from motor.motor_asyncio import AsyncIOMotorDatabase
+
+from services.cache import TTLCache
+
+USER_SUMMARY_TTL = float(os.getenv("USER_SUMMARY_TTL", "300"))
+USER_SUMMARY_CACHE_SIZE = int(os.getenv("USER_SUMMARY_CACHE_SIZE", "50000"))
+
+# Only the fields enrichment actually needs
+SUMMARY_PROJECTION = {"_id": 0, "id": 1, "username": 1, "full_name": 1, "profile_image_url": 1}
+
+_MISSING = object()
+
+
+class UserSummaryCache:
+    """Cached username/full name/avatar summaries keyed by user ID"""
+
+    def __init__(self, maxsize: int = USER_SUMMARY_CACHE_SIZE, ttl: float = USER_SUMMARY_TTL):
+        # user_id -> summary dict, or None for a user that does not exist
+        self.summaries = TTLCache(maxsize, ttl)
+
+    async def get_many(self, db: AsyncIOMotorDatabase, user_ids: Iterable[str]) -> Dict[str, dict]:
+        """Summaries for a set of users, loading the misses with a single query"""
+        result: Dict[str, dict] = {}
+        missing = []
+        for user_id in {user_id for user_id in user_ids if user_id}:
+            cached = self.summaries.get(user_id, _MISSING)
+            if cached is _MISSING:
+                missing.append(user_id)
+            elif cached is not None:
+                result[user_id] = cached
+
+        if missing:
+            users = await db.users.find(
+                {"id": {"$in": missing}}, SUMMARY_PROJECTION
+            ).to_list(length=len(missing))
+            loaded = {user["id"]: user for user in users}
+            for user_id in missing:
+                summary = loaded.get(user_id)
+                self.summaries.set(user_id, summary)
+                if summary is not None:
+                    result[user_id] = summary
+
+        return result
+
+    async def get(self, db: AsyncIOMotorDatabase, user_id: str) -> Optional[dict]:
+        """Summary for one user, or None if they do not exist"""
+        return (await self.get_many(db, [user_id])).get(user_id)
+
+    def invalidate(self, *user_ids: str):
+        """Forget users after their name or avatar changed"""
+        for user_id in user_ids:
+            self.summaries.delete(user_id)
+
+    def clear(self):
+        self.summaries.clear()
+
+    def stats(self) -> dict:
+        """Size and hit-ratio metrics"""
+        return self.summaries.stats()
+
+
+user_summaries = UserSummaryCache()
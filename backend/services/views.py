@@ -0,0 +1,160 @@
+"""
+Post view counting.
+
+Views are far too frequent to write one at a time, so ``ViewBuffer``
+aggregates them in memory per post and a background task flushes the totals
+with a single unordered ``bulk_write`` every ``VIEW_FLUSH_INTERVAL`` seconds,
+or as soon as ``VIEW_MAX_PENDING`` views are waiting. Views buffered when the
+process dies are lost, so those two settings bound the loss.
+
+Unique viewers are estimated with a HyperLogLog sketch stored on the post as
+``view_hll``, a sparse object of register index -> rank. Registers merge with
+``$max``, which makes a flush commutative and lets several app instances
+update the same sketch; ``unique_viewer_count`` is refreshed from the merged
+sketch after each flush.
+"""
+
+import asyncio
+import hashlib
+import logging
+import math
+import os
+from collections import Counter
+from typing import Dict, Optional, Tuple
+
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import UpdateOne
+
+VIEW_FLUSH_INTERVAL = float(os.getenv("VIEW_FLUSH_INTERVAL", "5"))
+VIEW_MAX_PENDING = int(os.getenv("VIEW_MAX_PENDING", "10000"))
+
+# 2^10 registers: ~3% standard error in at most 1024 small fields per post
+HLL_PRECISION = 10
+HLL_REGISTERS = 1 << HLL_PRECISION
+
+logger = logging.getLogger(__name__)
+
+
+def hll_register(viewer_id: str) -> Tuple[int, int]:
+    """Register index and rank a viewer contributes to a sketch"""
+    value = int.from_bytes(hashlib.sha1(viewer_id.encode()).digest()[:8], "big")
+    remaining_bits = 64 - HLL_PRECISION
+    index = value >> remaining_bits
+    remainder = value & ((1 << remaining_bits) - 1)
+    # Position of the leftmost 1 bit in the remaining bits
+    rank = remaining_bits - remainder.bit_length() + 1
+    return index, rank
+
+
+def hll_estimate(registers: Dict[str, int]) -> int:
+    """Estimate the number of distinct viewers from a sparse sketch"""
+    m = HLL_REGISTERS
+    zeros = m - len(registers)
+    harmonic = zeros + sum(2.0 ** -rank for rank in registers.values())
+    estimate = (0.7213 / (1 + 1.079 / m)) * m * m / harmonic
+
+    if estimate <= 2.5 * m and zeros:
+        # Linear counting is more accurate while most registers are empty
+        estimate = m * math.log(m / zeros)
+    return int(round(estimate))
+
+
+class ViewBuffer:
+    """Coalesces post views in memory and flushes them periodically"""
+
+    def __init__(self, flush_interval: float = VIEW_FLUSH_INTERVAL, max_pending: int = VIEW_MAX_PENDING):
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self._views: Counter = Counter()
+        self._registers: Dict[str, Dict[str, int]] = {}
+        self._pending = 0
+        self._task: Optional[asyncio.Task] = None
+        self._flush_now = asyncio.Event()
+        self.metrics = {"recorded": 0, "flushed": 0, "flushes": 0, "writes": 0, "dropped": 0}
+
+    def record(self, post_id: str, viewer_id: str):
+        """Count one view; nothing is written until the next flush"""
+        self._views[post_id] += 1
+        self._pending += 1
+        self.metrics["recorded"] += 1
+
+        index, rank = hll_register(viewer_id)
+        registers = self._registers.setdefault(post_id, {})
+        key = str(index)
+        if rank > registers.get(key, 0):
+            registers[key] = rank
+
+        if self._pending >= self.max_pending:
+            self._flush_now.set()
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    async def flush(self, db: AsyncIOMotorDatabase) -> int:
+        """Write buffered views with one bulk_write and return how many were flushed"""
+        if not self._views:
+            return 0
+
+        # Swap the buffers before the first await so views recorded during the
+        # flush land in the next batch
+        views, registers, pending = self._views, self._registers, self._pending
+        self._views, self._registers, self._pending = Counter(), {}, 0
+
+        operations = []
+        for post_id, count in views.items():
+            update = {"$inc": {"view_count": count}}
+            if registers.get(post_id):
+                update["$max"] = {f"view_hll.{index}": rank for index, rank in registers[post_id].items()}
+            operations.append(UpdateOne({"id": post_id}, update))
+
+        try:
+            await db.posts.bulk_write(operations, ordered=False)
+
+            sketches = await db.posts.find(
+                {"id": {"$in": list(views)}},
+                {"_id": 0, "id": 1, "view_hll": 1}
+            ).to_list(len(views))
+            if sketches:
+                await db.posts.bulk_write([
+                    UpdateOne({"id": post["id"]}, {"$set": {"unique_viewer_count": hll_estimate(post.get("view_hll") or {})}})
+                    for post in sketches
+                ], ordered=False)
+        except Exception as e:
+            # Part of an unordered batch may have been applied, so retrying
+            # could double count; views are at-most-once
+            self.metrics["dropped"] += pending
+            logger.error(f"Failed to flush {pending} post views: {e}")
+            return 0
+
+        self.metrics["flushed"] += pending
+        self.metrics["flushes"] += 1
+        self.metrics["writes"] += len(operations)
+        return pending
+
+    def start(self, db: AsyncIOMotorDatabase):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run(db))
+
+    async def stop(self, db: AsyncIOMotorDatabase):
+        """Stop the flush loop and write whatever is still buffered"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush(db)
+
+    async def _run(self, db: AsyncIOMotorDatabase):
+        while True:
+            try:
+                await asyncio.wait_for(self._flush_now.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._flush_now.clear()
+            await self.flush(db)
+
+
+view_buffer = ViewBuffer()
@@ -0,0 +1,151 @@
+"""
+Post votes stored in a dedicated ``post_votes`` collection.
+
+Each vote is one small document keyed by ``(post_id, user_id)``; the post
+itself only carries ``like_count``/``dislike_count``/``score``. Casting a vote
+is an upsert that returns the previous vote, and the counters (and the hot
+value derived from them) are adjusted by the resulting delta in one atomic
+update, so a vote costs O(1) no matter how popular the post is and concurrent
+voters never overwrite each other.
+
+Posts stored with the legacy embedded ``likes``/``dislikes`` arrays are moved
+into ``post_votes`` with ``python -m services.votes`` (once after deploying;
+safe to re-run). Until then their votes are missing from ``user_vote`` and
+counter reconciliation leaves the posts alone.
+"""
+
+import asyncio
+import json
+from datetime import datetime
+from typing import Dict, Iterable, Optional
+
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+from services.ranking import ranked_increment
+from services.touches import record_touches
+
+# vote type -> (counter, contribution to score)
+VOTE_FIELDS = {
+    "like": ("like_count", 1),
+    "dislike": ("dislike_count", -1)
+}
+
+COUNTS_PROJECTION = {"_id": 0, "like_count": 1, "dislike_count": 1, "score": 1}
+
+
+def vote_delta(previous: Optional[str], current: str) -> Dict[str, int]:
+    """Counter increments for moving a vote from previous to current"""
+    delta: Dict[str, int] = {}
+    for vote_type, sign in ((previous, -1), (current, 1)):
+        if vote_type in VOTE_FIELDS:
+            counter, weight = VOTE_FIELDS[vote_type]
+            delta[counter] = delta.get(counter, 0) + sign
+            delta["score"] = delta.get("score", 0) + sign * weight
+    return {field: value for field, value in delta.items() if value}
+
+
+async def _record_vote(db: AsyncIOMotorDatabase, post_id: str, user_id: str, vote_type: str) -> Optional[str]:
+    """Store the user's vote and return the vote it replaced (or None)"""
+    if vote_type == "remove":
+        previous = await db.post_votes.find_one_and_delete({"post_id": post_id, "user_id": user_id})
+        return previous["vote_type"] if previous else None
+
+    now = datetime.utcnow()
+    for attempt in range(2):
+        try:
+            previous = await db.post_votes.find_one_and_update(
+                {"post_id": post_id, "user_id": user_id},
+                {
+                    "$set": {"vote_type": vote_type, "updated_at": now},
+                    "$setOnInsert": {"created_at": now}
+                },
+                upsert=True,
+                return_document=ReturnDocument.BEFORE
+            )
+            return previous["vote_type"] if previous else None
+        except DuplicateKeyError:
+            # Lost an upsert race against the same user's other request; the
+            # document exists now, so the retry is a plain update
+            if attempt:
+                raise
+
+
+async def apply_post_vote(db: AsyncIOMotorDatabase, post_id: str, user_id: str, vote_type: str) -> dict:
+    """Set a user's vote on a post to like/dislike/remove and return the counters"""
+    previous = await _record_vote(db, post_id, user_id, vote_type)
+    delta = vote_delta(previous, vote_type)
+    if vote_type == "remove" and previous:
+        # A removed vote leaves no timestamp for reconciliation to find
+        await record_touches(db, "posts", [post_id])
+
+    if delta:
+        counts = await db.posts.find_one_and_update(
+            {"id": post_id},
+            ranked_increment(delta),
+            projection=COUNTS_PROJECTION,
+            return_document=ReturnDocument.AFTER
+        )
+    else:
+        # The vote was already in the requested state
+        counts = await db.posts.find_one({"id": post_id}, COUNTS_PROJECTION)
+
+    counts = counts or {}
+    return {
+        "like_count": counts.get("like_count", 0),
+        "dislike_count": counts.get("dislike_count", 0),
+        "score": counts.get("score", 0)
+    }
+
+
+async def fetch_user_votes(db: AsyncIOMotorDatabase, post_ids: Iterable[str], user_id: str) -> Dict[str, str]:
+    """Resolve a user's votes for a page of posts with a single query"""
+    ids = list(set(post_ids))
+    if not ids:
+        return {}
+
+    votes = await db.post_votes.find(
+        {"user_id": user_id, "post_id": {"$in": ids}},
+        {"_id": 0, "post_id": 1, "vote_type": 1}
+    ).to_list(length=len(ids))
+    return {vote["post_id"]: vote["vote_type"] for vote in votes}
+
+
+async def migrate_embedded_votes(db: AsyncIOMotorDatabase, batch_size: int = 500) -> dict:
+    """Move legacy likes/dislikes arrays from post documents into post_votes"""
+    posts = db.posts.find(
+        {"$or": [{"likes": {"$exists": True}}, {"dislikes": {"$exists": True}}]},
+        {"_id": 0, "id": 1, "likes": 1, "dislikes": 1, "updated_at": 1}
+    )
+
+    migrated = votes = 0
+    async for post in posts:
+        now = post.get("updated_at") or datetime.utcnow()
+        operations = [
+            UpdateOne(
+                {"post_id": post["id"], "user_id": user_id},
+                {"$setOnInsert": {"vote_type": vote_type, "created_at": now, "updated_at": now}},
+                upsert=True
+            )
+            for vote_type, voters in (("like", post.get("likes", [])), ("dislike", post.get("dislikes", [])))
+            for user_id in voters
+        ]
+        for start in range(0, len(operations), batch_size):
+            await db.post_votes.bulk_write(operations[start:start + batch_size], ordered=False)
+
+        await db.posts.update_one({"id": post["id"]}, {"$unset": {"likes": "", "dislikes": ""}})
+        migrated += 1
+        votes += len(operations)
+
+    return {"posts": migrated, "votes": votes}
+
+
+async def _main():
+    from database import db
+
+    print(json.dumps(await migrate_embedded_votes(db), indent=2))
+
+
+if __name__ == "__main__":
+    asyncio.run(_main())
@@ -6,6 +6,7 @@ import pytest
 import pytest_asyncio
 from httpx import AsyncClient
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import monitoring
 import os
 from typing import AsyncGenerator, Generator
 import asyncio
@@ -32,6 +33,19 @@ async def test_db():
     for collection_name in collection_names:
         await db[collection_name].drop()
     
+    # Unique indexes back idempotent writes (votes, likes, follows)
+    from database import create_indexes
+    await create_indexes(db)
+    
+    # Principals, summaries and feed pages cached by earlier tests point at dropped documents
+    from services.feed_cache import feed_cache
+    from services.principals import principal_cache
+    from services.user_summaries import user_summaries
+    principal_cache.clear()
+    user_summaries.clear()
+    feed_cache.pages.clear()
+    feed_cache.versions.clear()
+    
     yield db
     
     # Clean database after tests
@@ -41,6 +55,40 @@ async def test_db():
     
     client.close()
 
+class CommandCounter(monitoring.CommandListener):
+    """Records the commands a client sends so tests can count round trips"""
+    
+    def __init__(self):
+        self.commands = []
+    
+    def started(self, event):
+        self.commands.append(event.command_name)
+    
+    def succeeded(self, event):
+        pass
+    
+    def failed(self, event):
+        pass
+    
+    def count(self, command_name: str = None) -> int:
+        """Number of commands sent, optionally filtered by command name"""
+        if command_name is None:
+            return len(self.commands)
+        return sum(1 for name in self.commands if name == command_name)
+    
+    def reset(self):
+        self.commands.clear()
+
+@pytest_asyncio.fixture
+async def counted_db(test_db):
+    """Test database handle whose round trips are recorded by a CommandCounter"""
+    counter = CommandCounter()
+    client = AsyncIOMotorClient(TEST_DATABASE_URL, event_listeners=[counter])
+    
+    yield client[TEST_DATABASE_NAME], counter
+    
+    client.close()
+
 @pytest_asyncio.fixture
 async def test_client(test_db) -> AsyncGenerator[AsyncClient, None]:
     """Create test client with test database"""
@@ -215,21 +263,9 @@ class TestUtils:
     @staticmethod
     async def follow_user(test_db, follower_id: str, followed_id: str):
         """Make one user follow another"""
-        await test_db.users.update_one(
-            {"id": follower_id},
-            {
-                "$push": {"following": followed_id},
-                "$inc": {"following_count": 1}
-            }
-        )
+        from services.follows import add_follow
         
-        await test_db.users.update_one(
-            {"id": followed_id},
-            {
-                "$push": {"followers": follower_id},
-                "$inc": {"followers_count": 1}
-            }
-        )
+        await add_follow(test_db, follower_id, followed_id)
 
 # Performance test utilities
 class PerformanceTestUtils:
@@ -192,4 +192,47 @@ class TestTokenValidation:
             headers = {"Authorization": f"Bearer {token}"}
             response = await test_client.get("/api/auth/me", headers=headers)
             
-            assert response.status_code == 401
\ No newline at end of file
+            assert response.status_code == 401
+
+class TestPrincipalCache:
+    """Test caching of authenticated principals"""
+    
+    @pytest.mark.asyncio
+    async def test_repeat_requests_skip_the_database(self, test_user, counted_db):
+        """A cached token authenticates without a round trip until invalidated"""
+        from fastapi import HTTPException
+        from fastapi.security import HTTPAuthorizationCredentials
+        from auth import AuthService, get_current_active_user, get_current_user
+        from services.principals import principal_cache
+        
+        db, counter = counted_db
+        token = AuthService.create_access_token({"sub": test_user.email})
+        credentials = HTTPAuthorizationCredentials(scheme="Bearer", credentials=token)
+        
+        first = await get_current_user(credentials, db)
+        assert first.id == test_user.id
+        assert counter.count("find") == 1
+        
+        counter.reset()
+        for _ in range(5):
+            assert (await get_current_user(credentials, db)).id == test_user.id
+        assert counter.count() == 0
+        
+        # Deactivation invalidates the principal and the next request sees it
+        await db.users.update_one({"id": test_user.id}, {"$set": {"is_active": False}})
+        principal_cache.invalidate(test_user.id)
+        counter.reset()
+        user = await get_current_user(credentials, db)
+        assert counter.count("find") == 1
+        with pytest.raises(HTTPException):
+            await get_current_active_user(user)
+    
+    @pytest.mark.asyncio
+    async def test_invalid_tokens_are_not_cached(self, test_client: AsyncClient):
+        """Rejected tokens never enter the cache"""
+        from services.principals import principal_cache
+        
+        response = await test_client.get("/api/auth/me", headers={"Authorization": "Bearer not.a.jwt"})
+        
+        assert response.status_code == 401
+        assert principal_cache.user_id_for("not.a.jwt") is None
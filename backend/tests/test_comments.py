@@ -0,0 +1,251 @@
+"""
+Unit tests for comment endpoints and comment enrichment
+"""
+
+import pytest
+from httpx import AsyncClient
+from tests.conftest import TestUtils
+
+class TestCommentEnrichment:
+    """Test batched comment author enrichment"""
+
+    @pytest.mark.asyncio
+    async def test_comment_enrichment_query_count_is_constant(self, test_db, test_post, counted_db):
+        """Enriching a thread costs the same queries regardless of its length"""
+        from models.comment import Comment
+        from services.enrichment import enrich_comments
+        from services.user_summaries import user_summaries
+
+        users = await TestUtils.create_multiple_users(test_db, count=10)
+        comments = [
+            Comment(content=f"Comment {i}", post_id=test_post.id, author_id=users[i % len(users)].id).dict()
+            for i in range(100)
+        ]
+        await test_db.comments.insert_many([dict(comment) for comment in comments])
+
+        db, counter = counted_db
+        for page_size in (1, 10, 100):
+            # Measure with a cold author cache
+            user_summaries.clear()
+            counter.reset()
+            enriched = await enrich_comments(db, comments[:page_size], users[0].id)
+
+            assert counter.count("find") == 2  # users and comment_likes
+            assert [comment.id for comment in enriched] == [comment["id"] for comment in comments[:page_size]]
+            assert all(comment.author_username for comment in enriched)
+
+    @pytest.mark.asyncio
+    async def test_comment_list_returns_authors(self, authenticated_client: AsyncClient, test_user, test_post):
+        """Listed comments carry their author's username"""
+        for i in range(3):
+            response = await authenticated_client.post(
+                "/api/comments/", json={"content": f"Nice ride {i}", "post_id": test_post.id}
+            )
+            assert response.status_code == 200
+
+        response = await authenticated_client.get("/api/comments/", params={"post_id": test_post.id})
+
+        assert response.status_code == 200
+        assert [comment["content"] for comment in response.json()] == ["Nice ride 0", "Nice ride 1", "Nice ride 2"]
+        assert all(comment["author_username"] == test_user.username for comment in response.json())
+
+class TestThreadedComments:
+    """Test nested replies and per-thread pagination"""
+
+    @pytest.mark.asyncio
+    async def test_threaded_listing_nests_first_replies(self, authenticated_client: AsyncClient, test_db, test_post):
+        """Roots come back with their first replies and a cursor for the rest of the thread"""
+        roots = []
+        for i in range(2):
+            response = await authenticated_client.post(
+                "/api/comments/", json={"content": f"Root {i}", "post_id": test_post.id}
+            )
+            roots.append(response.json())
+
+        reply_ids = []
+        for i in range(5):
+            response = await authenticated_client.post(
+                "/api/comments/",
+                json={"content": f"Reply {i}", "post_id": test_post.id, "parent_id": roots[0]["id"]}
+            )
+            assert response.json()["root_id"] == roots[0]["id"]
+            reply_ids.append(response.json()["id"])
+
+        nested = await authenticated_client.post(
+            "/api/comments/",
+            json={"content": "Nested", "post_id": test_post.id, "parent_id": reply_ids[0]}
+        )
+        assert nested.json()["path"] == [roots[0]["id"], reply_ids[0]]
+
+        response = await authenticated_client.get(
+            "/api/comments/", params={"post_id": test_post.id, "threaded": "true", "replies_limit": 2}
+        )
+        assert response.status_code == 200
+        threads = response.json()
+        assert [thread["id"] for thread in threads] == [root["id"] for root in roots]
+        assert [reply["id"] for reply in threads[0]["replies"]] == reply_ids[:2]
+        assert threads[0]["reply_count"] == 5
+        assert threads[1]["replies"] == [] and threads[1]["replies_cursor"] is None
+
+        # Load the rest of the thread from the nested cursor
+        seen = [reply["id"] for reply in threads[0]["replies"]]
+        cursor = threads[0]["replies_cursor"]
+        while cursor:
+            page = await authenticated_client.get(
+                f"/api/comments/{roots[0]['id']}/replies", params={"cursor": cursor, "limit": 2}
+            )
+            assert page.status_code == 200
+            seen += [reply["id"] for reply in page.json()]
+            cursor = page.headers.get("X-Next-Cursor")
+
+        assert seen == reply_ids + [nested.json()["id"]]
+
+    @pytest.mark.asyncio
+    async def test_deleting_a_reply_removes_its_subtree(self, authenticated_client: AsyncClient, test_db, test_post):
+        """A deleted comment takes its replies with it and the counters follow"""
+        root = (await authenticated_client.post(
+            "/api/comments/", json={"content": "Root", "post_id": test_post.id}
+        )).json()
+        reply = (await authenticated_client.post(
+            "/api/comments/", json={"content": "Reply", "post_id": test_post.id, "parent_id": root["id"]}
+        )).json()
+        await authenticated_client.post(
+            "/api/comments/", json={"content": "Nested", "post_id": test_post.id, "parent_id": reply["id"]}
+        )
+
+        response = await authenticated_client.delete(f"/api/comments/{reply['id']}")
+        assert response.status_code == 200
+
+        assert await test_db.comments.count_documents({"post_id": test_post.id}) == 1
+        assert (await test_db.comments.find_one({"id": root["id"]}))["reply_count"] == 0
+        assert (await test_db.posts.find_one({"id": test_post.id}))["comment_count"] == 1
+
+class TestCommentPagination:
+    """Test keyset pagination of comment lists"""
+
+    @pytest.mark.asyncio
+    async def test_cursor_walks_every_comment_once(self, authenticated_client: AsyncClient, test_db, test_post, test_user):
+        """Following X-Next-Cursor visits each comment exactly once in either order"""
+        from datetime import datetime
+        from models.comment import Comment
+
+        # Several comments share a timestamp so the id tiebreaker matters
+        created_at = datetime.utcnow()
+        comments = [
+            Comment(content=f"Comment {i}", post_id=test_post.id, author_id=test_user.id, created_at=created_at).dict()
+            for i in range(7)
+        ]
+        await test_db.comments.insert_many([dict(comment) for comment in comments])
+        expected = sorted(comment["id"] for comment in comments)
+
+        for order, ordered in (("oldest", expected), ("newest", expected[::-1])):
+            seen, cursor = [], None
+            while True:
+                params = {"post_id": test_post.id, "limit": 3, "order": order}
+                if cursor:
+                    params["cursor"] = cursor
+                page = await authenticated_client.get("/api/comments/", params=params)
+                assert page.status_code == 200
+                seen += [comment["id"] for comment in page.json()]
+                cursor = page.headers.get("X-Next-Cursor")
+                if not cursor:
+                    break
+
+            assert seen == ordered
+
+class TestCommentListETag:
+    """Test If-None-Match on comment listings"""
+
+    @pytest.mark.asyncio
+    async def test_comment_writes_change_the_tag(self, authenticated_client: AsyncClient, test_post, monkeypatch):
+        """A matching tag skips enrichment; creating or liking a comment changes it"""
+        params = {"post_id": test_post.id}
+        first = await authenticated_client.get("/api/comments/", params=params)
+        assert first.status_code == 200
+
+        async def no_enrichment(*args, **kwargs):
+            raise AssertionError("enrich_comments called for a 304")
+
+        monkeypatch.setattr("routes.comments.enrich_comments", no_enrichment)
+        response = await authenticated_client.get(
+            "/api/comments/", params=params, headers={"If-None-Match": first.headers["ETag"]}
+        )
+        assert response.status_code == 304
+        monkeypatch.undo()
+
+        etags = [first.headers["ETag"]]
+        comment = (await authenticated_client.post(
+            "/api/comments/", json={"content": "New comment", "post_id": test_post.id}
+        )).json()
+        for write in (None, f"/api/comments/{comment['id']}/like"):
+            if write:
+                await authenticated_client.post(write)
+            response = await authenticated_client.get(
+                "/api/comments/", params=params, headers={"If-None-Match": etags[-1]}
+            )
+            assert response.status_code == 200
+            assert response.headers["ETag"] not in etags
+            etags.append(response.headers["ETag"])
+
+        assert response.json()[0]["like_count"] == 1
+
+class TestCommentLikes:
+    """Test atomic comment likes"""
+
+    @pytest.mark.asyncio
+    async def test_concurrent_likes_are_not_lost(self, test_db, test_post, test_user):
+        """Simultaneous likes from many users all land and match the counter"""
+        import asyncio
+        from models.comment import Comment
+        from services.comment_likes import toggle_like
+
+        comment = Comment(content="Popular", post_id=test_post.id, author_id=test_user.id).dict()
+        await test_db.comments.insert_one(dict(comment))
+
+        likers = [f"liker-{i}" for i in range(200)]
+        await asyncio.gather(*(toggle_like(test_db, comment, user_id) for user_id in likers))
+        # Half of them unlike again while the same user double-taps concurrently
+        await asyncio.gather(
+            *(toggle_like(test_db, comment, user_id) for user_id in likers[:100]),
+            *(toggle_like(test_db, comment, user_id) for user_id in likers[:100])
+        )
+
+        stored = await test_db.comments.find_one({"id": comment["id"]})
+        assert stored["like_count"] == await test_db.comment_likes.count_documents({"comment_id": comment["id"]})
+        assert "likes" not in stored
+
+    @pytest.mark.asyncio
+    async def test_embedded_likes_migrate_to_comment_likes(self, test_db, test_post, test_user):
+        """Legacy arrays become like documents and the stored counters stay valid"""
+        from models.comment import Comment
+        from services.comment_likes import fetch_user_comment_likes, migrate_embedded_comment_likes
+        from services.reconcile import reconcile
+
+        comment = Comment(content="Old", post_id=test_post.id, author_id=test_user.id, like_count=2).dict()
+        await test_db.comments.insert_one({**comment, "likes": ["a", "b", "b"]})
+
+        stats = await migrate_embedded_comment_likes(test_db)
+        assert stats == {"comments": 1, "likes": 2}
+        assert await fetch_user_comment_likes(test_db, [comment["id"]], "a") == {comment["id"]}
+
+        stored = await test_db.comments.find_one({"id": comment["id"]})
+        assert "likes" not in stored and stored["like_count"] == 2
+        assert (await reconcile(test_db, ["comments"], dry_run=True))["comments"]["drifted"] == 0
+
+        assert await migrate_embedded_comment_likes(test_db) == {"comments": 0, "likes": 0}
+
+    @pytest.mark.asyncio
+    async def test_like_endpoint_toggles(self, authenticated_client: AsyncClient, test_post):
+        """Liking twice removes the like again and user_liked follows"""
+        comment = (await authenticated_client.post(
+            "/api/comments/", json={"content": "Like me", "post_id": test_post.id}
+        )).json()
+
+        first = await authenticated_client.post(f"/api/comments/{comment['id']}/like")
+        assert first.json() == {"message": "Like added", "like_count": 1, "user_liked": True}
+
+        listed = await authenticated_client.get("/api/comments/", params={"post_id": test_post.id})
+        assert listed.json()[0]["user_liked"] is True
+
+        second = await authenticated_client.post(f"/api/comments/{comment['id']}/like")
+        assert second.json() == {"message": "Like removed", "like_count": 0, "user_liked": False}
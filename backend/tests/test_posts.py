@@ -0,0 +1,730 @@
+"""
+Unit tests for post endpoints and post enrichment
+"""
+
+import pytest
+from httpx import AsyncClient
+from tests.conftest import TestUtils, CustomAssertions
+
+class TestPostEnrichment:
+    """Test batched author/garage enrichment"""
+
+    @pytest.mark.asyncio
+    async def test_enrichment_query_count_is_constant(self, test_db, counted_db):
+        """Enriching a page costs the same number of queries regardless of page size"""
+        from models.garage import Garage
+        from models.post import Post
+        from services.enrichment import enrich_posts
+        from services.user_summaries import user_summaries
+
+        users = await TestUtils.create_multiple_users(test_db, count=10)
+        garages = []
+        for i in range(5):
+            garage = Garage(name=f"Bench Garage {i}", owner_id=users[0].id, members=[users[0].id])
+            await test_db.garages.insert_one(garage.dict())
+            garages.append(garage)
+
+        posts = []
+        for i in range(50):
+            post = Post(
+                content=f"Bench post {i}",
+                author_id=users[i % len(users)].id,
+                garage_id=garages[i % len(garages)].id if i % 2 else None
+            )
+            await test_db.posts.insert_one(post.dict())
+            posts.append(post.dict())
+
+        db, counter = counted_db
+        query_counts = {}
+        for page_size in (1, 5, 20, 50):
+            # Measure with a cold author cache
+            user_summaries.clear()
+            counter.reset()
+            enriched = await enrich_posts(db, posts[:page_size], users[0].id)
+            query_counts[page_size] = counter.count("find")
+
+            assert len(enriched) == page_size
+            assert [post.id for post in enriched] == [post["id"] for post in posts[:page_size]]
+
+        # One users, one garages and one post_votes query, whatever the page size
+        assert max(query_counts.values()) <= 3
+        assert query_counts[5] == query_counts[50]
+
+    @pytest.mark.asyncio
+    async def test_feed_returns_enriched_posts(self, authenticated_client: AsyncClient, test_user, test_post):
+        """Test that feed posts carry author info"""
+        response = await authenticated_client.get("/api/posts/")
+
+        assert response.status_code == 200
+        response_data = response.json()
+
+        assert len(response_data) == 1
+        CustomAssertions.assert_valid_post_response(response_data[0])
+        assert response_data[0]["author_username"] == test_user.username
+        assert response_data[0]["author_full_name"] == test_user.full_name
+
+class TestFeedPagination:
+    """Test keyset pagination of the posts feed"""
+
+    @pytest.mark.asyncio
+    async def test_cursor_pages_do_not_overlap(self, authenticated_client: AsyncClient, test_db, test_user):
+        """Walking the feed by cursor returns every post exactly once, newest first"""
+        await TestUtils.create_multiple_posts(test_db, test_user.id, count=7)
+
+        seen = []
+        cursor = None
+        while True:
+            params = {"limit": 3}
+            if cursor:
+                params["cursor"] = cursor
+            response = await authenticated_client.get("/api/posts/", params=params)
+            assert response.status_code == 200
+
+            seen.extend(post["id"] for post in response.json())
+            cursor = response.headers.get("X-Next-Cursor")
+            if not cursor:
+                break
+
+        assert len(seen) == 7
+        assert len(set(seen)) == 7
+
+    @pytest.mark.asyncio
+    async def test_invalid_cursor_rejected(self, authenticated_client: AsyncClient):
+        """Test that a malformed cursor is a client error"""
+        response = await authenticated_client.get("/api/posts/", params={"cursor": "not-a-cursor"})
+
+        assert response.status_code == 400
+
+    @pytest.mark.asyncio
+    async def test_home_feed_crosses_retention_horizon(self, authenticated_client: AsyncClient, test_db, test_user, test_garage):
+        """Paging past the materialized window keeps every garage and general post"""
+        from datetime import datetime, timedelta
+        from models.post import Post
+        from services.pagination import encode_cursor
+        from services.timeline import TIMELINE_RETENTION_DAYS, rebuild_timelines
+
+        await test_db.users.update_one({"id": test_user.id}, {"$set": {"garages": [test_garage.id]}})
+        now = datetime.utcnow()
+        posts = [
+            Post(
+                content=f"Post {days}",
+                author_id=test_user.id,
+                garage_id=test_garage.id if in_garage else None,
+                created_at=now - timedelta(days=days)
+            ).dict()
+            for days, in_garage in (
+                (1, True), (2, True), (3, False),
+                (TIMELINE_RETENTION_DAYS - 1, False),
+                (TIMELINE_RETENTION_DAYS + 1, False), (TIMELINE_RETENTION_DAYS + 2, True),
+                (TIMELINE_RETENTION_DAYS + 3, False), (TIMELINE_RETENTION_DAYS + 4, True)
+            )
+        ]
+        await test_db.posts.insert_many([dict(post) for post in posts])
+        await rebuild_timelines(test_db)
+
+        seen, cursor = [], None
+        while True:
+            params = {"limit": 3}
+            if cursor:
+                params["cursor"] = cursor
+            response = await authenticated_client.get("/api/posts/", params=params)
+            assert response.status_code == 200
+            seen += [post["id"] for post in response.json()]
+            cursor = response.headers.get("X-Next-Cursor")
+            if not cursor:
+                break
+
+        assert seen == [post["id"] for post in posts]
+
+        # A cursor from a ranked feed carries a score, not a timestamp
+        response = await authenticated_client.get("/api/posts/", params={"cursor": encode_cursor(12.5, posts[0]["id"])})
+        assert response.status_code == 400
+
+    @pytest.mark.asyncio
+    async def test_home_feed_refills_past_deleted_posts(self, authenticated_client: AsyncClient, test_db, test_user, test_garage):
+        """Timeline entries of deleted posts don't push the page below the horizon"""
+        from datetime import datetime, timedelta
+        from models.post import Post
+        from services.timeline import TIMELINE_RETENTION_DAYS, rebuild_timelines
+
+        await test_db.users.update_one({"id": test_user.id}, {"$set": {"garages": [test_garage.id]}})
+        now = datetime.utcnow()
+        posts = [
+            Post(
+                content=f"Post {days}",
+                author_id=test_user.id,
+                garage_id=test_garage.id if days < TIMELINE_RETENTION_DAYS else None,
+                created_at=now - timedelta(days=days)
+            ).dict()
+            for days in (1, 2, 3, 4, 5, TIMELINE_RETENTION_DAYS + 1, TIMELINE_RETENTION_DAYS + 2)
+        ]
+        await test_db.posts.insert_many([dict(post) for post in posts])
+        await rebuild_timelines(test_db)
+
+        # Their timeline entries stay behind until the next rebuild
+        deleted = [posts[1]["id"], posts[2]["id"]]
+        await test_db.posts.delete_many({"id": {"$in": deleted}})
+
+        seen, cursor = [], None
+        while True:
+            params = {"limit": 3}
+            if cursor:
+                params["cursor"] = cursor
+            response = await authenticated_client.get("/api/posts/", params=params)
+            assert response.status_code == 200
+            seen += [post["id"] for post in response.json()]
+            cursor = response.headers.get("X-Next-Cursor")
+            if not cursor:
+                break
+
+        assert seen == [post["id"] for post in posts if post["id"] not in deleted]
+
+class TestFeedCache:
+    """Test caching of shared feed pages"""
+
+    @pytest.mark.asyncio
+    async def test_cache_hit_skips_database(self, authenticated_client: AsyncClient, test_db, test_user, test_post):
+        """A cached page is served without reading posts again"""
+        from services.feed_cache import feed_cache
+
+        response = await authenticated_client.get("/api/posts/")
+        assert [post["id"] for post in response.json()] == [test_post.id]
+
+        # Written behind the API's back, so nothing invalidates the page
+        await TestUtils.create_multiple_posts(test_db, test_user.id, count=1)
+        hits = feed_cache.pages.hits
+        response = await authenticated_client.get("/api/posts/")
+
+        assert [post["id"] for post in response.json()] == [test_post.id]
+        assert feed_cache.pages.hits == hits + 1
+
+        feed_cache.invalidate(None)
+        response = await authenticated_client.get("/api/posts/")
+        assert len(response.json()) == 2
+
+    @pytest.mark.asyncio
+    async def test_writes_invalidate_cached_pages(self, authenticated_client: AsyncClient, test_post):
+        """Creating, updating, voting on and deleting a post refreshes the feed"""
+        async def feed():
+            response = await authenticated_client.get("/api/posts/")
+            assert response.status_code == 200
+            return {post["id"]: post for post in response.json()}
+
+        assert list(await feed()) == [test_post.id]
+
+        response = await authenticated_client.post("/api/posts/", json={"content": "Fresh post"})
+        assert response.status_code == 200
+        post_id = response.json()["id"]
+        assert post_id in await feed()
+
+        response = await authenticated_client.put(f"/api/posts/{post_id}", json={"content": "Edited post"})
+        assert response.status_code == 200
+        assert (await feed())[post_id]["content"] == "Edited post"
+
+        response = await authenticated_client.post(f"/api/posts/{post_id}/vote", json={"vote_type": "like"})
+        assert response.status_code == 200
+        assert (await feed())[post_id]["like_count"] == 1
+
+        response = await authenticated_client.delete(f"/api/posts/{post_id}")
+        assert response.status_code == 200
+        assert post_id not in await feed()
+
+    @pytest.mark.asyncio
+    async def test_viewers_share_page_with_own_votes(self, authenticated_client: AsyncClient, test_db, test_post):
+        """Two viewers of one cached page each see only their own vote"""
+        from auth import AuthService
+        from services.feed_cache import feed_cache
+
+        other = (await TestUtils.create_multiple_users(test_db, count=1))[0]
+        other_headers = {"Authorization": f"Bearer {AuthService.create_access_token({'sub': other.email})}"}
+        response = await authenticated_client.post(f"/api/posts/{test_post.id}/vote", json={"vote_type": "like"})
+        assert response.status_code == 200
+
+        own = await authenticated_client.get("/api/posts/")
+        hits = feed_cache.pages.hits
+        theirs = await authenticated_client.get("/api/posts/", headers=other_headers)
+
+        assert own.json()[0]["user_vote"] == "like"
+        assert theirs.json()[0]["user_vote"] is None
+        assert theirs.json()[0]["like_count"] == 1
+        assert feed_cache.pages.hits == hits + 1
+        assert len(feed_cache.pages) == 1
+
+    @pytest.mark.asyncio
+    async def test_offset_pages_are_not_cached(self, authenticated_client: AsyncClient, test_db, test_user):
+        """Deprecated offset paging always reads through"""
+        from services.feed_cache import feed_cache
+
+        await TestUtils.create_multiple_posts(test_db, test_user.id, count=3)
+        response = await authenticated_client.get("/api/posts/", params={"offset": 1, "sort": "hot"})
+
+        assert response.status_code == 200
+        assert len(response.json()) == 2
+        assert len(feed_cache.pages) == 0
+
+class TestSparseFieldsets:
+    """Test fields= narrowing of post responses"""
+
+    @pytest.mark.asyncio
+    async def test_feed_returns_only_requested_fields(self, authenticated_client: AsyncClient, test_user, test_post):
+        """Only the requested fields (plus id) are serialized"""
+        response = await authenticated_client.get("/api/posts/", params={"fields": "content,author_username"})
+
+        assert response.status_code == 200
+        assert response.json() == [{
+            "id": test_post.id,
+            "content": test_post.content,
+            "author_username": test_user.username
+        }]
+
+    @pytest.mark.asyncio
+    async def test_fieldset_narrows_reads_and_lookups(self, test_db, test_post, counted_db):
+        """Stored fields outside the fieldset are not read and unneeded lookups are skipped"""
+        from services.enrichment import enrich_posts
+        from services.fields import POST_CARD_FIELDS, sparse_projection
+
+        fields = ["id", "content"]
+        db, counter = counted_db
+        post = await db.posts.find_one({"id": test_post.id}, sparse_projection(fields, POST_CARD_FIELDS, ("author_id",)))
+        assert set(post) == {"id", "content", "author_id"}
+
+        counter.reset()
+        enriched = await enrich_posts(db, [post], "viewer", fields=fields)
+        assert counter.count() == 0
+        assert enriched[0].dict(include=set(fields)) == {"id": test_post.id, "content": test_post.content}
+
+    @pytest.mark.asyncio
+    async def test_unknown_field_rejected(self, authenticated_client: AsyncClient, test_post):
+        """Unknown field names are a client error"""
+        response = await authenticated_client.get(f"/api/posts/{test_post.id}", params={"fields": "content,_id"})
+        assert response.status_code == 400
+
+class TestVoting:
+    """Test atomic post voting"""
+
+    @pytest.mark.asyncio
+    async def test_concurrent_votes_are_not_lost(self, test_db, test_post):
+        """Hundreds of simultaneous votes all land and the counters match"""
+        import asyncio
+        from services.votes import apply_post_vote
+
+        likers = [f"liker-{i}" for i in range(300)]
+        dislikers = [f"disliker-{i}" for i in range(200)]
+
+        await asyncio.gather(
+            *(apply_post_vote(test_db, test_post.id, user_id, "like") for user_id in likers),
+            *(apply_post_vote(test_db, test_post.id, user_id, "dislike") for user_id in dislikers)
+        )
+
+        # Half the likers switch to dislike while the other half re-send their like
+        switchers, repeaters = likers[:150], likers[150:]
+        await asyncio.gather(
+            *(apply_post_vote(test_db, test_post.id, user_id, "dislike") for user_id in switchers),
+            *(apply_post_vote(test_db, test_post.id, user_id, "like") for user_id in repeaters),
+            *(apply_post_vote(test_db, test_post.id, user_id, "remove") for user_id in dislikers[:50])
+        )
+
+        post = await test_db.posts.find_one({"id": test_post.id})
+        assert post["like_count"] == 150
+        assert post["dislike_count"] == 150 + 150
+        assert post["score"] == post["like_count"] - post["dislike_count"]
+        assert await test_db.post_votes.count_documents(
+            {"post_id": test_post.id, "vote_type": "like"}
+        ) == post["like_count"]
+        assert await test_db.post_votes.count_documents(
+            {"post_id": test_post.id, "vote_type": "dislike"}
+        ) == post["dislike_count"]
+        assert "likes" not in post
+
+    @pytest.mark.asyncio
+    async def test_vote_endpoint_is_idempotent(self, authenticated_client: AsyncClient, test_post):
+        """Repeating the same vote does not change the counters"""
+        for _ in range(3):
+            response = await authenticated_client.post(
+                f"/api/posts/{test_post.id}/vote", json={"vote_type": "like"}
+            )
+            assert response.status_code == 200
+
+        assert response.json()["like_count"] == 1
+        assert response.json()["score"] == 1
+
+    @pytest.mark.asyncio
+    async def test_embedded_votes_migrate_to_post_votes(self, test_db, test_post):
+        """Legacy arrays become vote documents and the stored counters stay valid"""
+        from services.reconcile import reconcile
+        from services.votes import fetch_user_votes, migrate_embedded_votes
+
+        await test_db.posts.update_one({"id": test_post.id}, {"$set": {
+            "likes": ["a", "b"], "dislikes": ["c"], "like_count": 2, "dislike_count": 1, "score": 1
+        }})
+
+        stats = await migrate_embedded_votes(test_db)
+        assert stats == {"posts": 1, "votes": 3}
+        assert await fetch_user_votes(test_db, [test_post.id], "c") == {test_post.id: "dislike"}
+
+        post = await test_db.posts.find_one({"id": test_post.id})
+        assert "likes" not in post and "dislikes" not in post
+        assert (post["like_count"], post["dislike_count"], post["score"]) == (2, 1, 1)
+        assert (await reconcile(test_db, ["posts"], dry_run=True))["posts"]["drifted"] == 0
+
+        # A second run finds nothing left to move
+        assert await migrate_embedded_votes(test_db) == {"posts": 0, "votes": 0}
+
+class TestHotRanking:
+    """Test the stored hot value"""
+
+    @pytest.mark.asyncio
+    async def test_backfill_ranks_legacy_posts(self, authenticated_client: AsyncClient, test_db, test_user):
+        """Posts stored without hot get it from their counters"""
+        from services.ranking import backfill_hot, hot_score
+
+        posts = await TestUtils.create_multiple_posts(test_db, test_user.id, count=3)
+        await test_db.posts.update_one({"id": posts[0].id}, {"$set": {"score": 50}})
+        await test_db.posts.update_many({}, {"$unset": {"hot": ""}})
+
+        stats = await backfill_hot(test_db)
+        assert stats["matched"] == 3
+
+        stored = await test_db.posts.find_one({"id": posts[0].id})
+        assert stored["hot"] == pytest.approx(hot_score(50, 0, stored["created_at"]))
+        response = await authenticated_client.get("/api/posts/", params={"sort": "hot"})
+        assert response.json()[0]["id"] == posts[0].id
+
+class TestGarageAccess:
+    """Test the cached garage access resolver"""
+
+    @pytest.mark.asyncio
+    async def test_access_decisions_are_cached(self, test_db, counted_db):
+        """Repeated decisions cost no round trips and invalidation reloads the garage"""
+        from models.garage import Garage
+        from services.access import AccessResolver
+
+        public = Garage(name="Open Garage", owner_id="owner", members=["owner"])
+        private = Garage(name="Closed Garage", owner_id="owner", members=["owner", "member"], is_private=True)
+        await test_db.garages.insert_many([public.dict(), private.dict()])
+
+        db, counter = counted_db
+        resolver = AccessResolver(maxsize=10, ttl=60)
+
+        denied = await resolver.denied_garages(db, "stranger", [public.id, private.id, "missing"])
+        assert denied == {private.id}
+        assert counter.count("find") == 1
+
+        counter.reset()
+        assert await resolver.denied_garages(db, "member", [public.id, private.id]) == set()
+        await resolver.require_post_access(db, "owner", private.id)
+        assert counter.count() == 0
+
+        await test_db.garages.update_one({"id": private.id}, {"$push": {"members": "stranger"}})
+        resolver.invalidate(private.id)
+        await resolver.require_post_access(db, "stranger", private.id)
+        assert counter.count("find") == 1
+
+class TestViewCounting:
+    """Test buffered view counts and HyperLogLog unique viewers"""
+
+    def test_hll_estimate_is_accurate(self):
+        """The sketch estimate stays within a few percent of the true cardinality"""
+        from services.views import hll_estimate, hll_register
+
+        for cardinality in (10, 1000, 50000):
+            registers = {}
+            for i in range(cardinality):
+                index, rank = hll_register(f"viewer-{i}")
+                registers[str(index)] = max(rank, registers.get(str(index), 0))
+
+            assert abs(hll_estimate(registers) - cardinality) <= max(1, cardinality * 0.1)
+
+    @pytest.mark.asyncio
+    async def test_views_are_coalesced_into_one_write(self, test_db, test_post, counted_db):
+        """Many views of a post cost one bulk write at flush time"""
+        from services.views import ViewBuffer
+
+        buffer = ViewBuffer(flush_interval=60, max_pending=1000)
+        for i in range(200):
+            buffer.record(test_post.id, f"viewer-{i % 25}")
+        assert buffer.pending == 200
+
+        db, counter = counted_db
+        assert await buffer.flush(db) == 200
+        assert counter.count("update") == 2  # counters, then the refreshed estimate
+        assert buffer.pending == 0
+
+        post = await test_db.posts.find_one({"id": test_post.id})
+        assert post["view_count"] == 200
+        assert abs(post["unique_viewer_count"] - 25) <= 1
+
+    @pytest.mark.asyncio
+    async def test_polling_revalidates_despite_new_views(self, authenticated_client: AsyncClient, test_db, test_post):
+        """Views recorded by the poll itself do not change the post's ETag"""
+        from services.views import view_buffer
+
+        first = await authenticated_client.get(f"/api/posts/{test_post.id}")
+        await view_buffer.flush(test_db)
+
+        again = await authenticated_client.get(
+            f"/api/posts/{test_post.id}", headers={"If-None-Match": first.headers["ETag"]}
+        )
+        assert again.status_code == 304
+        assert (await test_db.posts.find_one({"id": test_post.id}))["view_count"] >= 1
+
+class TestConditionalGet:
+    """Test If-None-Match on single posts"""
+
+    @pytest.mark.asyncio
+    async def test_matching_etag_skips_enrichment(self, authenticated_client: AsyncClient, test_post, monkeypatch):
+        """A revalidation is answered before enrichment and a vote changes the tag"""
+        first = await authenticated_client.get(f"/api/posts/{test_post.id}")
+        assert first.status_code == 200
+
+        async def no_enrichment(*args, **kwargs):
+            raise AssertionError("enrich_posts called for a 304")
+
+        monkeypatch.setattr("routes.posts.enrich_posts", no_enrichment)
+        headers = {"If-None-Match": first.headers["ETag"]}
+        response = await authenticated_client.get(f"/api/posts/{test_post.id}", headers=headers)
+        assert response.status_code == 304
+        monkeypatch.undo()
+
+        await authenticated_client.post(f"/api/posts/{test_post.id}/vote", json={"vote_type": "like"})
+        response = await authenticated_client.get(f"/api/posts/{test_post.id}", headers=headers)
+        assert response.status_code == 200
+        assert response.headers["ETag"] != first.headers["ETag"]
+        assert response.json()["user_vote"] == "like"
+
+class TestCascadeDeletion:
+    """Test background cleanup of deleted posts"""
+
+    @pytest.mark.asyncio
+    async def test_delete_post_cleans_up_in_batches(self, authenticated_client: AsyncClient, test_db, test_user, test_post):
+        """Deleting returns at once and the worker removes dependent data batch by batch"""
+        from models.comment import Comment
+        from services.cascade import CascadeWorker
+        from services.votes import apply_post_vote
+
+        await test_db.comments.insert_many([
+            Comment(content=f"Comment {i}", post_id=test_post.id, author_id=test_user.id).dict()
+            for i in range(25)
+        ])
+        for i in range(10):
+            await apply_post_vote(test_db, test_post.id, f"voter-{i}", "like")
+        await test_db.users.update_one({"id": test_user.id}, {"$push": {"saved_posts": test_post.id}})
+        await test_db.notifications.insert_one({"id": "n1", "recipient_id": test_user.id, "data": {"post_id": test_post.id}})
+
+        response = await authenticated_client.delete(f"/api/posts/{test_post.id}")
+        assert response.status_code == 200
+        deletion_id = response.json()["deletion_id"]
+
+        assert await test_db.posts.find_one({"id": test_post.id}) is None
+        tombstone = await test_db.deletions.find_one({"id": deletion_id})
+        assert tombstone["status"] == "pending"
+        response = await authenticated_client.get(f"/api/deletions/{deletion_id}")
+        assert response.status_code == 200
+        assert response.json()["status"] == "pending"
+
+        worker = CascadeWorker(batch_size=7)
+        assert await worker.process_next(test_db)
+        assert not await worker.process_next(test_db)
+
+        assert await test_db.comments.count_documents({"post_id": test_post.id}) == 0
+        assert await test_db.post_votes.count_documents({"post_id": test_post.id}) == 0
+        assert await test_db.notifications.count_documents({"data.post_id": test_post.id}) == 0
+        user = await test_db.users.find_one({"id": test_user.id})
+        assert test_post.id not in user["saved_posts"]
+
+        tombstone = await test_db.deletions.find_one({"id": deletion_id})
+        assert tombstone["status"] == "done"
+        assert tombstone["progress"]["comments"] == 25
+        assert tombstone["progress"]["votes"] == 10
+        stats = worker.stats()
+        assert stats["processed"] == 1
+        assert stats["documents"] == 25 + 10 + 1 + 1
+        assert stats["batches"] >= 4 + 2
+
+        # Requesters follow their deletion; nobody else can see it
+        response = await authenticated_client.get(f"/api/deletions/{deletion_id}")
+        assert response.json()["status"] == "done"
+        assert response.json()["progress"]["comments"] == 25
+        assert "context" not in response.json()
+        await test_db.deletions.update_one({"id": deletion_id}, {"$set": {"requested_by": "someone-else"}})
+        response = await authenticated_client.get(f"/api/deletions/{deletion_id}")
+        assert response.status_code == 404
+
+        response = await authenticated_client.get("/api/deletions/worker")
+        assert response.status_code == 200
+        assert "documents_per_second" in response.json()
+
+    @pytest.mark.asyncio
+    async def test_user_deletion_removes_reply_subtrees(self, test_db, test_user):
+        """Other users' replies beneath a deleted user's comments go with them"""
+        from models.comment import Comment
+        from models.deletion import DeletionKind
+        from services.cascade import CascadeWorker, enqueue_deletion
+
+        other = (await TestUtils.create_multiple_users(test_db, count=1))[0]
+        # The post outlives the deleted user's account
+        post = (await TestUtils.create_multiple_posts(test_db, other.id, count=1))[0]
+        kept = Comment(content="Kept", post_id=post.id, author_id=other.id, reply_count=1)
+        root = Comment(content="Root", post_id=post.id, author_id=test_user.id, reply_count=1)
+        reply = Comment(
+            content="Reply", post_id=post.id, author_id=other.id,
+            parent_id=root.id, root_id=root.id, path=[root.id], reply_count=1
+        )
+        nested = Comment(
+            content="Nested", post_id=post.id, author_id=other.id,
+            parent_id=reply.id, root_id=root.id, path=[root.id, reply.id]
+        )
+        answer = Comment(
+            content="Answer", post_id=post.id, author_id=test_user.id,
+            parent_id=kept.id, root_id=kept.id, path=[kept.id]
+        )
+        await test_db.comments.insert_many([comment.dict() for comment in (kept, root, reply, nested, answer)])
+        await test_db.posts.update_one({"id": post.id}, {"$set": {"comment_count": 5}})
+
+        await enqueue_deletion(test_db, DeletionKind.USER, test_user.id, test_user.id)
+        assert await CascadeWorker(batch_size=1).process_next(test_db)
+
+        remaining = await test_db.comments.find({"post_id": post.id}).to_list(None)
+        assert [comment["id"] for comment in remaining] == [kept.id]
+        assert remaining[0]["reply_count"] == 0
+        assert (await test_db.posts.find_one({"id": post.id}))["comment_count"] == 1
+
+class TestPostBatch:
+    """Test bulk post fetch"""
+
+    @pytest.mark.asyncio
+    async def test_batch_preserves_order_with_per_item_errors(self, authenticated_client: AsyncClient, test_db, test_user):
+        """Posts come back in request order; missing and private posts get an error instead"""
+        from models.garage import Garage
+        from models.post import Post
+
+        other_users = await TestUtils.create_multiple_users(test_db, count=1)
+        private_garage = Garage(name="Hidden Garage", owner_id=other_users[0].id, members=[other_users[0].id], is_private=True)
+        await test_db.garages.insert_one(private_garage.dict())
+
+        posts = await TestUtils.create_multiple_posts(test_db, test_user.id, count=3)
+        hidden_post = Post(content="Members only", author_id=other_users[0].id, garage_id=private_garage.id)
+        await test_db.posts.insert_one(hidden_post.dict())
+
+        ids = [posts[2].id, "missing-post", hidden_post.id, posts[0].id, posts[2].id]
+        response = await authenticated_client.post("/api/posts/batch", json={"ids": ids})
+
+        assert response.status_code == 200
+        items = response.json()["items"]
+        assert [item["id"] for item in items] == ids
+        assert items[0]["post"]["author_username"] == test_user.username
+        assert items[1] == {"id": "missing-post", "post": None, "error": "not_found"}
+        assert items[2]["error"] == "forbidden" and items[2]["post"] is None
+        assert items[3]["post"]["id"] == posts[0].id
+        assert items[4]["post"]["id"] == posts[2].id
+
+    @pytest.mark.asyncio
+    async def test_batch_size_is_limited(self, authenticated_client: AsyncClient):
+        """Requests over the batch limit are rejected"""
+        from models.post import POST_BATCH_LIMIT
+
+        ids = [f"post-{i}" for i in range(POST_BATCH_LIMIT + 1)]
+        response = await authenticated_client.post("/api/posts/batch", json={"ids": ids})
+        assert response.status_code == 422
+
+class TestCounterReconciliation:
+    """Test recomputing drifted denormalized counters"""
+
+    @pytest.mark.asyncio
+    async def test_full_run_repairs_drift_and_resumes(self, test_db, test_user, test_post):
+        """Drifted counters are recomputed from their sources and reported"""
+        from models.comment import Comment
+        from services.reconcile import reconcile
+        from services.votes import apply_post_vote
+
+        await test_db.comments.insert_many([
+            Comment(content=f"Comment {i}", post_id=test_post.id, author_id=test_user.id).dict()
+            for i in range(3)
+        ])
+        for i in range(4):
+            await apply_post_vote(test_db, test_post.id, f"voter-{i}", "like")
+        await apply_post_vote(test_db, test_post.id, "hater", "dislike")
+        # Simulate writes that failed halfway
+        await test_db.posts.update_one({"id": test_post.id}, {"$set": {"like_count": 9, "comment_count": 0}})
+        await test_db.users.update_one({"id": test_user.id}, {"$set": {"post_count": 5, "friends_count": -1}})
+
+        dry = await reconcile(test_db, ["posts"], dry_run=True)
+        assert dry["posts"]["drifted"] == 1 and dry["posts"]["repaired"] == 0
+        assert (await test_db.posts.find_one({"id": test_post.id}))["like_count"] == 9
+
+        report = await reconcile(test_db, batch_size=1)
+        assert report["posts"]["repaired"] == 1
+        assert report["posts"]["drift"] == {"like_count": 5, "comment_count": 3}
+        assert report["users"]["fields"] == {"post_count": 1, "friends_count": 1}
+
+        post = await test_db.posts.find_one({"id": test_post.id})
+        assert (post["like_count"], post["dislike_count"], post["score"], post["comment_count"]) == (4, 1, 3, 3)
+        user = await test_db.users.find_one({"id": test_user.id})
+        assert (user["post_count"], user["friends_count"]) == (1, 0)
+        assert await test_db.reconcile_checkpoints.count_documents({}) == 0
+
+        again = await reconcile(test_db)
+        assert all(stats["drifted"] == 0 for stats in again.values())
+
+    @pytest.mark.asyncio
+    async def test_incremental_run_checks_recent_activity(self, test_db, test_user):
+        """With since, only documents touched by recent activity are scanned"""
+        from datetime import datetime, timedelta
+        from services.reconcile import reconcile
+        from services.votes import apply_post_vote
+
+        posts = await TestUtils.create_multiple_posts(test_db, test_user.id, count=5)
+        started = datetime.utcnow() - timedelta(seconds=1)
+        await apply_post_vote(test_db, posts[0].id, "voter", "like")
+        await test_db.posts.update_many({}, {"$set": {"like_count": 7}})
+
+        report = await reconcile(test_db, ["posts"], since=started)
+
+        assert report["posts"]["scanned"] == 1
+        assert (await test_db.posts.find_one({"id": posts[0].id}))["like_count"] == 1
+        assert (await test_db.posts.find_one({"id": posts[1].id}))["like_count"] == 7
+
+    @pytest.mark.asyncio
+    async def test_incremental_run_sees_deletes(self, test_db):
+        """Counters changed by an unfollow or a vote removal are rechecked"""
+        from datetime import datetime, timedelta
+        from services.follows import add_follow, remove_follow
+        from services.reconcile import reconcile
+        from services.votes import apply_post_vote
+
+        first, second = await TestUtils.create_multiple_users(test_db, count=2)
+        post = (await TestUtils.create_multiple_posts(test_db, first.id, count=1))[0]
+        await add_follow(test_db, first.id, second.id)
+        await add_follow(test_db, second.id, first.id)
+        await apply_post_vote(test_db, post.id, second.id, "like")
+
+        # Only the deletes below happen after the cutoff (Mongo keeps milliseconds)
+        started = datetime.utcnow() - timedelta(milliseconds=1)
+        await test_db.follows.update_many({}, {"$set": {"created_at": started - timedelta(days=1)}})
+        await test_db.post_votes.update_many({}, {"$set": {"updated_at": started - timedelta(days=1)}})
+
+        await remove_follow(test_db, second.id, first.id)
+        await apply_post_vote(test_db, post.id, second.id, "remove")
+        # Simulate decrements that were lost
+        await test_db.users.update_many({}, {"$set": {"friends_count": 1}})
+        await test_db.posts.update_one({"id": post.id}, {"$set": {"like_count": 1}})
+
+        report = await reconcile(test_db, ["posts", "users"], since=started)
+
+        assert report["posts"]["repaired"] == 1 and report["users"]["repaired"] == 2
+        assert (await test_db.posts.find_one({"id": post.id}))["like_count"] == 0
+        assert await test_db.users.count_documents({"friends_count": 0}) == 2
+
+    @pytest.mark.asyncio
+    async def test_unmigrated_collections_are_skipped(self, test_db, test_post):
+        """Counters are left alone while legacy vote arrays are still embedded"""
+        from services.reconcile import reconcile
+
+        await test_db.posts.update_one({"id": test_post.id}, {"$set": {"likes": ["a", "b"], "like_count": 2}})
+
+        report = await reconcile(test_db, ["posts", "garages"])
+
+        assert report["posts"]["migration_pending"] is True
+        assert report["posts"]["scanned"] == 0
+        assert report["garages"]["migration_pending"] is False
+        assert (await test_db.posts.find_one({"id": test_post.id}))["like_count"] == 2
@@ -0,0 +1,340 @@
+"""
+Unit tests for user endpoints and the follow graph
+"""
+
+import pytest
+from httpx import AsyncClient
+from tests.conftest import TestUtils, performance_test
+
+class TestFollowGraph:
+    """Test follows stored as edges"""
+
+    @pytest.mark.asyncio
+    async def test_follow_and_unfollow_keep_counters(self, authenticated_client: AsyncClient, test_db, test_user):
+        """Edges drive follow state and both users' counters, including friendships"""
+        other = (await TestUtils.create_multiple_users(test_db, count=1))[0]
+        await TestUtils.follow_user(test_db, other.id, test_user.id)
+
+        response = await authenticated_client.post(f"/api/users/{other.id}/follow")
+        assert response.status_code == 200
+        assert response.json()["is_mutual"] is True
+
+        again = await authenticated_client.post(f"/api/users/{other.id}/follow")
+        assert again.status_code == 400
+
+        me = await test_db.users.find_one({"id": test_user.id})
+        them = await test_db.users.find_one({"id": other.id})
+        assert (me["following_count"], me["followers_count"], me["friends_count"]) == (1, 1, 1)
+        assert (them["following_count"], them["followers_count"], them["friends_count"]) == (1, 1, 1)
+        assert "followers" not in me and "following" not in me
+
+        response = await authenticated_client.delete(f"/api/users/{other.id}/follow")
+        assert response.status_code == 200
+        assert await test_db.follows.count_documents({"follower_id": test_user.id}) == 0
+
+        me = await test_db.users.find_one({"id": test_user.id})
+        them = await test_db.users.find_one({"id": other.id})
+        assert (me["following_count"], me["friends_count"]) == (0, 0)
+        assert (them["followers_count"], them["friends_count"]) == (0, 0)
+
+    @pytest.mark.asyncio
+    async def test_concurrent_follows_count_once(self, test_db):
+        """Double taps and simultaneous mutual follows never double-count"""
+        import asyncio
+        from services.follows import add_follow, remove_follow
+
+        first, second = await TestUtils.create_multiple_users(test_db, count=2)
+        for _ in range(3):
+            await asyncio.gather(
+                *(add_follow(test_db, first.id, second.id) for _ in range(5)),
+                *(add_follow(test_db, second.id, first.id) for _ in range(5))
+            )
+            for user in (first, second):
+                stored = await test_db.users.find_one({"id": user.id})
+                assert (stored["followers_count"], stored["following_count"], stored["friends_count"]) == (1, 1, 1)
+
+            await asyncio.gather(
+                *(remove_follow(test_db, first.id, second.id) for _ in range(5)),
+                *(remove_follow(test_db, second.id, first.id) for _ in range(5))
+            )
+            for user in (first, second):
+                stored = await test_db.users.find_one({"id": user.id})
+                assert (stored["followers_count"], stored["following_count"], stored["friends_count"]) == (0, 0, 0)
+
+    @pytest.mark.asyncio
+    async def test_private_profile_visible_to_followers(self, authenticated_client: AsyncClient, test_db, test_user):
+        """Private profiles and their lists open up once the viewer follows them"""
+        private_user, follower = await TestUtils.create_multiple_users(test_db, count=2)
+        await test_db.users.update_one({"id": private_user.id}, {"$set": {"is_private": True}})
+        await TestUtils.follow_user(test_db, follower.id, private_user.id)
+
+        limited = await authenticated_client.get(f"/api/users/{private_user.id}")
+        assert limited.json()["bio"] == "This account is private"
+        assert (await authenticated_client.get(f"/api/users/{private_user.id}/followers")).status_code == 403
+
+        await authenticated_client.post(f"/api/users/{private_user.id}/follow")
+        await authenticated_client.post(f"/api/users/{follower.id}/follow")
+
+        full = await authenticated_client.get(f"/api/users/{private_user.id}")
+        assert full.json()["bio"] != "This account is private"
+
+        followers = await authenticated_client.get(f"/api/users/{private_user.id}/followers")
+        assert followers.status_code == 200
+        assert {user["id"]: user["is_following"] for user in followers.json()} == {
+            follower.id: True,
+            test_user.id: False
+        }
+
+    @pytest.mark.asyncio
+    async def test_followers_page_in_follow_order(self, authenticated_client: AsyncClient, test_db, test_user):
+        """Followers come back in follow order and the cursor visits each one once"""
+        from datetime import datetime, timedelta
+
+        followers = await TestUtils.create_multiple_users(test_db, count=7)
+        followed_at = datetime.utcnow()
+        for i, follower in enumerate(followers):
+            await TestUtils.follow_user(test_db, follower.id, test_user.id)
+            # Two pairs of followers share a timestamp to exercise the tiebreaker
+            await test_db.follows.update_one(
+                {"follower_id": follower.id, "followee_id": test_user.id},
+                {"$set": {"created_at": followed_at + timedelta(seconds=i // 2)}}
+            )
+        await TestUtils.follow_user(test_db, test_user.id, followers[3].id)
+
+        expected = [
+            follower.id for follower in sorted(followers, key=lambda f: (followers.index(f) // 2, f.id))
+        ]
+        for order, ordered in (("oldest", expected), ("newest", expected[::-1])):
+            seen, cursor = [], None
+            while True:
+                params = {"limit": 3, "order": order}
+                if cursor:
+                    params["cursor"] = cursor
+                page = await authenticated_client.get(f"/api/users/{test_user.id}/followers", params=params)
+                assert page.status_code == 200
+                seen += [user["id"] for user in page.json()]
+                assert all(user["is_following"] == (user["id"] == followers[3].id) for user in page.json())
+                cursor = page.headers.get("X-Next-Cursor")
+                if not cursor:
+                    break
+
+            assert seen == ordered
+
+    @pytest.mark.asyncio
+    async def test_embedded_follows_migrate_to_edges(self, test_db, test_user):
+        """Legacy arrays become edges and are removed from the user documents"""
+        from services.follows import is_following, migrate_embedded_follows
+
+        other = (await TestUtils.create_multiple_users(test_db, count=1))[0]
+        await test_db.users.update_one(
+            {"id": test_user.id}, {"$set": {"following": [other.id], "friends": [other.id]}}
+        )
+        await test_db.users.update_one(
+            {"id": other.id}, {"$set": {"following": [test_user.id], "followers": [test_user.id]}}
+        )
+
+        assert await migrate_embedded_follows(test_db) == {"users": 2, "edges": 2}
+
+        assert await is_following(test_db, test_user.id, other.id)
+        assert await is_following(test_db, other.id, test_user.id)
+        assert await test_db.users.count_documents({"following": {"$exists": True}}) == 0
+
+class TestProfileReadModel:
+    """Test the compact profile and the opt-in full shape"""
+
+    @pytest.mark.asyncio
+    async def test_profiles_ship_counts_not_lists(self, authenticated_client: AsyncClient, test_db, test_user, test_post):
+        """Profiles carry counters by default and the arrays only when asked for"""
+        await test_db.users.update_one({"id": test_user.id}, {"$push": {"saved_posts": test_post.id}})
+
+        for url in ("/api/users/me", "/api/auth/me", f"/api/users/{test_user.id}"):
+            compact = await authenticated_client.get(url)
+            assert compact.status_code == 200
+            assert "followers_count" in compact.json() and "garage_count" in compact.json()
+            assert not {"saved_posts", "liked_posts", "blocked_users", "garages", "social_logins"} & set(compact.json())
+
+            full = await authenticated_client.get(url, params={"full": "true"})
+            assert full.status_code == 200
+            assert full.json()["saved_posts"] == [test_post.id]
+            assert "hashed_password" not in full.json()
+
+        # The two shapes are cached separately
+        compact = await authenticated_client.get(f"/api/users/{test_user.id}")
+        full = await authenticated_client.get(f"/api/users/{test_user.id}", params={"full": "true"})
+        assert compact.headers["ETag"] != full.headers["ETag"]
+
+    @pytest.mark.asyncio
+    async def test_garage_count_follows_membership(self, authenticated_client: AsyncClient, test_db, test_user):
+        """Creating, joining and leaving garages keeps garage_count in step and reconcile agrees"""
+        from models.garage import Garage
+        from services.reconcile import reconcile
+
+        owner = (await TestUtils.create_multiple_users(test_db, count=1))[0]
+        garage = Garage(name="Open Road", owner_id=owner.id, members=[owner.id], member_count=1)
+        await test_db.garages.insert_one(garage.dict())
+
+        created = await authenticated_client.post("/api/garages/", json={"name": "My Garage"})
+        assert created.status_code == 200
+        await authenticated_client.post(f"/api/garages/{garage.id}/join")
+        again = await authenticated_client.post(f"/api/garages/{garage.id}/join")
+        assert again.status_code == 400
+
+        profile = await authenticated_client.get("/api/users/me")
+        assert profile.json()["garage_count"] == 2
+
+        await authenticated_client.delete(f"/api/garages/{garage.id}/leave")
+        assert (await authenticated_client.get("/api/users/me")).json()["garage_count"] == 1
+        assert (await reconcile(test_db, ["users"], dry_run=True))["users"]["drifted"] == 0
+
+    @pytest.mark.asyncio
+    async def test_liked_posts_and_blocked_users_are_listed(self, authenticated_client: AsyncClient, test_db, test_user):
+        """The lists left out of the compact profile have their own endpoints"""
+        from datetime import datetime, timedelta
+        from services.principals import principal_cache
+        from services.votes import apply_post_vote
+
+        posts = await TestUtils.create_multiple_posts(test_db, test_user.id, count=3)
+        liked_at = datetime.utcnow()
+        for i, post in enumerate(posts):
+            await apply_post_vote(test_db, post.id, test_user.id, "like")
+            await test_db.post_votes.update_one(
+                {"post_id": post.id, "user_id": test_user.id}, {"$set": {"updated_at": liked_at + timedelta(seconds=i)}}
+            )
+        await apply_post_vote(test_db, posts[1].id, test_user.id, "dislike")
+
+        seen, cursor = [], None
+        while True:
+            params = {"limit": 1}
+            if cursor:
+                params["cursor"] = cursor
+            page = await authenticated_client.get("/api/users/me/liked-posts", params=params)
+            assert page.status_code == 200
+            seen += [post["id"] for post in page.json()]
+            cursor = page.headers.get("X-Next-Cursor")
+            if not cursor:
+                break
+        assert seen == [posts[2].id, posts[0].id]
+
+        blocked = await TestUtils.create_multiple_users(test_db, count=2)
+        await test_db.users.update_one(
+            {"id": test_user.id}, {"$set": {"blocked_users": [user.id for user in blocked]}}
+        )
+        principal_cache.invalidate(test_user.id)
+
+        response = await authenticated_client.get("/api/users/me/blocked", params={"offset": 1})
+        assert [user["id"] for user in response.json()] == [blocked[1].id]
+
+class TestProfileETag:
+    """Test If-None-Match on user profiles"""
+
+    @pytest.mark.asyncio
+    async def test_profile_update_changes_the_tag(self, authenticated_client: AsyncClient, test_user, monkeypatch):
+        """A matching tag skips building the profile; an update changes it"""
+        url = f"/api/users/{test_user.id}"
+        first = await authenticated_client.get(url)
+        assert first.status_code == 200
+
+        def no_profile(*args, **kwargs):
+            raise AssertionError("profile_response called for a 304")
+
+        monkeypatch.setattr("routes.users.profile_response", no_profile)
+        headers = {"If-None-Match": first.headers["ETag"]}
+        response = await authenticated_client.get(url, headers=headers)
+        assert response.status_code == 304
+        monkeypatch.undo()
+
+        await authenticated_client.put("/api/users/me", json={"bio": "Rebuilt the carbs"})
+        response = await authenticated_client.get(url, headers=headers)
+        assert response.status_code == 200
+        assert response.headers["ETag"] != first.headers["ETag"]
+        assert response.json()["bio"] == "Rebuilt the carbs"
+
+class TestFollowSuggestions:
+    """Test precomputed people-you-may-know suggestions"""
+
+    @pytest.mark.asyncio
+    async def test_suggestions_rank_friends_of_friends_and_garages(self, authenticated_client: AsyncClient, test_db, test_user):
+        """Friends of friends and garage mates are suggested; followed users are not"""
+        from models.garage import Garage
+        from services.suggestions import generate_suggestions
+
+        friend, friend_of_friend, garage_mate, stranger = await TestUtils.create_multiple_users(test_db, count=4)
+        await TestUtils.follow_user(test_db, test_user.id, friend.id)
+        await TestUtils.follow_user(test_db, friend.id, friend_of_friend.id)
+        await TestUtils.follow_user(test_db, stranger.id, test_user.id)
+        await test_db.garages.insert_one(
+            Garage(name="Night Riders", owner_id=garage_mate.id, members=[garage_mate.id, test_user.id]).dict()
+        )
+
+        stats = await generate_suggestions(test_db)
+        assert stats["follows"] == 3
+
+        response = await authenticated_client.get("/api/users/suggestions")
+        assert response.status_code == 200
+        suggestions = response.json()
+        assert [user["id"] for user in suggestions] == [friend_of_friend.id, garage_mate.id]
+        assert suggestions[0]["mutual_follows"] == 1
+        assert suggestions[1]["shared_garages"] == 1
+
+        # Following a suggestion hides it before the next run
+        await authenticated_client.post(f"/api/users/{friend_of_friend.id}/follow")
+        response = await authenticated_client.get("/api/users/suggestions")
+        assert [user["id"] for user in response.json()] == [garage_mate.id]
+
+    @performance_test
+    def test_suggestion_benchmark_one_million_edges(self):
+        """Top-K candidates for 200k users and 1M follows, computed chunk by chunk"""
+        import time
+        import numpy as np
+        from services.suggestions import SUGGESTION_CHUNK_SIZE, graph_matrices, top_candidates
+
+        rng = np.random.default_rng(42)
+        num_users, num_edges, num_garages = 200_000, 1_000_000, 2_000
+        follows = rng.integers(0, num_users, size=(num_edges, 2))
+        memberships = np.column_stack([
+            rng.integers(0, num_users, size=num_garages * 40),
+            np.repeat(np.arange(num_garages), 40)
+        ])
+
+        started = time.perf_counter()
+        F, M = graph_matrices(num_users, follows, memberships, num_garages)
+        built = time.perf_counter()
+        total = 0
+        for start in range(0, num_users, SUGGESTION_CHUNK_SIZE):
+            rows, cols, _, _, _ = top_candidates(F, M, start, min(start + SUGGESTION_CHUNK_SIZE, num_users), 20)
+            assert not np.any(rows == cols)
+            assert not np.any(np.asarray(F[rows, cols]).ravel())
+            total += len(rows)
+        finished = time.perf_counter()
+
+        print(
+            f"{F.nnz} follows, {M.nnz} memberships: build {built - started:.2f}s, "
+            f"top-20 for {num_users} users {finished - built:.2f}s ({total} suggestions)"
+        )
+        assert total > 0
+
+class TestUserSummaryCache:
+    """Test the shared user-summary cache"""
+
+    @pytest.mark.asyncio
+    async def test_summaries_are_cached_and_invalidated(self, authenticated_client: AsyncClient, test_db, test_user, counted_db):
+        """Repeat lookups skip the database and a profile update refreshes the entry"""
+        from services.user_summaries import user_summaries
+
+        others = await TestUtils.create_multiple_users(test_db, count=3)
+        ids = [test_user.id] + [user.id for user in others] + ["missing-user"]
+
+        db, counter = counted_db
+        first = await user_summaries.get_many(db, ids)
+        assert counter.count("find") == 1
+        assert set(first) == set(ids) - {"missing-user"}
+
+        counter.reset()
+        second = await user_summaries.get_many(db, ids)
+        assert counter.count("find") == 0
+        assert second == first
+        assert user_summaries.stats()["hit_ratio"] >= 0.5
+
+        response = await authenticated_client.put("/api/users/me", json={"full_name": "Renamed Rider"})
+        assert response.status_code == 200
+        assert (await user_summaries.get(db, test_user.id))["full_name"] == "Renamed Rider"
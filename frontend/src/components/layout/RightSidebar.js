@@ -83,11 +83,11 @@ const RightSidebar = () => {
           </div>
           <div className="flex justify-between text-sm">
             <span className="text-gray-600">Garages</span>
-            <span className="font-medium">{user?.garages?.length || 0}</span>
+            <span className="font-medium">{user?.garage_count || 0}</span>
           </div>
           <div className="flex justify-between text-sm">
             <span className="text-gray-600">Friends</span>
-            <span className="font-medium">{user?.friends?.length || 0}</span>
+            <span className="font-medium">{user?.friends_count || 0}</span>
           </div>
           <Button 
             variant="outline" 